@@ -95,7 +95,8 @@ int main(int argc, char* argv[]){
 		}
 		fclose(file);
 
-		sort(tuples.begin(), tuples.end(), compare);
+		// stable, so that flows of the same size are split between buckets in file order, same as fct_analysis.py
+		stable_sort(tuples.begin(), tuples.end(), compare);
 
 		if (steps.size() > 0){
 			uint64_t l = 0, r = 0;
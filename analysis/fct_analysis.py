@@ -1,65 +1,264 @@
-import subprocess
+import os
+import sys
+import glob
 import argparse
+import multiprocessing
+import numpy as np
+from fct_file import load_fct, read_fct_chunks, split_fct, columns, parse_fct_name, FCT_NAME_FIELDS
+from quantile_sketch import LogSketch
 
-def get_pctl(a, p):
-	i = int(len(a) * p)
-	return a[i]
+# the (size, slowdown) of the flows of `type` (0: normal, 1: incast, 2: all) that finish before time_limit
+# same as fct_analysis.cpp: the slowdown is a float, and at least 1
+def get_slowdown(fct, type = 0, time_limit = 3000000000):
+	port = fct["dport"]
+	keep = ((port == 100) & (not (type & 1))) | ((port == 200) & (type > 0))
+	keep &= fct["start_time"] + fct["fct"] < time_limit
+	size = fct["size"][keep].astype(np.int64)
+	slowdown = (fct["fct"][keep].astype(np.float64) / fct["standalone_fct"][keep]).astype(np.float32)
+	return size, np.maximum(slowdown, np.float32(1))
+
+# the size buckets of sizes sorted ascending: bucket i is [l[i], r[i])
+# with steps (a list of (size, pct) as output by traffic_gen/flow_bins.py), bucket i has the flows with size in (steps[i-1].size, steps[i].size]
+# otherwise, bucket p covers the p-th to the (p+step)-th percent of the flows
+def get_buckets(sizes, step = 5, steps = None):
+	n = len(sizes)
+	if steps is not None:
+		r = np.searchsorted(sizes, [s for s, p in steps], "right")
+		l = np.concatenate(([0], r[:-1]))
+		first = [p / 100. for s, p in steps]
+		largest = [float(s) for s, p in steps]
+	else:
+		ps = np.arange(0, 100, step)
+		l = ps * n // 100
+		r = np.minimum((ps + step) * n // 100, n)
+		first = [(p + step) / 100. for p in ps]
+		largest = [float(sizes[i - 1]) if i > 0 else float("nan") for i in r]
+	return l, r, first, largest
+
+# the p50/p95/p99 slowdown of each bucket, in one sort of all flows by (bucket, slowdown)
+# returns a list of rows [first column, largest size, p50, p95, p99], the same numbers as fct_analysis.cpp
+def analyze(size, slowdown, step = 5, steps = None):
+	order = np.argsort(size, kind = "mergesort")
+	size, slowdown = size[order], slowdown[order]
+	l, r, first, largest = get_buckets(size, step, steps)
+	bucket = np.full(len(size), len(l), dtype = np.int64)
+	for i in range(len(l)):
+		bucket[l[i]:r[i]] = i
+	slowdown = slowdown[np.lexsort((slowdown, bucket))]
+	res = []
+	for i in range(len(l)):
+		row = [first[i], largest[i]]
+		for q in (0.5, 0.95, 0.99):
+			row.append(float(slowdown[l[i] + int((r[i] - l[i]) * q)]) if r[i] > l[i] else float("nan"))
+		res.append(row)
+	return res
+
+def read_steps(fileName):
+	steps = []
+	with open(fileName, "r") as f:
+		a = f.read().split()
+	for i in range(0, len(a) - 1, 2):
+		steps.append((int(a[i]), float(a[i + 1])))
+	return steps
+
+# Streaming mode: the flows of a fct file are read in chunks and never held in memory together. The file is split into
+# byte ranges (shards), each sketched by one process, and the sketches of the shards are merged.
+# Without a step file, the first pass sketches the sizes of each shard. As in the exact mode, the flows are then put in
+# buckets of -s percent by their rank, in the order of the bin of their size in the sketch, then of the file: the rank
+# of the first flow of each bin in each shard is known from the sketches, so ties (e.g. a fixed burst size) are split
+# over the buckets like in the exact mode, and the sizes are only reordered within a bin.
+# The second pass sketches the slowdowns of each size bucket. Sizes and slowdowns are within a relative error of alpha.
+STREAM_QUANTILES = (0.5, 0.95, 0.99, 0.999)
+STREAM_CHUNK = 1 << 23 # bytes of text parsed at a time
+
+def sketch_sizes(job):
+	file, begin, end, type, time_limit = job
+	sketch = LogSketch()
+	for a in read_fct_chunks(file, begin, end, STREAM_CHUNK):
+		sketch.add(get_slowdown(columns(a.T), type, time_limit)[0])
+	return sketch
+
+# the rank of the first flow of each bin in each shard, from the size sketches of the shards; returns the bin offset
+# and, for each shard, the ranks of its zero-sized flows (first) and of its flows in each bin from the offset on
+def first_ranks(sketches):
+	lo = min([s.offset for s in sketches if len(s.counts) > 0] or [0])
+	hi = max([s.offset + len(s.counts) for s in sketches if len(s.counts) > 0] or [0])
+	counts = np.zeros((len(sketches), hi - lo + 1), dtype = np.int64)
+	for i, s in enumerate(sketches):
+		counts[i, 0] = s.zero
+		counts[i, 1 + s.offset - lo : 1 + s.offset - lo + len(s.counts)] = s.counts
+	# bins in order of size, and the shards in order of the file within each bin
+	before = np.cumsum(counts.T.ravel()) - counts.T.ravel()
+	return lo, before.reshape(counts.shape[1], len(sketches)).T
+
+# the slowdown sketch and the largest size (0 if none) of each size bucket
+# with steps, bucket i has the sizes in (edges[i-1], edges[i]]; larger sizes are not in any bucket
+# otherwise, bucket i has the ranks in [ends[i-1], ends[i]), with the bin offset and the first ranks of the shard (first_ranks)
+def sketch_slowdowns(job):
+	file, begin, end, type, time_limit, edges, ends, offset, first = job
+	n_bucket = len(edges) if edges is not None else len(ends)
+	sketches = [LogSketch() for i in range(n_bucket)]
+	largest = np.zeros(n_bucket, dtype = np.int64)
+	if edges is None:
+		seen = np.zeros(len(first), dtype = np.int64) # the flows of each bin in the chunks before
+	for a in read_fct_chunks(file, begin, end, STREAM_CHUNK):
+		size, slowdown = get_slowdown(columns(a.T), type, time_limit)
+		if edges is not None:
+			bucket = np.searchsorted(edges, size, "left")
+		else:
+			b = np.zeros(len(size), dtype = np.int64)
+			pos = size > 0
+			b[pos] = sketches[0].index(size[pos]) - offset + 1
+			o = np.argsort(b, kind = "mergesort")
+			bs = b[o]
+			rank = np.empty(len(b), dtype = np.int64)
+			rank[o] = first[bs] + seen[bs] + np.arange(len(bs)) - np.searchsorted(bs, bs, "left")
+			seen += np.bincount(b, minlength = len(seen))
+			bucket = np.searchsorted(ends, rank, "right")
+		order = np.argsort(bucket, kind = "mergesort")
+		bounds = np.searchsorted(bucket[order], np.arange(n_bucket + 1))
+		for i in range(n_bucket):
+			if bounds[i + 1] > bounds[i]:
+				sketches[i].add(slowdown[order[bounds[i]:bounds[i + 1]]])
+				largest[i] = max(largest[i], size[order[bounds[i]:bounds[i + 1]]].max())
+	return sketches, largest
+
+# like analyze(get_slowdown(read_fct(file))), in memory that does not depend on the number of flows
+# each row also has p99.9
+def analyze_stream(file, type = 0, time_limit = 3000000000, step = 5, steps = None, n_worker = 1):
+	shards = split_fct(file, max(n_worker, 1))
+	pool = multiprocessing.Pool(n_worker) if n_worker > 1 else None
+	map_shards = pool.map if pool else lambda f, jobs: list(map(f, jobs))
+	if steps is not None:
+		edges = [float(s) for s, p in steps]
+		first = [p / 100. for s, p in steps]
+		jobs = [(file, b, e, type, time_limit, edges, None, 0, None) for b, e in shards]
+	else:
+		size_sketches = map_shards(sketch_sizes, [(file, b, e, type, time_limit) for b, e in shards])
+		n = sum(s.count() for s in size_sketches)
+		ps = range(0, 100, step)
+		ends = [min((p + step) * n // 100, n) for p in ps]
+		first = [(p + step) / 100. for p in ps]
+		offset, ranks = first_ranks(size_sketches)
+		jobs = [(file, b, e, type, time_limit, None, ends, offset, ranks[i]) for i, (b, e) in enumerate(shards)]
+	sketches, largest = None, None
+	for part, size in map_shards(sketch_slowdowns, jobs):
+		sketches = part if sketches is None else [a.merge(b) for a, b in zip(sketches, part)]
+		largest = size if largest is None else np.maximum(largest, size)
+	if pool:
+		pool.close()
+		pool.join()
+	if steps is None:
+		# as in the exact mode, the largest size of the flows up to the end of each bucket
+		edges = [float(x) if x > 0 else float("nan") for x in np.maximum.accumulate(largest)]
+	return [[first[i], edges[i]] + [sketches[i].quantile(q) for q in STREAM_QUANTILES] for i in range(len(edges))]
+
+# one line per bucket: the first column, the largest size, then p50 p95 p99 (and p99.9 with --stream) of each cc
+def format_table(results):
+	lines = []
+	for i in range(len(results[0])):
+		line = "%.6f %.0f"%(results[0][i][0], results[0][i][1])
+		for res in results:
+			line += "\t" + " ".join("%.3f"%x for x in res[i][2:])
+		lines.append(line)
+	return "\n".join(lines)
+
+# analyze one fct file, for the process pool of the sweep mode
+def analyze_file(job):
+	file, type, time_limit, step, steps, cache_dir, cache, stream = job
+	if stream:
+		return analyze_stream(file, type, time_limit, step, steps)
+	size, slowdown = get_slowdown(load_fct(file, cache_dir, cache), type, time_limit)
+	return analyze(size, slowdown, step, steps)
+
+# analyze all fct files of run.py in `dir` (optionally only those with the prefix and the cc in ccs), in n_worker processes
+# returns a list of (name fields, result) sorted by prefix and cc
+def sweep(dir, type, time_limit, step, steps, prefix = None, ccs = None, n_worker = None, cache_dir = None, cache = True, stream = False):
+	runs = []
+	for file in sorted(glob.glob(os.path.join(dir, "fct_*.txt"))):
+		name = parse_fct_name(file)
+		if name is None:
+			sys.stderr.write("skip %s: not named like the fct files of run.py\n"%file)
+			continue
+		if (prefix and name["prefix"] != prefix) or (ccs and name["cc"] not in ccs):
+			continue
+		runs.append((file, name))
+	jobs = [(file, type, time_limit, step, steps, cache_dir, cache, stream) for file, name in runs]
+	if n_worker is None:
+		n_worker = multiprocessing.cpu_count()
+	if n_worker > 1 and len(jobs) > 1:
+		pool = multiprocessing.Pool(min(n_worker, len(jobs)))
+		results = pool.map(analyze_file, jobs, 1)
+		pool.close()
+		pool.join()
+	else:
+		results = [analyze_file(job) for job in jobs]
+	res = sorted(zip([name for file, name in runs], results), key = lambda x: (x[0]["prefix"], x[0]["down"], x[0]["algo"], x[0]["cc"]))
+	return res
+
+# one row per (run, bucket), with the name fields of the run
+def format_csv(runs):
+	quantiles = ["p50", "p95", "p99", "p99.9"][:len(runs[0][1][0]) - 2] if runs else []
+	lines = [",".join(FCT_NAME_FIELDS + ["pct", "size"] + quantiles)]
+	for name, res in runs:
+		for row in res:
+			lines.append(",".join([name[k] for k in FCT_NAME_FIELDS] + ["%.6f"%row[0], "%.0f"%row[1]] + ["%.3f"%x for x in row[2:]]))
+	return "\n".join(lines)
 
 if __name__=="__main__":
 	parser = argparse.ArgumentParser(description='')
-	parser.add_argument('-p', dest='prefix', action='store', default='fct_fat', help="Specify the prefix of the fct file. Usually like fct_<topology>_<trace>")
+	parser.add_argument('-p', dest='prefix', action='store', help="Specify the prefix of the fct file. Usually like fct_<topology>_<trace>, by default fct_fat (with --sweep, all prefixes)")
 	parser.add_argument('-s', dest='step', action='store', default='5')
+	parser.add_argument('-S', dest='step_file', action='store', help="Specify the file of the steps, each line is <size> <pct> (see traffic_gen/flow_bins.py)")
 	parser.add_argument('-t', dest='type', action='store', type=int, default=0, help="0: normal, 1: incast, 2: all")
 	parser.add_argument('-T', dest='time_limit', action='store', type=int, default=3000000000, help="only consider flows that finish before T")
-	parser.add_argument('-b', dest='bw', action='store', type=int, default=25, help="bandwidth of edge link (Gbps)")
+	# -b (the bandwidth of the edge links) was never used, the slowdown uses the standalone fct in the fct file; it is
+	# still accepted, and ignored, so that old command lines keep working
+	parser.add_argument('-b', action='store', help=argparse.SUPPRESS)
+	parser.add_argument('-c', dest='cc', action='store', help="Specify a list of cc, separated by comma")
+	parser.add_argument('-d', dest='dir', action='store', default='../simulation/mix', help="the folder of the fct files")
+	parser.add_argument('--cache-dir', dest='cache_dir', action='store', help="the folder of the parsed fct files, by default .fct_cache in the folder of the fct files")
+	parser.add_argument('--no-cache', dest='cache', action='store_false', help="always parse the fct files, without reading or writing the cache")
+	parser.add_argument('--stream', dest='stream', action='store_true', help="analyze in bounded memory with quantile sketches (0.1%% relative error), also reporting p99.9; -j sets the number of processes per file")
+	parser.add_argument('--sweep', dest='sweep', action='store_true', help="analyze every fct file of run.py in the folder (-d), and compare all cc of each prefix")
+	parser.add_argument('-j', dest='workers', action='store', type=int, help="the number of processes of --sweep or --stream, by default the number of cores")
+	parser.add_argument('--csv', dest='csv', action='store', help="with --sweep, write one csv row per run and bucket to this file, instead of the tables")
 	args = parser.parse_args()
 
 	type = args.type
 	time_limit = args.time_limit
 
-	# Please list all the cc (together with parameters) that you want to compare.
+	# Please list all the cc (together with parameters) that you want to compare, or give them with -c.
 	# For example, here we list two CC: 1. HPCC-PINT with utgt=95,AI=50Mbps,pint_log_base=1.05,pint_prob=1; 2. HPCC with utgt=95,ai=50Mbps.
 	# For the exact naming, please check ../simulation/mix/fct_*.txt output by the simulation.
 	CCs = [
 		'hpccPint95ai50log1.05p1.000',
 		'hp95ai50',
 	]
+	if args.cc:
+		CCs = args.cc.split(',')
 
 	step = int(args.step)
-	res = [[i/100.] for i in range(0, 100, step)]
-	for cc in CCs:
-		#file = "%s_%s.txt"%(args.prefix, cc)
-		file = "../simulation/mix/%s_%s.txt"%(args.prefix, cc)
-		if type == 0:
-			cmd = "cat %s"%(file)+" | awk '{if ($4==100 && $6+$7<"+"%d"%time_limit+") {slow=$7/$8;print slow<1?1:slow, $5}}' | sort -n -k 2"
-			# print cmd
-			output = subprocess.check_output(cmd, shell=True)
-		elif type == 1:
-			cmd = "cat %s"%(file)+" | awk '{if ($4==200 && $6+$7<"+"%d"%time_limit+") {slow=$7/$8;print slow<1?1:slow, $5}}' | sort -n -k 2"
-			#print cmd
-			output = subprocess.check_output(cmd, shell=True)
+	steps = read_steps(args.step_file) if args.step_file else None
+	if args.sweep:
+		runs = sweep(args.dir, type, time_limit, step, steps, args.prefix, args.cc.split(',') if args.cc else None, args.workers, args.cache_dir, args.cache, args.stream)
+		if args.csv:
+			with open(args.csv, "w") as f:
+				f.write(format_csv(runs) + "\n")
 		else:
-			cmd = "cat %s"%(file)+" | awk '{$6+$7<"+"%d"%time_limit+") {slow=$7/$8;print slow<1?1:slow, $5}}' | sort -n -k 2"
-			#print cmd
-			output = subprocess.check_output(cmd, shell=True)
-
-		# up to here, `output` should be a string of multiple lines, each line is: fct, size
-		a = output.split('\n')[:-2]
-		n = len(a)
-		for i in range(0,100,step):
-			l = i * n / 100
-			r = (i+step) * n / 100
-			d = map(lambda x: [float(x.split()[0]), int(x.split()[1])], a[l:r])
-			fct=sorted(map(lambda x: x[0], d))
-			res[i/step].append(d[-1][1]) # flow size
-			#res[i/step].append(sum(fct) / len(fct)) # avg fct
-			res[i/step].append(get_pctl(fct, 0.5)) # mid fct
-			res[i/step].append(get_pctl(fct, 0.95)) # 95-pct fct
-			res[i/step].append(get_pctl(fct, 0.99)) # 99-pct fct
-	for item in res:
-		line = "%.3f %d"%(item[0], item[1])
-		i = 1
-		for cc in CCs:
-			line += "\t%.3f %.3f %.3f"%(item[i+1], item[i+2], item[i+3])
-			i += 4
-		print line
+			# one table per prefix, with one group of columns per cc
+			for prefix in sorted(set(name["prefix"] for name, res in runs)):
+				group = [(name, res) for name, res in runs if name["prefix"] == prefix]
+				print("# %s: %s"%(prefix, " ".join(name["cc"] + ("_down" if name["down"] == "1" else "") for name, res in group)))
+				print(format_table([res for name, res in group]))
+		sys.exit(0)
+
+	results = []
+	for cc in CCs:
+		file = os.path.join(args.dir, "%s_%s.txt"%(args.prefix or 'fct_fat', cc))
+		if args.stream:
+			results.append(analyze_stream(file, type, time_limit, step, steps, args.workers or multiprocessing.cpu_count()))
+			continue
+		size, slowdown = get_slowdown(load_fct(file, args.cache_dir, args.cache), type, time_limit)
+		results.append(analyze(size, slowdown, step, steps))
+	print(format_table(results))
@@ -0,0 +1,150 @@
+import os
+import re
+import hashlib
+import numpy as np
+
+# Each line of a fct file (simulation's output, see qp_finish() in scratch/third.cc) is:
+#   sip dip sport dport size start_time fct standalone_fct
+# sip and dip are hex, the rest are decimal; times are in ns.
+FCT_COLUMNS = ["sport", "dport", "size", "start_time", "fct", "standalone_fct"]
+
+# parse a chunk of whole lines of a fct file into an array of FCT_COLUMNS
+def parse_fct(data):
+	buf = np.frombuffer(data, dtype = np.uint8).copy()
+	starts = np.concatenate(([0], np.nonzero(buf == 10)[0] + 1))
+	starts = starts[starts < len(buf)]
+	# sip and dip are always "%08x %08x ", blank them out and parse the rest as decimal integers in C
+	if len(buf) >= 18 and (starts + 18 <= len(buf)).all() and (buf[starts + 8] == 32).all() and (buf[starts + 17] == 32).all():
+		buf[starts[:, None] + np.arange(17)] = 32
+		a = np.fromstring(buf.tobytes(), dtype = np.int64, sep = " ")
+		if len(a) == len(starts) * 6:
+			return a.reshape(-1, 6).astype(np.uint64)
+	return np.array(data.split()).reshape(-1, 8)[:, 2:].astype(np.uint64)
+
+# the sip and dip of each line of a chunk of whole lines of a fct file, as a (n, 2) array
+HEX_DIGIT = np.zeros(256, dtype = np.uint64)
+HEX_DIGIT[np.frombuffer(b"0123456789abcdef", np.uint8)] = np.arange(16)
+HEX_DIGIT[np.frombuffer(b"ABCDEF", np.uint8)] = np.arange(10, 16)
+def parse_fct_ips(data):
+	buf = np.frombuffer(data, dtype = np.uint8)
+	starts = np.concatenate(([0], np.nonzero(buf == 10)[0] + 1))
+	starts = starts[starts < len(buf)]
+	if len(buf) >= 18 and (starts + 18 <= len(buf)).all() and (buf[starts + 8] == 32).all() and (buf[starts + 17] == 32).all():
+		d = HEX_DIGIT[buf[starts[:, None] + np.arange(17)]]
+		shift = (np.uint64(4) * np.arange(7, -1, -1)).astype(np.uint64)
+		return np.stack([(d[:, :8] << shift).sum(1), (d[:, 9:] << shift).sum(1)], 1).astype(np.uint64)
+	return np.array([[int(x, 16) for x in line.split()[:2]] for line in data.splitlines() if line.strip()], dtype = np.uint64).reshape(-1, 2)
+
+# read the lines of a fct file that start in bytes [begin, end) (by default the whole file), in chunks of about `chunk` bytes
+# yield an array of FCT_COLUMNS per chunk (or what parse gives); the ranges of a split of the file read every line exactly once
+def read_fct_chunks(fileName, begin = 0, end = None, chunk = 1 << 26, parse = parse_fct):
+	with open(fileName, "rb") as f:
+		if end is None:
+			end = os.fstat(f.fileno()).st_size
+		if begin > 0:
+			# skip the line that started before begin
+			f.seek(begin - 1)
+			f.readline()
+		pos = f.tell()
+		rest = b""
+		while pos < end:
+			data = f.read(min(chunk, end - pos))
+			if not data:
+				break
+			pos += len(data)
+			data = rest + data
+			if pos >= end and not data.endswith(b"\n"):
+				# finish the last line, which started before end
+				data += f.readline()
+			cut = data.rfind(b"\n") + 1
+			data, rest = data[:cut], data[cut:]
+			if data:
+				yield parse(data)
+		if rest.strip():
+			yield parse(rest + b"\n")
+
+# split a fct file into n byte ranges [begin, end) for read_fct_chunks
+def split_fct(fileName, n):
+	size = os.path.getsize(fileName)
+	bounds = [size * i // n for i in range(n + 1)]
+	return list(zip(bounds[:-1], bounds[1:]))
+
+# read a fct file into a dict of arrays keyed by FCT_COLUMNS (sip and dip are not used by the analysis)
+def read_fct(fileName, chunk = 1 << 26):
+	parts = list(read_fct_chunks(fileName, chunk = chunk))
+	a = np.concatenate(parts) if parts else np.zeros((0, 6), dtype = np.uint64)
+	return columns(np.ascontiguousarray(a.T))
+
+# the sip and dip of the lines of a fct file, in the same order as read_fct
+def read_fct_ips(fileName, chunk = 1 << 26):
+	parts = list(read_fct_chunks(fileName, chunk = chunk, parse = parse_fct_ips))
+	a = np.concatenate(parts) if parts else np.zeros((0, 2), dtype = np.uint64)
+	return np.ascontiguousarray(a[:, 0]), np.ascontiguousarray(a[:, 1])
+
+# a (len(FCT_COLUMNS), n) array -> dict of the columns
+def columns(a):
+	return dict((c, a[i]) for i, c in enumerate(FCT_COLUMNS))
+
+# The fct files written by simulation/run.py are named mix/fct_<topology>_<trace>_<cc><failure>.txt, where cc is the cc
+# mode with its parameters (e.g., hp95ai50, hpccPint95ai50log1.050p1.000, dcqcn_paper) and failure is "_down" with a link down
+CC_NAME = re.compile(r"_(?P<cc>(?P<algo>dcqcn_paper_vwin|dcqcn_paper|dcqcn_vwin|dcqcn|dctcp|timely_vwin|timely)"
+	r"|(?P<hpcc>hpccPint|hp)(?P<utgt>\d+)(?:mi(?P<mi>\d+))?(?:ai(?P<ai>\d+))?(?:log(?P<pint_log_base>[\d.]+)p(?P<pint_prob>[\d.]+))?)(?P<down>_down)?\.txt$")
+FCT_NAME_FIELDS = ["prefix", "cc", "algo", "utgt", "mi", "ai", "pint_log_base", "pint_prob", "down"]
+
+# decode the name of a fct file into a dict of FCT_NAME_FIELDS (the fields a cc does not have are "")
+# prefix is fct_<topology>_<trace>, as used by fct_analysis.py -p; returns None if it is not a fct file of run.py
+def parse_fct_name(fileName):
+	name = os.path.basename(fileName)
+	m = CC_NAME.search(name)
+	if not name.startswith("fct_") or m is None or m.start() <= len("fct"):
+		return None
+	d = dict((k, v or "") for k, v in m.groupdict().items())
+	if d["hpcc"]:
+		# hpccPint always has log and p, hp never does
+		if (d["hpcc"] == "hpccPint") != (d["pint_log_base"] != ""):
+			return None
+		d["algo"] = d["hpcc"]
+	d["prefix"] = name[:m.start()]
+	d["down"] = "1" if d["down"] else "0"
+	return dict((k, d[k]) for k in FCT_NAME_FIELDS)
+
+# The cache of a fct file is its columns saved as a (len(FCT_COLUMNS), n) uint64 npy file, so each column is contiguous.
+# It is keyed by the absolute path, size and mtime of the fct file: a fct file rewritten by a new simulation gets a new cache file.
+def cache_key(fileName):
+	st = os.stat(fileName)
+	mtime = getattr(st, "st_mtime_ns", None) or int(st.st_mtime * 1e9)
+	path = hashlib.sha1(os.path.abspath(fileName).encode("utf-8")).hexdigest()[:16]
+	return path, "%s_%d_%d"%(path, st.st_size, mtime)
+
+def default_cache_dir(fileName):
+	return os.path.join(os.path.dirname(os.path.abspath(fileName)), ".fct_cache")
+
+# read a fct file through the cache: the first time it is parsed and saved, later it is memory-mapped from the cache
+# cache_dir=None uses .fct_cache in the folder of the fct file; cache=False always parses the file
+def load_fct(fileName, cache_dir = None, cache = True):
+	if not cache:
+		return read_fct(fileName)
+	if cache_dir is None:
+		cache_dir = default_cache_dir(fileName)
+	path, key = cache_key(fileName)
+	cache_file = os.path.join(cache_dir, key + ".npy")
+	if os.path.exists(cache_file):
+		try:
+			return columns(np.load(cache_file, mmap_mode = "r"))
+		except (IOError, OSError, ValueError):
+			pass # a broken cache file, parse again
+	fct = read_fct(fileName)
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		# remove the cache files of older versions of this fct file
+		for f in os.listdir(cache_dir):
+			if f.startswith(path + "_"):
+				os.remove(os.path.join(cache_dir, f))
+		# write to a temporary file and rename, so that a concurrent reader never sees half a file
+		tmp = "%s.%d.npy"%(cache_file[:-4], os.getpid())
+		np.save(tmp, np.array([fct[c] for c in FCT_COLUMNS]))
+		os.rename(tmp, cache_file)
+	except (IOError, OSError):
+		pass # e.g., the folder is read-only; the columns are still returned
+	return fct
@@ -0,0 +1,417 @@
+import sys
+import argparse
+import numpy as np
+from trace_reader import open_trace, L3_TCP, L3_UDP, L3_ACK, L3_NACK, L3_CNP, RECV, ENQU, DEQU, DROP
+
+# Per-flow timelines of a .tr file (or a packed trace), in one pass over the records.
+# A flow is (sip, dip, sport, dport, pg) in the direction of its data; its ACKs, NACKs and CNPs go the other way and are
+# counted with it (a CNP has no dport, so it goes to the flow with the same sip, dip, sport and pg).
+# For each flow, and for each hop (node, intf) of its data packets, the records are reduced to the columns below:
+#   - the queueing delay of a data packet at a hop is the time between its Enqu and its Dequ, matched in FIFO order in
+#     each queue (node, intf, qidx) of the flow, and qlen is the queue length seen by its Enqu
+#   - sent is the data Dequ at the source host, received the data Recv at the destination host
+#   - ack/nack/cnp are received at the source host; an rtt sample is taken for each ACK/NACK that acknowledges more than
+#     before: its time minus the last time the data packet ending at its seq was sent
+# Only the active flows are kept: a flow is written out when it completes (its start + fct in the fct file, if given),
+# or when it has had no record for `idle` ns; a flow with records after that starts a new row.
+FLOW_KEY = ["sip", "dip", "sport", "dport", "pg"]
+FLOW_COLUMNS = FLOW_KEY + ["first", "last", "sent", "sent_bytes", "received", "received_bytes", "ecn_received", "cnp", "ack", "nack",
+	"rtt_count", "rtt_mean", "rtt_max", "hops", "qdelay_count", "qdelay_mean", "qdelay_max", "drop"]
+HOP_COLUMNS = FLOW_KEY + ["node", "intf", "first", "last", "enqueued", "packets", "bytes", "qlen_mean", "qlen_max",
+	"qdelay_count", "qdelay_mean", "qdelay_max", "ecn", "drop"]
+
+# how the partial columns of a flow and of a hop are merged
+FLOW_SUM = ["sent", "sent_bytes", "received", "received_bytes", "ecn_received", "cnp", "ack", "nack", "rtt_count", "rtt_sum", "qdelay_count", "qdelay_sum", "drop"]
+FLOW_MAX = ["last", "acked", "rtt_max", "qdelay_max"]
+FLOW_MIN = ["first"]
+HOP_SUM = ["enqueued", "packets", "bytes", "qlen_sum", "qdelay_count", "qdelay_sum", "ecn", "drop"]
+HOP_MAX = ["last", "qlen_max", "qdelay_max"]
+HOP_MIN = ["first"]
+
+CE = 3 # ecn bits of a packet marked with congestion experienced
+U64 = np.uint64
+
+# the node of an ip, as node_id_to_ip() in scratch/third.cc
+def node_of(ip):
+	return (ip >> U64(8)) & U64(0xffff)
+
+# dense ids of the (hi, lo) keys: the unique keys and the id of each key
+def unique_keys(hi, lo):
+	k = np.empty((len(hi), 2), dtype = np.uint64)
+	k[:, 0], k[:, 1] = hi, lo
+	u, inv = np.unique(k.view("V16").ravel(), return_inverse = True)
+	u = u.view(np.uint64).reshape(-1, 2)
+	return u[:, 0].copy(), u[:, 1].copy(), inv.ravel()
+
+# the positions, in the order of a stable sort of ids, where a group of equal ids starts
+def group_starts(ids_sorted):
+	first = np.ones(len(ids_sorted), dtype = bool)
+	first[1:] = ids_sorted[1:] != ids_sorted[:-1]
+	return first
+
+# for each i, its rank among the i's with the same id, in the order they come
+def rank_in_group(ids):
+	order = np.argsort(ids, kind = "mergesort")
+	first = group_starts(ids[order])
+	start = np.maximum.accumulate(np.where(first, np.arange(len(ids)), 0))
+	rank = np.empty(len(ids), dtype = np.int64)
+	rank[order] = np.arange(len(ids)) - start
+	return rank
+
+# match the Dequ of each queue with its Enqu in FIFO order (q: the queue of each, pos: their order); a Dequ when no Enqu
+# is waiting (e.g., its Enqu was before the records) is not matched. Returns the indices of the matched Enqu and Dequ
+def fifo_match(e_q, e_pos, d_q, d_pos):
+	n_e = len(e_q)
+	g = np.concatenate([e_q, d_q])
+	order = np.lexsort((np.concatenate([e_pos, d_pos]), g))
+	is_e = order < n_e
+	first = group_starts(g[order])
+	gidx = np.cumsum(first) - 1
+	# the number of Enqu waiting after each event, as a running sum clamped at 0
+	x = np.where(is_e, 1, -1)
+	c = np.cumsum(x)
+	c -= (c - x)[first][gidx]
+	k = 2 * len(g) + 2
+	waiting = c - np.minimum(np.minimum.accumulate(c - gidx * k) + gidx * k, 0)
+	before = np.zeros(len(g), dtype = np.int64)
+	before[1:] = waiting[:-1]
+	before[first] = 0
+	keep = is_e | (before > 0)
+	# then the k-th matched Dequ of a queue goes with its k-th Enqu
+	idx, gk, ek = order[keep], gidx[keep], is_e[keep]
+	w = len(g) + 1
+	_, ie, id_ = np.intersect1d(gk[ek] * w + rank_in_group(gk[ek]), gk[~ek] * w + rank_in_group(gk[~ek]), assume_unique = True, return_indices = True)
+	return idx[ek][ie], idx[~ek][id_] - n_e
+
+class Reducer:
+	# collect (ids, values) for each column, then merge them into n rows by sum, max or min
+	def __init__(self, n):
+		self.n = n
+		self.parts = {}
+
+	def add(self, col, ids, values):
+		self.parts.setdefault(col, []).append((ids, np.asarray(values, dtype = np.int64)))
+
+	def add_table(self, table, ids, cols):
+		for c in cols:
+			self.add(c, ids, table[c])
+
+	def reduce(self, col, how):
+		parts = self.parts.get(col, [])
+		ids = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, dtype = np.int64)
+		v = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, dtype = np.int64)
+		if how == "sum":
+			out = np.zeros(self.n, dtype = np.int64)
+			if len(ids) > 0:
+				order = np.argsort(ids, kind = "mergesort")
+				first = group_starts(ids[order])
+				out[ids[order][first]] = np.add.reduceat(v[order], np.nonzero(first)[0])
+			return out
+		out = np.full(self.n, -1 if how == "max" else np.iinfo(np.int64).max, dtype = np.int64)
+		if len(ids) > 0:
+			order = np.lexsort((v, ids))
+			s = ids[order]
+			last = np.ones(len(s), dtype = bool)
+			if how == "max":
+				last[:-1] = s[1:] != s[:-1]
+			else:
+				last[1:] = s[1:] != s[:-1]
+			out[s[last]] = v[order][last]
+		return out
+
+	def result(self, sums, maxs, mins):
+		res = dict((c, self.reduce(c, "sum")) for c in sums)
+		res.update((c, self.reduce(c, "max")) for c in maxs)
+		res.update((c, self.reduce(c, "min")) for c in mins)
+		return res
+
+def take(table, idx):
+	return dict((c, v[idx]) for c, v in table.items())
+
+def empty(cols):
+	return dict((c, np.zeros(0, dtype = np.uint64 if c in ("hi", "lo") else np.int64)) for c in cols)
+
+def concat(tables):
+	return dict((c, np.concatenate([t[c] for t in tables])) for c in tables[0])
+
+class FlowTimeline:
+	# end: (flow_ints, end_times) of the flows whose completion time is known, e.g. from a fct file
+	def __init__(self, idle = None, end = None):
+		self.idle = idle
+		self.end = None
+		if end is not None:
+			order = np.argsort(end[0], kind = "mergesort")
+			self.end = (end[0][order], np.asarray(end[1], dtype = np.int64)[order])
+		self.flows = empty(["hi", "lo"] + FLOW_SUM + FLOW_MAX + FLOW_MIN)
+		self.hops = empty(["hi", "lo", "node", "intf"] + HOP_SUM + HOP_MAX + HOP_MIN)
+		self.enq = empty(["hi", "lo", "node", "intf", "qidx", "time", "qlen"]) # Enqu not dequeued yet
+		self.sent = empty(["hi", "lo", "seq", "time"]) # the last send of each data packet not acknowledged yet
+		self.out_flows, self.out_hops = [], []
+
+	# add a block of records (in time order)
+	def add(self, r):
+		if len(r) == 0:
+			return
+		l3, ev, node = r["l3Prot"], r["event"], r["node"].astype(np.int64)
+		is_data = (l3 == L3_TCP) | (l3 == L3_UDP)
+		is_ack = (l3 == L3_ACK) | (l3 == L3_NACK)
+		is_cnp = l3 == L3_CNP
+		sel = is_data | is_ack | is_cnp
+		r, l3, ev, node, is_data, is_ack, is_cnp = r[sel], l3[sel], ev[sel], node[sel], is_data[sel], is_ack[sel], is_cnp[sel]
+		if len(r) == 0:
+			return
+		t = r["time"].astype(np.int64)
+		sip, dip = r["sip"].astype(np.uint64), r["dip"].astype(np.uint64)
+		# the key of the flow, in the direction of its data
+		hi = np.where(is_data, (sip << U64(32)) | dip, (dip << U64(32)) | sip)
+		sport = np.where(is_data, r["data"]["sport"], np.where(is_ack, r["ack"]["dport"], r["cnp"]["fid"])).astype(np.uint64)
+		dport = np.where(is_data, r["data"]["dport"], np.where(is_ack, r["ack"]["sport"], 0)).astype(np.uint64)
+		pg = np.where(is_data, r["data"]["pg"], np.where(is_ack, r["ack"]["pg"], r["cnp"]["qIndex"])).astype(np.uint64)
+		lo = (sport << U64(32)) | (dport << U64(16)) | pg
+		lo[is_cnp] = self.resolve_cnp(hi[is_cnp], lo[is_cnp], hi[~is_cnp], lo[~is_cnp])
+
+		# dense ids of the flows of the state and of the block
+		n_state = len(self.flows["hi"])
+		u_hi, u_lo, inv = unique_keys(np.concatenate([self.flows["hi"], hi]), np.concatenate([self.flows["lo"], lo]))
+		n = len(u_hi)
+		state_fid, fid = inv[:n_state], inv[n_state:]
+		fid_of = self.fid_lookup(u_hi, u_lo)
+		src, dst = node_of(u_hi >> U64(32)).astype(np.int64), node_of(u_hi & U64(0xffffffff)).astype(np.int64)
+		at_src, at_dst = node == src[fid], node == dst[fid]
+
+		flows = Reducer(n)
+		flows.add_table(self.flows, state_fid, FLOW_SUM + FLOW_MAX + FLOW_MIN)
+		flows.add("first", fid, t)
+		flows.add("last", fid, t)
+		size = r["size"].astype(np.int64)
+		m = is_data & (ev == DEQU) & at_src
+		flows.add("sent", fid[m], np.ones(m.sum()))
+		flows.add("sent_bytes", fid[m], size[m])
+		m = is_data & (ev == RECV) & at_dst
+		flows.add("received", fid[m], np.ones(m.sum()))
+		flows.add("received_bytes", fid[m], size[m])
+		m &= r["ecn"] == CE
+		flows.add("ecn_received", fid[m], np.ones(m.sum()))
+		recv_at_src = (ev == RECV) & at_src
+		for col, m in (("cnp", is_cnp & recv_at_src), ("ack", (l3 == L3_ACK) & recv_at_src), ("nack", (l3 == L3_NACK) & recv_at_src)):
+			flows.add(col, fid[m], np.ones(m.sum()))
+		m = is_data & (ev == DROP)
+		flows.add("drop", fid[m], np.ones(m.sum()))
+
+		# rtt samples: the ACK/NACK at the source that acknowledge more than before, with the last send of their seq
+		a = is_ack & recv_at_src
+		a_fid, a_seq, a_t = fid[a], r["ack"]["seq"][a].astype(np.int64), t[a]
+		acked = np.full(n, -1, dtype = np.int64)
+		acked[state_fid] = self.flows["acked"]
+		order = np.argsort(a_fid, kind = "mergesort")
+		c = np.maximum.accumulate((a_fid[order] << 32) | a_seq[order])
+		prev = np.full(len(order), -1, dtype = np.int64)
+		same = ~group_starts(a_fid[order])
+		prev[1:][same[1:]] = c[:-1][same[1:]] & 0xffffffff
+		new_ack = np.zeros(len(order), dtype = bool)
+		new_ack[order] = a_seq[order] > np.maximum(prev, acked[a_fid[order]])
+		flows.add("acked", a_fid, a_seq)
+		s = is_data & (ev == DEQU) & at_src
+		s_fid = np.concatenate([fid_of(self.sent["hi"], self.sent["lo"]), fid[s]])
+		s_seq = np.concatenate([self.sent["seq"], (r["data"]["seq"][s].astype(np.int64) + r["data"]["payload"][s]) & 0xffffffff])
+		s_t = np.concatenate([self.sent["time"], t[s]])
+		key = np.concatenate([(s_fid << 32) | s_seq, (a_fid[new_ack] << 32) | a_seq[new_ack]])
+		tt = np.concatenate([s_t, a_t[new_ack]])
+		tag = np.concatenate([np.zeros(len(s_fid), dtype = np.int64), np.ones(new_ack.sum(), dtype = np.int64)])
+		order = np.lexsort((tag, tt, key))
+		key, tt, tag = key[order], tt[order], tag[order]
+		last_send = np.maximum.accumulate(np.where(tag == 0, np.arange(len(key)), -1))
+		m = (tag == 1) & (last_send >= 0)
+		m[m] = key[last_send[m]] == key[m]
+		rtt = tt[m] - tt[last_send[m]]
+		flows.add("rtt_count", key[m] >> 32, np.ones(len(rtt)))
+		flows.add("rtt_sum", key[m] >> 32, rtt)
+		flows.add("rtt_max", key[m] >> 32, rtt)
+		# keep the last send of each seq, until it is acknowledged
+		last = np.zeros(len(key), dtype = bool)
+		last[:-1] = key[1:] != key[:-1]
+		last[-1:] = True
+		keep = last & (tag == 0)
+		key, tt = key[keep], tt[keep]
+
+		# queueing delay: the Enqu and Dequ of a queue and a flow
+		e = is_data & (ev == ENQU)
+		d = is_data & (ev == DEQU)
+		e_fid = np.concatenate([fid_of(self.enq["hi"], self.enq["lo"]), fid[e]])
+		e_node = np.concatenate([self.enq["node"], node[e]])
+		e_intf = np.concatenate([self.enq["intf"], r["intf"][e]])
+		e_q = (e_fid << 32) | (e_node << 16) | (e_intf << 8) | np.concatenate([self.enq["qidx"], r["qidx"][e]])
+		e_t = np.concatenate([self.enq["time"], t[e]])
+		e_qlen = np.concatenate([self.enq["qlen"], r["qlen"][e]])
+		d_fid, d_node, d_intf = fid[d], node[d], r["intf"][d].astype(np.int64)
+		d_q = (d_fid << 32) | (d_node << 16) | (d_intf << 8) | r["qidx"][d]
+		pos = np.arange(len(r))
+		ie, id_ = fifo_match(e_q, np.concatenate([np.arange(-len(self.enq["time"]), 0), pos[e]]), d_q, pos[d])
+		delay = t[d][id_] - e_t[ie]
+		flows.add("qdelay_count", d_fid[id_], np.ones(len(id_)))
+		flows.add("qdelay_sum", d_fid[id_], delay)
+		flows.add("qdelay_max", d_fid[id_], delay)
+		pending = np.ones(len(e_q), dtype = bool)
+		pending[ie] = False
+
+		self.flows = flows.result(FLOW_SUM, FLOW_MAX, FLOW_MIN)
+		self.flows["hi"], self.flows["lo"] = u_hi, u_lo
+
+		# hops: (flow, node, intf) of the data Enqu, Dequ and Drop
+		h = is_data & ((ev == ENQU) | (ev == DEQU) | (ev == DROP))
+		h_key = (fid[h] << 24) | (node[h] << 8) | r["intf"][h]
+		state_key = (fid_of(self.hops["hi"], self.hops["lo"]) << 24) | (self.hops["node"] << 8) | self.hops["intf"]
+		u_hop, inv = np.unique(np.concatenate([state_key, h_key, (d_fid[id_] << 24) | (d_node[id_] << 8) | d_intf[id_]]), return_inverse = True)
+		inv = inv.ravel()
+		state_hid, hid, match_hid = inv[:len(state_key)], inv[len(state_key):len(state_key) + len(h_key)], inv[len(state_key) + len(h_key):]
+		hops = Reducer(len(u_hop))
+		hops.add_table(self.hops, state_hid, HOP_SUM + HOP_MAX + HOP_MIN)
+		hops.add("first", hid, t[h])
+		hops.add("last", hid, t[h])
+		for col, m in (("enqueued", ev[h] == ENQU), ("packets", ev[h] == DEQU), ("ecn", (ev[h] == DEQU) & (r["ecn"][h] == CE)), ("drop", ev[h] == DROP)):
+			hops.add(col, hid[m], np.ones(m.sum()))
+		m = ev[h] == DEQU
+		hops.add("bytes", hid[m], size[h][m])
+		m = ev[h] == ENQU
+		hops.add("qlen_sum", hid[m], r["qlen"][h][m])
+		hops.add("qlen_max", hid[m], r["qlen"][h][m])
+		hops.add("qdelay_count", match_hid, np.ones(len(match_hid)))
+		hops.add("qdelay_sum", match_hid, delay)
+		hops.add("qdelay_max", match_hid, delay)
+		self.hops = hops.result(HOP_SUM, HOP_MAX, HOP_MIN)
+		h_fid = (u_hop >> 24).astype(np.int64)
+		self.hops["hi"], self.hops["lo"] = u_hi[h_fid], u_lo[h_fid]
+		self.hops["node"], self.hops["intf"] = (u_hop >> 8) & 0xffff, u_hop & 0xff
+
+		# what is left for the next blocks, then the flows that are done
+		k_fid = key >> 32
+		keep = (key & 0xffffffff) > self.flows["acked"][k_fid]
+		self.sent = {"hi": u_hi[k_fid[keep]], "lo": u_lo[k_fid[keep]], "seq": key[keep] & 0xffffffff, "time": tt[keep]}
+		self.enq = {"hi": u_hi[e_fid[pending]], "lo": u_lo[e_fid[pending]], "node": e_node[pending], "intf": e_intf[pending].astype(np.int64),
+			"qidx": (e_q[pending] & 0xff), "time": e_t[pending], "qlen": e_qlen[pending].astype(np.int64)}
+		self.evict(self.done(int(t[-1])))
+
+	# the flows of a CNP (hi, lo without dport): the flow of the state or of the block with the same sip, dip, sport and pg
+	def resolve_cnp(self, hi, lo, b_hi, b_lo):
+		if len(hi) == 0:
+			return lo
+		mask = ~U64(0xffff << 16)
+		f_hi = np.concatenate([self.flows["hi"], b_hi])
+		f_lo = np.concatenate([self.flows["lo"], b_lo])
+		_, _, inv = unique_keys(np.concatenate([f_hi, hi]), np.concatenate([f_lo & mask, lo & mask]))
+		flow_of = np.full(inv.max() + 1, -1, dtype = np.int64)
+		flow_of[inv[:len(f_hi)][::-1]] = np.arange(len(f_hi))[::-1]
+		f = flow_of[inv[len(f_hi):]]
+		return np.where(f >= 0, f_lo[np.maximum(f, 0)], lo)
+
+	# the id in (u_hi, u_lo) of keys that are in it
+	def fid_lookup(self, u_hi, u_lo):
+		def fid_of(hi, lo):
+			if len(hi) == 0:
+				return np.zeros(0, dtype = np.int64)
+			_, _, inv = unique_keys(np.concatenate([u_hi, hi]), np.concatenate([u_lo, lo]))
+			pos = np.full(inv.max() + 1, -1, dtype = np.int64)
+			pos[inv[:len(u_hi)]] = np.arange(len(u_hi))
+			return pos[inv[len(u_hi):]]
+		return fid_of
+
+	# the flows that are done at time now: completed, or idle for too long
+	def done(self, now):
+		f = self.flows
+		d = np.zeros(len(f["hi"]), dtype = bool)
+		if self.idle is not None:
+			d |= f["last"] + self.idle < now
+		if self.end is not None and len(self.end[0]) > 0:
+			hi, lo = f["hi"], f["lo"]
+			fi = (node_of(hi >> U64(32)) << U64(48)) | (node_of(hi & U64(0xffffffff)) << U64(32)) | ((lo >> U64(16)) & U64(0xffffffff))
+			i = np.minimum(np.searchsorted(self.end[0], fi), len(self.end[0]) - 1)
+			d |= (self.end[0][i] == fi) & (self.end[1][i] < now)
+		return d
+
+	def evict(self, d):
+		if not d.any():
+			return
+		fid_of = self.fid_lookup(self.flows["hi"], self.flows["lo"])
+		hop_fid = fid_of(self.hops["hi"], self.hops["lo"])
+		hop_done = d[hop_fid]
+		out = take(self.flows, d)
+		out["hops"] = np.bincount(hop_fid[hop_done], minlength = len(d))[d]
+		self.out_flows.append(out)
+		self.out_hops.append(take(self.hops, hop_done))
+		self.flows = take(self.flows, ~d)
+		self.hops = take(self.hops, ~hop_done)
+		self.enq = take(self.enq, ~d[fid_of(self.enq["hi"], self.enq["lo"])])
+		self.sent = take(self.sent, ~d[fid_of(self.sent["hi"], self.sent["lo"])])
+
+	# write out all the flows; returns the (flows, hops) tables of FLOW_COLUMNS and HOP_COLUMNS
+	def finish(self):
+		self.evict(np.ones(len(self.flows["hi"]), dtype = bool))
+		flows = concat(self.out_flows) if self.out_flows else empty(["hi", "lo", "hops"] + FLOW_SUM + FLOW_MAX + FLOW_MIN)
+		hops = concat(self.out_hops) if self.out_hops else empty(["hi", "lo", "node", "intf"] + HOP_SUM + HOP_MAX + HOP_MIN)
+		return output(flows, FLOW_COLUMNS), output(hops, HOP_COLUMNS)
+
+def mean(s, c):
+	with np.errstate(invalid = "ignore", divide = "ignore"):
+		return np.where(c > 0, s / np.maximum(c, 1).astype(np.float64), np.nan)
+
+# the columns of a table of flows or hops, sorted by flow and first time
+def output(t, cols):
+	hi, lo = t["hi"], t["lo"]
+	t["sip"], t["dip"] = hi >> U64(32), hi & U64(0xffffffff)
+	t["sport"], t["dport"], t["pg"] = lo >> U64(32), (lo >> U64(16)) & U64(0xffff), lo & U64(0xffff)
+	for c in ("rtt", "qdelay", "qlen"):
+		if c + "_sum" in t:
+			t[c + "_mean"] = mean(t[c + "_sum"], t[c + "_count"] if c != "qlen" else t["enqueued"])
+	for c in ("rtt_max", "qdelay_max", "qlen_max"):
+		if c in t:
+			t[c] = np.where(t[c] >= 0, t[c], 0)
+	order = np.lexsort(tuple(t[c] for c in ["first"] + (["intf", "node"] if "node" in cols else []) + FLOW_KEY[::-1]))
+	return dict((c, t[c][order]) for c in cols)
+
+def save_timeline(fileName, flows, hops):
+	arrays = dict(("flow." + c, v) for c, v in flows.items())
+	arrays.update(("hop." + c, v) for c, v in hops.items())
+	np.savez(fileName, **arrays)
+
+# the (flows, hops) tables of a file written by save_timeline
+def load_timeline(fileName):
+	z = np.load(fileName)
+	return dict((c, z["flow." + c]) for c in FLOW_COLUMNS), dict((c, z["hop." + c]) for c in HOP_COLUMNS)
+
+# (flow_ints, end times) of the flows of a fct file
+def read_fct_end(fileName):
+	from fct_file import read_fct, read_fct_ips
+	fct = read_fct(fileName)
+	sip, dip = read_fct_ips(fileName)
+	fi = (node_of(sip) << U64(48)) | (node_of(dip) << U64(32)) | (fct["sport"] << U64(16)) | fct["dport"]
+	return fi, (fct["start_time"] + fct["fct"]).astype(np.int64)
+
+def timeline(trace, expr = None, idle = None, end = None):
+	tl = FlowTimeline(idle, end)
+	for r in trace.filter(expr):
+		tl.add(r)
+	return tl.finish()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "per-flow timelines of a .tr file")
+	parser.add_argument("trace", help = "the .tr file (or a packed trace)")
+	parser.add_argument("filter", nargs = "?", help = "only use the records that pass this filter expression (see trace_reader)")
+	parser.add_argument("-o", dest = "output", help = "the output file (.npz), by default <trace>.flows.npz")
+	parser.add_argument("-f", dest = "fct", help = "the fct file of the run, to write out each flow when it completes")
+	parser.add_argument("-i", dest = "idle", type = int, default = 10000000, help = "write out a flow that has had no record for this long (ns), by default 10000000; 0 to keep all flows to the end")
+	parser.add_argument("--csv", action = "store_true", help = "also print the flows as csv")
+	args = parser.parse_args()
+
+	trace = open_trace(args.trace)
+	try:
+		flows, hops = timeline(trace, args.filter, args.idle or None, read_fct_end(args.fct) if args.fct else None)
+	except ValueError:
+		print("Invalid filter")
+		sys.exit(0)
+	output_file = args.output or args.trace + ".flows.npz"
+	save_timeline(output_file, flows, hops)
+	sys.stderr.write("%s: %d flows, %d hops\n"%(output_file, len(flows["sip"]), len(hops["sip"])))
+	if args.csv:
+		print(",".join(FLOW_COLUMNS))
+		for row in zip(*[flows[c].tolist() for c in FLOW_COLUMNS]):
+			print(",".join("%08x"%v if i < 2 else "%.1f"%v if isinstance(v, float) else str(v) for i, v in enumerate(row)))
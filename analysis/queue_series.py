@@ -0,0 +1,152 @@
+import sys
+import argparse
+import numpy as np
+from trace_reader import open_trace, ENQU, DEQU
+
+# Queue-occupancy time series of a .tr file (or a packed trace).
+# The qlen of an Enqu or Dequ record is the bytes in its queue (node, intf, qidx) at that event. Time is cut into bins
+# of `bin` ns (aligned to multiples of bin), and for each queue and each bin with events, the qlen of its events is
+# reduced to the number of events, mean, max, percentiles, and the qlen after the last event, which holds until the next
+# event of the queue. For each port (node, intf), the bytes of its Dequ in each bin give its tx rate, and with the
+# port_speed of the SimSetting header, its utilization.
+QUEUE_COLUMNS = ["node", "intf", "qidx", "time", "events", "mean", "max", "last"]
+PORT_COLUMNS = ["node", "intf", "time", "tx_bytes", "utilization"]
+PERCENTILES = [50, 99]
+
+# the start of each group of the sorted ids, and the number of ids in it
+def groups(ids_sorted):
+	first = np.ones(len(ids_sorted), dtype = bool)
+	first[1:] = ids_sorted[1:] != ids_sorted[:-1]
+	start = np.nonzero(first)[0]
+	return start, np.diff(np.append(start, len(ids_sorted)))
+
+class QueueSeries:
+	def __init__(self, bin, port_speed, percentiles = PERCENTILES):
+		self.bin = bin
+		self.port_speed = port_speed
+		self.percentiles = percentiles
+		# the records of the last bin seen, which may go on in the next block: kept as the parts of the blocks it spans,
+		# and concatenated once when the bin is complete, so a bin spanning many blocks is not copied at each block
+		self.carry, self.carry_bin = [], None
+		self.queues, self.ports = [], []
+
+	# add a block of records (in time order)
+	def add(self, r):
+		r = r[(r["event"] == ENQU) | (r["event"] == DEQU)]
+		if len(r) == 0:
+			return
+		b = r["time"] // np.uint64(self.bin)
+		if self.carry and b[-1] == self.carry_bin:
+			# the whole block is still in the last bin
+			self.carry.append(r)
+			return
+		i = np.searchsorted(b, b[-1], "left")
+		if i > 0 or self.carry:
+			done = np.concatenate(self.carry + [r[:i]])
+			self.reduce(done, done["time"] // np.uint64(self.bin))
+		self.carry, self.carry_bin = [r[i:]], b[-1]
+
+	def finish(self):
+		if self.carry:
+			r = np.concatenate(self.carry)
+			self.reduce(r, r["time"] // np.uint64(self.bin))
+		self.carry, self.carry_bin = [], None
+		queues = concat(self.queues, QUEUE_COLUMNS + self.percentile_columns())
+		ports = concat(self.ports, PORT_COLUMNS)
+		order = np.lexsort((queues["time"], queues["qidx"], queues["intf"], queues["node"]))
+		queues = dict((c, v[order]) for c, v in queues.items())
+		order = np.lexsort((ports["time"], ports["intf"], ports["node"]))
+		ports = dict((c, v[order]) for c, v in ports.items())
+		return queues, ports
+
+	def percentile_columns(self):
+		return ["p%g"%p for p in self.percentiles]
+
+	# reduce whole bins of records (b: the bin of each record), keyed by bin (from the first one), node, intf and qidx
+	def reduce(self, r, b):
+		node, intf, qidx = r["node"].astype(np.uint64), r["intf"].astype(np.uint64), r["qidx"].astype(np.uint64)
+		qlen = r["qlen"].astype(np.int64)
+		b0 = b[0]
+		key = ((b - b0) << np.uint64(32)) | (node << np.uint64(16)) | (intf << np.uint64(8)) | qidx
+
+		# queues: the qlen sorted within each (bin, queue), for the max and the percentiles (nearest rank)
+		order = np.lexsort((qlen, key))
+		k, v = key[order], qlen[order]
+		start, count = groups(k)
+		q = {"node": (k[start] >> np.uint64(16)) & np.uint64(0xffff), "intf": (k[start] >> np.uint64(8)) & np.uint64(0xff),
+			"qidx": k[start] & np.uint64(0xff), "time": ((k[start] >> np.uint64(32)) + b0) * np.uint64(self.bin), "events": count,
+			"mean": np.add.reduceat(v, start) / count.astype(np.float64), "max": v[start + count - 1]}
+		for p, c in zip(self.percentiles, self.percentile_columns()):
+			q[c] = v[start + np.maximum(np.ceil(p / 100.0 * count).astype(np.int64) - 1, 0)]
+		# the records are in time order, so the last of each group in a stable sort is the last event
+		order = np.argsort(key, kind = "mergesort")
+		q["last"] = qlen[order][start + count - 1]
+		self.queues.append(q)
+
+		# ports: the bytes of the Dequ of each (bin, port)
+		d = r["event"] == DEQU
+		pk = key[d] >> np.uint64(8)
+		order = np.argsort(pk, kind = "mergesort")
+		pk = pk[order]
+		start, count = groups(pk)
+		tx = np.add.reduceat(r["size"][d][order].astype(np.int64), start) if len(pk) > 0 else np.zeros(0, dtype = np.int64)
+		pn, pi = (pk[start] >> np.uint64(8)) & np.uint64(0xffff), pk[start] & np.uint64(0xff)
+		bps = np.array([self.port_speed.get(n, {}).get(i, 0) for n, i in zip(pn.tolist(), pi.tolist())], dtype = np.float64)
+		with np.errstate(invalid = "ignore", divide = "ignore"):
+			util = np.where(bps > 0, tx * 8e9 / (self.bin * bps), np.nan)
+		self.ports.append({"node": pn, "intf": pi, "time": ((pk[start] >> np.uint64(24)) + b0) * np.uint64(self.bin), "tx_bytes": tx, "utilization": util})
+
+def concat(tables, cols):
+	if not tables:
+		return dict((c, np.zeros(0)) for c in cols)
+	return dict((c, np.concatenate([t[c] for t in tables])) for c in cols)
+
+def queue_series(trace, bin, expr = None, percentiles = PERCENTILES):
+	qs = QueueSeries(bin, trace.port_speed, percentiles)
+	for r in trace.filter(expr):
+		qs.add(r)
+	return qs.finish()
+
+def save_series(fileName, queues, ports):
+	arrays = dict(("queue." + c, v) for c, v in queues.items())
+	arrays.update(("port." + c, v) for c, v in ports.items())
+	np.savez(fileName, **arrays)
+
+# the (queues, ports) tables of a file written by save_series
+def load_series(fileName):
+	z = np.load(fileName)
+	queues = dict((c[len("queue."):], z[c]) for c in z.files if c.startswith("queue."))
+	ports = dict((c[len("port."):], z[c]) for c in z.files if c.startswith("port."))
+	return queues, ports
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "queue-occupancy time series of a .tr file")
+	parser.add_argument("trace", help = "the .tr file (or a packed trace)")
+	parser.add_argument("filter", nargs = "?", help = "only use the records that pass this filter expression (see trace_reader), e.g. nodeType=1 for the switches")
+	parser.add_argument("-b", dest = "bin", type = int, default = 1000, help = "the length of a bin (ns), by default 1000")
+	parser.add_argument("-p", dest = "percentiles", default = ",".join(str(p) for p in PERCENTILES), help = "the percentiles of qlen in each bin, by default 50,99")
+	parser.add_argument("-o", dest = "output", help = "the output file (.npz), by default <trace>.queues.npz")
+	parser.add_argument("--csv", action = "store_true", help = "also print the queue series as csv")
+	args = parser.parse_args()
+
+	trace = open_trace(args.trace)
+	try:
+		queues, ports = queue_series(trace, args.bin, args.filter, [float(p) for p in args.percentiles.split(",")])
+	except ValueError:
+		print("Invalid filter")
+		sys.exit(0)
+	output_file = args.output or args.trace + ".queues.npz"
+	save_series(output_file, queues, ports)
+	sys.stderr.write("%s: %d queue bins, %d port bins\n"%(output_file, len(queues["node"]), len(ports["node"])))
+	u = ports["utilization"]
+	if np.isnan(u).any():
+		sys.stderr.write("%d port bins have no port_speed in the header\n"%np.isnan(u).sum())
+	# a packet is counted in the bin of its Dequ, so a bin can be a bit above 1 when it is not much longer than a packet
+	over = u > 1.01
+	if over.any():
+		sys.stderr.write("%d port bins are above the port speed (max utilization %.3f)\n"%(over.sum(), u[over].max()))
+	if args.csv:
+		cols = [c for c in queues if c not in QUEUE_COLUMNS]
+		print(",".join(QUEUE_COLUMNS + cols))
+		for row in zip(*[queues[c].tolist() for c in QUEUE_COLUMNS + cols]):
+			print(",".join("%.1f"%v if isinstance(v, float) else str(v) for v in row))
@@ -6,6 +6,8 @@
 #include <cctype>
 #include <regex>
 #include <sstream>
+#include <cstring>
+#include <algorithm>
 #include "trace-format.h"
 
 class TraceFilter{
@@ -51,7 +53,12 @@ public:
 			return "[Unknown op]";
 		}
 		virtual bool test(ns3::TraceFormat &tr) = 0;
+		// res[i] = test(tr[i]) for a block of n records
+		virtual void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res) = 0;
 		virtual std::string str() = 0;
+		// the value the field is compared with, and the width of the field in bytes
+		virtual uint64_t get_value() = 0;
+		virtual uint32_t width() = 0;
 	};
 	#define OP(type) \
 		do {\
@@ -65,6 +72,20 @@ public:
 				default: return false;\
 			}\
 		} while(0)
+	// the op is chosen once per block, and the loop over the records only loads and compares
+	#define OP_BLOCK(type) \
+		do {\
+			const uint8_t *p = ((const uint8_t*)tr) + offset;\
+			switch (op){\
+				case 0: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) == value; break;\
+				case 1: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) > value; break;\
+				case 2: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) >= value; break;\
+				case 3: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) < value; break;\
+				case 4: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) <= value; break;\
+				case 5: for (uint32_t i = 0; i < n; i++) res[i] = *(const type*)(p + i * sizeof(ns3::TraceFormat)) != value; break;\
+				default: memset(res, 0, n); break;\
+			}\
+		} while(0)
 	class ByteField : public Field{
 	public:
 		uint8_t value;
@@ -72,6 +93,15 @@ public:
 		virtual bool test(ns3::TraceFormat &tr){
 			OP(uint8_t);
 		}
+		virtual void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+			OP_BLOCK(uint8_t);
+		}
+		virtual uint64_t get_value(){
+			return value;
+		}
+		virtual uint32_t width(){
+			return sizeof(uint8_t);
+		}
 		std::string str(){
 			std::stringstream s;
 			s << '[' << offset << ']' << op_str() << (int32_t)value;
@@ -85,6 +115,15 @@ public:
 		virtual bool test(ns3::TraceFormat &tr){
 			OP(uint16_t);
 		}
+		virtual void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+			OP_BLOCK(uint16_t);
+		}
+		virtual uint64_t get_value(){
+			return value;
+		}
+		virtual uint32_t width(){
+			return sizeof(uint16_t);
+		}
 		std::string str(){
 			std::stringstream s;
 			s << '[' << offset << ']' << op_str() << value;
@@ -98,6 +137,15 @@ public:
 		virtual bool test(ns3::TraceFormat &tr){
 			OP(uint32_t);
 		}
+		virtual void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+			OP_BLOCK(uint32_t);
+		}
+		virtual uint64_t get_value(){
+			return value;
+		}
+		virtual uint32_t width(){
+			return sizeof(uint32_t);
+		}
 		std::string str(){
 			std::stringstream s;
 			s << '[' << offset << ']' << op_str() << value;
@@ -111,6 +159,15 @@ public:
 		virtual bool test(ns3::TraceFormat &tr){
 			OP(uint64_t);
 		}
+		virtual void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+			OP_BLOCK(uint64_t);
+		}
+		virtual uint64_t get_value(){
+			return value;
+		}
+		virtual uint32_t width(){
+			return sizeof(uint64_t);
+		}
 		std::string str(){
 			std::stringstream s;
 			s << '[' << offset << ']' << op_str() << value;
@@ -123,6 +180,7 @@ public:
 		uint32_t type; // node type: 0:expr, 1:&, 2:|
 		Node* son[2];
 		Field* f;
+		std::vector<uint8_t> buf; // the result of son[1] in test_block
 
 		Node(){
 			son[0] = son[1] = 0;
@@ -146,6 +204,27 @@ public:
 				return son[0]->test(tr) || son[1]->test(tr);
 			return false;
 		}
+		// res[i] = test(tr[i]) for a block of n records
+		void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+			if (type == 0){
+				f->test_block(tr, n, res);
+				return;
+			}
+			if (type != 1 && type != 2){
+				memset(res, 0, n);
+				return;
+			}
+			if (buf.size() < n)
+				buf.resize(n);
+			son[0]->test_block(tr, n, res);
+			son[1]->test_block(tr, n, &buf[0]);
+			if (type == 1)
+				for (uint32_t i = 0; i < n; i++)
+					res[i] &= buf[i];
+			else
+				for (uint32_t i = 0; i < n; i++)
+					res[i] |= buf[i];
+		}
 		void clear(){
 			if (son[0]){
 				son[0]->clear();
@@ -176,6 +255,54 @@ public:
 		return true;
 	}
 
+	// res[i] = test(tr[i]) for a block of n records
+	void test_block(ns3::TraceFormat *tr, uint32_t n, uint8_t *res){
+		if (root)
+			root->test_block(tr, n, res);
+		else
+			memset(res, 1, n);
+	}
+	// [lo, hi] is a range of time that contains the time of every record that passes the filter (lo > hi if none can)
+	// the records are sorted by time, so a reader only needs to read this range
+	void time_range(uint64_t &lo, uint64_t &hi){
+		time_range(root, lo, hi);
+	}
+	static void time_range(Node *n, uint64_t &lo, uint64_t &hi){
+		lo = 0;
+		hi = UINT64_MAX;
+		if (n == NULL)
+			return;
+		if (n->type == 0){
+			if (n->f->offset != offsetof(ns3::TraceFormat, time))
+				return;
+			uint64_t v = ((QwordField*)n->f)->value;
+			switch (n->f->op){
+				case 0: lo = hi = v; break;
+				case 1: if (v == UINT64_MAX) {lo = 1; hi = 0;} else lo = v + 1; break;
+				case 2: lo = v; break;
+				case 3: if (v == 0) {lo = 1; hi = 0;} else hi = v - 1; break;
+				case 4: hi = v; break;
+			}
+			return;
+		}
+		uint64_t lo0, hi0, lo1, hi1;
+		time_range(n->son[0], lo0, hi0);
+		time_range(n->son[1], lo1, hi1);
+		if (n->type == 1){ // both
+			lo = std::max(lo0, lo1);
+			hi = std::min(hi0, hi1);
+		}else if (n->type == 2){ // either
+			if (lo0 > hi0){ // son[0] matches nothing
+				lo = lo1; hi = hi1;
+			}else if (lo1 > hi1){
+				lo = lo0; hi = hi0;
+			}else {
+				lo = std::min(lo0, lo1);
+				hi = std::max(hi0, hi1);
+			}
+		}
+	}
+
 	// parse an filter expression
 	void parse(std::string expr){
 		root = _parse(expr);
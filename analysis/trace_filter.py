@@ -0,0 +1,214 @@
+import re
+import numpy as np
+from trace_reader import TRACE_DTYPE, struct
+
+# The filter expressions of trace_filter.hpp, compiled to vectorized predicates over blocks of records.
+# The grammar and its quirks are the same as the C++ parser: `field op value` with op in = > >= < <= !=, and value
+# read like scanf("%li") (decimal, 0x hex, or 0 octal); `a & b | c` is a & (b | c), since the right side of & and |
+# is always the whole rest of the expression; parentheses; and the shorthands flow=, biflow=, rflow=, queue=.
+
+# name: (offset, type), the same offsets and widths as GetField() in trace_filter.hpp (ack.flags is tested as 1 byte)
+FIELDS = {
+	"time": (0, "<u8"),
+	"node": (8, "<u2"),
+	"nodeType": (29, "u1"),
+	"intf": (10, "u1"),
+	"qidx": (11, "u1"),
+	"qlen": (12, "<u4"),
+	"sip": (16, "<u4"),
+	"dip": (20, "<u4"),
+	"size": (24, "<u2"),
+	"l3Prot": (26, "u1"),
+	"event": (27, "u1"),
+	"ecn": (28, "u1"),
+	"data.sport": (32, "<u2"),
+	"data.dport": (34, "<u2"),
+	"data.seq": (36, "<u4"),
+	"ack.sport": (32, "<u2"),
+	"ack.dport": (34, "<u2"),
+	"ack.flags": (36, "u1"),
+	"qp.sport": (32, "<u2"),
+	"qp.dport": (34, "<u2"),
+}
+OPS = ["=", ">", ">=", "<", "<=", "!="]
+UINT64_MAX = (1 << 64) - 1
+
+OP_COMPARE = "=|>|>=|<|<=|!="
+BASE_EXPR_REGEX = r"\s*([a-zA-Z0-9\.]+)\s*(" + OP_COMPARE + r")\s*([x,0-9a-fA-F]+)\s*"
+
+# the integer at the start of s like strtol(s, NULL, 0), and the rest of s; None if there is no integer
+def scan_int(s):
+	m = re.match(r"\s*[+-]?(0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)", s)
+	if m is None:
+		return None, s
+	t = m.group(0).strip()
+	neg = t.startswith("-")
+	t = t.lstrip("+-")
+	if t[:2] in ("0x", "0X"):
+		v = int(t[2:], 16)
+	elif t.startswith("0"):
+		v = int(t, 8)
+	else:
+		v = int(t)
+	return -v if neg else v, s[m.end():]
+
+# like sscanf(value, "%i,%i,...") with n numbers; None unless all n are read
+def scan_ints(s, n):
+	res = []
+	for i in range(n):
+		if i > 0:
+			if not s.startswith(","):
+				return None
+			s = s[1:]
+		v, s = scan_int(s)
+		if v is None:
+			return None
+		res.append(v)
+	return res
+
+class Leaf:
+	def __init__(self, field, op, value):
+		self.offset, self.type = FIELDS[field]
+		self.op = OPS.index(op)
+		# the value is cast to the width of the field, as in the C++ Field classes
+		self.value = value & ((1 << (8 * np.dtype(self.type).itemsize)) - 1)
+		self.dtype = struct([("v", self.type, self.offset)], TRACE_DTYPE.itemsize)
+
+	def test(self, records):
+		x = records.view(self.dtype)["v"]
+		v = np.array(self.value, dtype = self.type)
+		return [x == v, x > v, x >= v, x < v, x <= v, x != v][self.op]
+
+	def time_range(self):
+		if self.offset != FIELDS["time"][0]:
+			return 0, UINT64_MAX
+		v = self.value
+		return [(v, v), (v + 1, UINT64_MAX), (v, UINT64_MAX), (0, v - 1), (0, v), (0, UINT64_MAX)][self.op]
+
+class And:
+	def __init__(self, left, right):
+		self.son = (left, right)
+
+	def test(self, records):
+		return self.son[0].test(records) & self.son[1].test(records)
+
+	def time_range(self):
+		(lo0, hi0), (lo1, hi1) = [s.time_range() for s in self.son]
+		return max(lo0, lo1), min(hi0, hi1)
+
+class Or(And):
+	def test(self, records):
+		return self.son[0].test(records) | self.son[1].test(records)
+
+	def time_range(self):
+		(lo0, hi0), (lo1, hi1) = [s.time_range() for s in self.son]
+		if lo0 > hi0:
+			return lo1, hi1
+		if lo1 > hi1:
+			return lo0, hi0
+		return min(lo0, lo1), max(hi0, hi1)
+
+def skip_space(i, s):
+	while i < len(s) and s[i].isspace():
+		i += 1
+	return i
+
+# the index of the ')' matching the '(' at s[i], or len(s) if there is none
+def match_bracket(i, s):
+	c = 1
+	i += 1
+	while i < len(s) and (s[i] != ")" or c > 1):
+		if s[i] == "(":
+			c += 1
+		elif s[i] == ")":
+			c -= 1
+		i += 1
+	return i
+
+def strip_outer_bracket(expr):
+	i = skip_space(0, expr)
+	if i < len(expr) and expr[i] == "(":
+		end = match_bracket(i, expr)
+		if end >= len(expr):
+			return expr
+		if skip_space(end + 1, expr) >= len(expr):
+			return strip_outer_bracket(expr[i + 1:end])
+	return expr
+
+def get_field(field, op, value):
+	if field not in FIELDS:
+		return None
+	v, rest = scan_int(value)
+	return Leaf(field, op, v if v is not None else 0)
+
+def parse_shorthand(shorthand, op, value):
+	if op != "=": # the shorthands must use '='
+		return None
+	if shorthand in ("flow", "biflow", "rflow"): # forward flow, bi-directional flow, reverse flow
+		v = scan_ints(value, 4)
+		if v is None:
+			return None
+		sip, dip, sport, dport = v[0] & 0xffffffff, v[1] & 0xffffffff, v[2] & 0xffff, v[3] & 0xffff
+		one = "sip=%d&dip=%d&((l3Prot=17&data.sport=%d&data.dport=%d)|((l3Prot=0xFC|l3Prot=0xFD)&ack.sport=%d&ack.dport=%d)|(l3Prot=0x0&qp.sport=%d&qp.dport=%d))"
+		if shorthand == "flow":
+			return _parse(one%(sip, dip, sport, dport, sport, dport, sport, dport))
+		if shorthand == "rflow":
+			return _parse(one%(dip, sip, dport, sport, dport, sport, dport, sport))
+		return _parse("(%s)|(%s)"%(one%(sip, dip, sport, dport, sport, dport, sport, dport), one%(dip, sip, dport, sport, dport, sport, dport, sport)))
+	if shorthand == "queue":
+		v = scan_ints(value, 3)
+		if v is None:
+			return None
+		return _parse("node=%d&intf=%d&qidx=%d"%(v[0] & 0xffff, v[1] & 0xff, v[2] & 0xff))
+	return None
+
+def _parse(expr):
+	expr = strip_outer_bracket(expr)
+	m = re.match("(?:" + BASE_EXPR_REGEX + r")\Z", expr)
+	if m: # a base expression
+		field, op, value = m.group(1), m.group(2), m.group(3)
+		return get_field(field, op, value) or parse_shorthand(field, op, value)
+	m = re.match("(?:" + BASE_EXPR_REGEX + r"(&|\|)(.*))\Z", expr)
+	if m: # a base expression &| other things
+		field, op, value = m.group(1), m.group(2), m.group(3)
+		left = get_field(field, op, value) or parse_shorthand(field, op, value)
+		if left is None:
+			return None
+		op_str, right_str = m.group(4), m.group(5)
+	else: # (expression) &| other things
+		i = skip_space(0, expr)
+		if i >= len(expr) or expr[i] != "(":
+			return None
+		end = match_bracket(i, expr)
+		if end >= len(expr):
+			return None
+		left = _parse(expr[i + 1:end])
+		if left is None:
+			return None
+		m = re.match(r"(?:\s*(&|\|)(.*)\s*)\Z", expr[end + 1:])
+		op_str, right_str = (m.group(1), m.group(2)) if m else ("", "")
+	right = _parse(right_str)
+	if right is None:
+		return None
+	return And(left, right) if op_str == "&" else Or(left, right)
+
+class TraceFilter:
+	# TraceFilter(expr).test(records) is a boolean mask of the records that pass the filter
+	# raises ValueError if the expression is invalid, where the C++ reader prints "Invalid filter"
+	def __init__(self, expr = None):
+		self.root = None
+		if expr is not None:
+			self.root = _parse(expr)
+			if self.root is None:
+				raise ValueError("invalid filter: %s"%expr)
+
+	def test(self, records):
+		if self.root is None:
+			return np.ones(len(records), dtype = bool)
+		return self.root.test(records)
+
+	# [lo, hi] contains the time of every record that passes the filter (lo > hi if none can)
+	def time_range(self):
+		if self.root is None:
+			return 0, UINT64_MAX
+		return self.root.time_range()
@@ -0,0 +1,144 @@
+#ifndef TRACE_INDEX_HPP
+#define TRACE_INDEX_HPP
+
+#include <cstdio>
+#include <cstring>
+#include <string>
+#include <vector>
+#include <stdint.h>
+#include "trace-format.h"
+#include "trace_filter.hpp"
+
+/*
+ * The sidecar index of a .tr file (<.tr file>.idx), built by trace_index.py, which also describes the format.
+ * For each block of records, it has the min and max time and the set of nodes; for each flow key
+ * (sip, dip, sport, dport, l3Prot), the blocks with records of the key.
+ * candidate_blocks() gives the blocks that may have records passing a filter, so a reader can skip the others.
+ */
+class TraceIndex{
+public:
+	uint64_t trace_size, header_size, n_record, block, n_block, node_words, n_key, n_posting;
+	std::vector<uint64_t> min_time, max_time, nodes, key_hi, key_lo, post_start;
+	std::vector<uint32_t> post_block;
+
+	// load the index of trace_file; false if there is none, or it is not of this version of the .tr file
+	bool load(std::string trace_file, uint64_t size){
+		FILE* file = fopen((trace_file + ".idx").c_str(), "rb");
+		if (file == NULL)
+			return false;
+		bool ok = read(file) && trace_size == size;
+		fclose(file);
+		if (!ok)
+			fprintf(stderr, "%s.idx is out of date or invalid, not using it\n", trace_file.c_str());
+		return ok;
+	}
+	bool read(FILE* file){
+		char magic[8];
+		uint64_t h[9];
+		if (fread(magic, 1, 8, file) != 8 || memcmp(magic, "HPCCTRIX", 8) != 0)
+			return false;
+		if (fread(h, sizeof(uint64_t), 9, file) != 9 || h[0] != 1)
+			return false;
+		trace_size = h[1]; header_size = h[2]; n_record = h[3]; block = h[4]; n_block = h[5]; node_words = h[6]; n_key = h[7]; n_posting = h[8];
+		return read_array(file, min_time, n_block) && read_array(file, max_time, n_block) && read_array(file, nodes, n_block * node_words)
+			&& read_array(file, key_hi, n_key) && read_array(file, key_lo, n_key) && read_array(file, post_start, n_key + 1)
+			&& read_array(file, post_block, n_posting);
+	}
+	template<class T>
+	static bool read_array(FILE* file, std::vector<T> &a, uint64_t n){
+		a.resize(n);
+		return n == 0 || fread(&a[0], sizeof(T), n, file) == n;
+	}
+
+	// res[b] = 1 if block b may have records passing the filter
+	void candidate_blocks(TraceFilter &f, std::vector<uint8_t> &res){
+		res.assign(n_block, 1);
+		if (f.root == NULL)
+			return;
+		eval_blocks(f.root, res);
+		std::vector<uint8_t> keys(n_key), by_key(n_block, 0);
+		eval_keys(f.root, keys);
+		for (uint64_t k = 0; k < n_key; k++)
+			if (keys[k])
+				for (uint64_t i = post_start[k]; i < post_start[k + 1]; i++)
+					by_key[post_block[i]] = 1;
+		for (uint64_t b = 0; b < n_block; b++)
+			res[b] &= by_key[b];
+	}
+
+	// res[b] = 0 if no record of block b can pass n, by the time range and node set of the block
+	void eval_blocks(TraceFilter::Node *n, std::vector<uint8_t> &res){
+		if (n->type != 0){
+			std::vector<uint8_t> r(n_block);
+			eval_blocks(n->son[0], res);
+			eval_blocks(n->son[1], r);
+			for (uint64_t b = 0; b < n_block; b++)
+				res[b] = n->type == 1 ? (res[b] & r[b]) : (res[b] | r[b]);
+			return;
+		}
+		TraceFilter::Field *f = n->f;
+		uint64_t v = f->get_value();
+		for (uint64_t b = 0; b < n_block; b++){
+			uint64_t lo = min_time[b], hi = max_time[b];
+			if (f->offset == offsetof(ns3::TraceFormat, time)){
+				switch (f->op){
+					case 0: res[b] = lo <= v && v <= hi; break;
+					case 1: res[b] = hi > v; break;
+					case 2: res[b] = hi >= v; break;
+					case 3: res[b] = lo < v; break;
+					case 4: res[b] = lo <= v; break;
+					case 5: res[b] = !(lo == v && hi == v); break;
+					default: res[b] = 0; break;
+				}
+			}else if (f->offset == offsetof(ns3::TraceFormat, node) && f->op == 0)
+				res[b] = v < node_words * 64 && (nodes[b * node_words + v / 64] >> (v % 64) & 1);
+			else
+				res[b] = 1;
+		}
+	}
+
+	// res[k] = 0 if no record of key k can pass n: sip, dip and l3Prot are known, and sport/dport
+	// (the 2 bytes at the start of the union) are known for the l3Prot that have ports
+	void eval_keys(TraceFilter::Node *n, std::vector<uint8_t> &res){
+		if (n->type != 0){
+			std::vector<uint8_t> r(n_key);
+			eval_keys(n->son[0], res);
+			eval_keys(n->son[1], r);
+			for (uint64_t k = 0; k < n_key; k++)
+				res[k] = n->type == 1 ? (res[k] & r[k]) : (res[k] | r[k]);
+			return;
+		}
+		TraceFilter::Field *f = n->f;
+		uint64_t v = f->get_value();
+		for (uint64_t k = 0; k < n_key; k++){
+			uint8_t l3 = key_lo[k] & 0xff;
+			bool has_ports = l3 == 0x6 || l3 == 0x11 || l3 == 0xFC || l3 == 0xFD || l3 == 0x0;
+			uint64_t x;
+			if (f->offset == offsetof(ns3::TraceFormat, sip))
+				x = key_hi[k] >> 32;
+			else if (f->offset == offsetof(ns3::TraceFormat, dip))
+				x = key_hi[k] & 0xffffffff;
+			else if (f->offset == offsetof(ns3::TraceFormat, l3Prot))
+				x = l3;
+			else if (f->offset == offsetof(ns3::TraceFormat, data.sport) && f->width() == 2 && has_ports)
+				x = key_lo[k] >> 32 & 0xffff;
+			else if (f->offset == offsetof(ns3::TraceFormat, data.dport) && f->width() == 2 && has_ports)
+				x = key_lo[k] >> 16 & 0xffff;
+			else {
+				res[k] = 1;
+				continue;
+			}
+			switch (f->op){
+				case 0: res[k] = x == v; break;
+				case 1: res[k] = x > v; break;
+				case 2: res[k] = x >= v; break;
+				case 3: res[k] = x < v; break;
+				case 4: res[k] = x <= v; break;
+				case 5: res[k] = x != v; break;
+				default: res[k] = 0; break;
+			}
+		}
+	}
+};
+
+#endif /* TRACE_INDEX_HPP */
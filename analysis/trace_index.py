@@ -0,0 +1,188 @@
+import os
+import sys
+import argparse
+import numpy as np
+from trace_reader import Trace, ports
+from trace_filter import FIELDS, Leaf, Or
+
+# Sidecar index of a .tr file (<.tr file>.idx), built in one pass by `python trace_index.py <.tr file>`.
+# The records are cut into blocks of `block` records; for each block the index has its min and max time and the set
+# of nodes, and for each flow key (sip, dip, sport, dport, l3Prot) the list of blocks with records of the key.
+# trace_reader (C++ and Python) use it to only read the blocks that may have records passing a filter.
+#
+# All integers are little-endian:
+#   header: magic "HPCCTRIX", then uint64: version, size of the .tr file, size of its SimSetting header, number of
+#           records, records per block, number of blocks, number of 64-bit words of a node set, number of keys,
+#           number of postings
+#   uint64 min_time[blocks], max_time[blocks], nodes[blocks][words] (bit n of a block's set is node n)
+#   uint64 key_hi[keys] (sip << 32 | dip), key_lo[keys] (sport << 32 | dport << 16 | l3Prot), sorted by (hi, lo)
+#   uint64 post_start[keys + 1]; uint32 post_block[postings]: the blocks of key i are post_block[post_start[i]:post_start[i+1]]
+MAGIC = b"HPCCTRIX"
+VERSION = 1
+HEADER_FIELDS = ["version", "trace_size", "header_size", "n_record", "block", "n_block", "node_words", "n_key", "n_posting"]
+
+# the flow key of each record as (hi, lo); sport and dport are those of GetFlowInt in utils.hpp
+def flow_keys(records):
+	sport, dport = ports(records)
+	hi = (records["sip"].astype(np.uint64) << np.uint64(32)) | records["dip"].astype(np.uint64)
+	lo = (sport.astype(np.uint64) << np.uint64(32)) | (dport.astype(np.uint64) << np.uint64(16)) | records["l3Prot"].astype(np.uint64)
+	return hi, lo
+
+def index_path(trace_file):
+	return trace_file + ".idx"
+
+def build_index(trace_file, block = 1 << 16, output = None):
+	trace = Trace(trace_file)
+	r = trace.records
+	n_block = (len(r) + block - 1) // block
+	min_time = np.zeros(n_block, dtype = np.uint64)
+	max_time = np.zeros(n_block, dtype = np.uint64)
+	node_sets = []
+	key_hi, key_lo, key_block = [], [], []
+	for b in range(n_block):
+		rb = r[b * block:(b + 1) * block]
+		t = rb["time"]
+		min_time[b], max_time[b] = t.min(), t.max()
+		node_sets.append(np.unique(rb["node"]))
+		hi, lo = flow_keys(rb)
+		order = np.lexsort((lo, hi))
+		hi, lo = hi[order], lo[order]
+		first = np.ones(len(hi), dtype = bool)
+		first[1:] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+		key_hi.append(hi[first])
+		key_lo.append(lo[first])
+		key_block.append(np.full(first.sum(), b, dtype = np.uint32))
+	max_node = max([int(s[-1]) for s in node_sets if len(s) > 0] or [0])
+	node_words = max_node // 64 + 1
+	nodes = np.zeros((n_block, node_words), dtype = np.uint64)
+	for b, s in enumerate(node_sets):
+		np.bitwise_or.at(nodes[b], s // 64, np.uint64(1) << (s % 64).astype(np.uint64))
+	# postings: the (key, block) pairs sorted by key, then block
+	hi = np.concatenate(key_hi) if key_hi else np.zeros(0, dtype = np.uint64)
+	lo = np.concatenate(key_lo) if key_lo else np.zeros(0, dtype = np.uint64)
+	blk = np.concatenate(key_block) if key_block else np.zeros(0, dtype = np.uint32)
+	order = np.lexsort((blk, lo, hi))
+	hi, lo, blk = hi[order], lo[order], blk[order]
+	first = np.ones(len(hi), dtype = bool)
+	first[1:] = (hi[1:] != hi[:-1]) | (lo[1:] != lo[:-1])
+	post_start = np.append(np.nonzero(first)[0], len(hi)).astype(np.uint64)
+	header = [VERSION, os.path.getsize(trace_file), trace.header_size, len(r), block, n_block, node_words, int(first.sum()), len(blk)]
+	output = output or index_path(trace_file)
+	tmp = "%s.%d"%(output, os.getpid())
+	with open(tmp, "wb") as f:
+		f.write(MAGIC)
+		f.write(np.array(header, dtype = "<u8").tobytes())
+		for a in (min_time, max_time, nodes, hi[first], lo[first], post_start):
+			f.write(a.astype("<u8").tobytes())
+		f.write(blk.astype("<u4").tobytes())
+	os.rename(tmp, output)
+	return output
+
+class TraceIndex:
+	def __init__(self, fileName):
+		with open(fileName, "rb") as f:
+			if f.read(len(MAGIC)) != MAGIC:
+				raise ValueError("not a trace index: %s"%fileName)
+			h = dict(zip(HEADER_FIELDS, np.frombuffer(f.read(8 * len(HEADER_FIELDS)), "<u8").tolist()))
+			if h["version"] != VERSION:
+				raise ValueError("unknown trace index version %d"%h["version"])
+			self.__dict__.update(h)
+			def read(dtype, n):
+				return np.frombuffer(f.read(np.dtype(dtype).itemsize * n), dtype, n)
+			self.min_time = read("<u8", self.n_block)
+			self.max_time = read("<u8", self.n_block)
+			self.nodes = read("<u8", self.n_block * self.node_words).reshape(self.n_block, self.node_words)
+			self.key_hi = read("<u8", self.n_key)
+			self.key_lo = read("<u8", self.n_key)
+			self.post_start = read("<u8", self.n_key + 1)
+			self.post_block = read("<u4", self.n_posting)
+
+	# the index is only used if it was built from this version of the .tr file
+	def matches(self, trace_file):
+		return os.path.getsize(trace_file) == self.trace_size
+
+	# whether each block has node n
+	def has_node(self, n):
+		if n >= self.node_words * 64:
+			return np.zeros(self.n_block, dtype = bool)
+		return (self.nodes[:, n // 64] >> np.uint64(n % 64)) & np.uint64(1) == 1
+
+	# blocks that may have records passing the filter (a TraceFilter): a boolean mask over the blocks
+	# each condition is decided on what the index knows, and counts as maybe (True) otherwise
+	def candidate_blocks(self, f):
+		if f.root is None:
+			return np.ones(self.n_block, dtype = bool)
+		may_blocks = self.eval_blocks(f.root)
+		may_keys = self.eval_keys(f.root)
+		by_key = np.zeros(self.n_block, dtype = bool)
+		starts, ends = self.post_start[:-1][may_keys], self.post_start[1:][may_keys]
+		if may_keys.all():
+			by_key[:] = True
+		elif len(starts) > 0:
+			# the postings of the keys that may match
+			n = (ends - starts).astype(np.int64)
+			idx = np.repeat(starts.astype(np.int64) - np.cumsum(n) + n, n) + np.arange(n.sum())
+			by_key[self.post_block[idx]] = True
+		return may_blocks & by_key
+
+	# blocks that may pass node, by their time range and node set
+	def eval_blocks(self, node):
+		if not isinstance(node, Leaf):
+			a, b = self.eval_blocks(node.son[0]), self.eval_blocks(node.son[1])
+			return a | b if isinstance(node, Or) else a & b
+		lo, hi, v = self.min_time, self.max_time, np.uint64(node.value)
+		if node.offset == FIELDS["time"][0]:
+			return [(lo <= v) & (v <= hi), hi > v, hi >= v, lo < v, lo <= v, ~((lo == v) & (hi == v))][node.op]
+		if node.offset == FIELDS["node"][0] and node.op == 0:
+			return self.has_node(node.value)
+		return np.ones(self.n_block, dtype = bool)
+
+	# keys that may pass node: sip, dip and l3Prot are known, and sport/dport (the 2 bytes at the start of the union)
+	# are known for the records of the l3Prot that have ports
+	def eval_keys(self, node):
+		if not isinstance(node, Leaf):
+			a, b = self.eval_keys(node.son[0]), self.eval_keys(node.son[1])
+			return a | b if isinstance(node, Or) else a & b
+		m = np.uint64(0xffffffff)
+		l3 = self.key_lo & np.uint64(0xff)
+		has_ports = (l3 == 0x6) | (l3 == 0x11) | (l3 == 0xFC) | (l3 == 0xFD) | (l3 == 0x0)
+		known = None
+		if node.offset == FIELDS["sip"][0]:
+			x, known = self.key_hi >> np.uint64(32), np.ones(self.n_key, dtype = bool)
+		elif node.offset == FIELDS["dip"][0]:
+			x, known = self.key_hi & m, np.ones(self.n_key, dtype = bool)
+		elif node.offset == FIELDS["l3Prot"][0]:
+			x, known = l3, np.ones(self.n_key, dtype = bool)
+		elif node.offset == 32 and node.type == "<u2":
+			x, known = (self.key_lo >> np.uint64(32)) & np.uint64(0xffff), has_ports
+		elif node.offset == 34 and node.type == "<u2":
+			x, known = (self.key_lo >> np.uint64(16)) & np.uint64(0xffff), has_ports
+		if known is None:
+			return np.ones(self.n_key, dtype = bool)
+		v = np.uint64(node.value)
+		res = [x == v, x > v, x >= v, x < v, x <= v, x != v][node.op]
+		return res | ~known
+
+# the index of a .tr file if it has an up-to-date one, else None
+def load_index(trace_file):
+	path = index_path(trace_file)
+	if not os.path.exists(path):
+		return None
+	try:
+		index = TraceIndex(path)
+	except (ValueError, IOError, OSError):
+		return None
+	if not index.matches(trace_file):
+		sys.stderr.write("%s is out of date, not using it\n"%path)
+		return None
+	return index
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "build the sidecar index of a .tr file")
+	parser.add_argument("trace", help = "the .tr file")
+	parser.add_argument("-b", dest = "block", type = int, default = 1 << 16, help = "the number of records per block, by default 65536")
+	parser.add_argument("-o", dest = "output", help = "the index file, by default <.tr file>.idx")
+	args = parser.parse_args()
+	output = build_index(args.trace, args.block, args.output)
+	index = TraceIndex(output)
+	print("%s: %d records, %d blocks, %d keys, %d postings"%(output, index.n_record, index.n_block, index.n_key, index.n_posting))
@@ -0,0 +1,75 @@
+#ifndef TRACE_PACK_HPP
+#define TRACE_PACK_HPP
+
+#include <cstdio>
+#include <cstring>
+#include <vector>
+#include <stdint.h>
+#include <zlib.h>
+#include "trace-format.h"
+
+/*
+ * Reader of the packed traces written with TRACE_COMPRESS (the format is described in
+ * simulation/src/point-to-point/model/trace-pack.h). The blocks are read one at a time: next() reads the header of
+ * the next block, then either skip() or read() its records.
+ */
+class TracePackReader{
+public:
+	FILE *file;
+	uint32_t version, block;
+	// the header of the current block
+	uint32_t n, codec, size;
+	uint64_t first, last;
+	std::vector<uint8_t> payload, col;
+
+	TracePackReader() : file(NULL) {}
+	// true if file is a packed trace, and then the SimSetting is next; else the file is put back to its start
+	bool open(FILE *_file){
+		char magic[8];
+		file = _file;
+		if (fread(magic, 1, 8, file) == 8 && memcmp(magic, "HPCCTRPK", 8) == 0 && fread(&version, sizeof(version), 1, file) == 1 && fread(&block, sizeof(block), 1, file) == 1)
+			return true;
+		fseek(file, 0, SEEK_SET);
+		return false;
+	}
+	// read the header of the next block; false at the end of the file
+	bool next(){
+		return fread(&n, sizeof(n), 1, file) == 1 && fread(&codec, sizeof(codec), 1, file) == 1 && fread(&size, sizeof(size), 1, file) == 1
+			&& fread(&first, sizeof(first), 1, file) == 1 && fread(&last, sizeof(last), 1, file) == 1;
+	}
+	void skip(){
+		fseek(file, size, SEEK_CUR);
+	}
+	// read the n records of the current block to tr; false if the block is cut by the end of the file or invalid
+	bool read(std::vector<ns3::TraceFormat> &tr){
+		uint64_t raw = (uint64_t)n * sizeof(ns3::TraceFormat);
+		payload.resize(size);
+		if (size > 0 && fread(&payload[0], 1, size, file) != size)
+			return false;
+		if (codec == 0){
+			if (size != raw)
+				return false;
+			col.swap(payload);
+		}else if (codec == 1){
+			col.resize(raw);
+			uLongf len = raw;
+			if (uncompress(&col[0], &len, &payload[0], size) != Z_OK || len != raw)
+				return false;
+		}else
+			return false;
+		// byte k of record i is col[k * n + i]; then undo the delta of time
+		tr.resize(n);
+		if (n == 0)
+			return true;
+		uint8_t *p = (uint8_t*)&tr[0];
+		for (uint32_t k = 0; k < sizeof(ns3::TraceFormat); k++)
+			for (uint32_t i = 0; i < n; i++)
+				p[i * sizeof(ns3::TraceFormat) + k] = col[k * n + i];
+		tr[0].time = first;
+		for (uint32_t i = 1; i < n; i++)
+			tr[i].time += tr[i - 1].time;
+		return true;
+	}
+};
+
+#endif /* TRACE_PACK_HPP */
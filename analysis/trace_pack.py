@@ -0,0 +1,170 @@
+import os
+import sys
+import zlib
+import argparse
+import numpy as np
+from trace_reader import TRACE_DTYPE, Trace, read_sim_setting
+
+# Packed traces: the records of a .tr file in compressed blocks, written by the simulation with TRACE_COMPRESS 1, or
+# converted from a .tr file with `python trace_pack.py <.tr file>`. The format is described in
+# simulation/src/point-to-point/model/trace-pack.h: a header and the SimSetting, then blocks of records whose time is
+# delta-encoded and whose bytes are stored column by column, each block stored as is or compressed by zlib.
+# Each block has the time of its first and last record, so a reader only decompresses the blocks it needs.
+MAGIC = b"HPCCTRPK"
+VERSION = 1
+RAW, ZLIB = 0, 1
+BLOCK_HEADER_DTYPE = np.dtype([("n", "<u4"), ("codec", "<u4"), ("size", "<u4"), ("first", "<u8"), ("last", "<u8")])
+RECORD_SIZE = TRACE_DTYPE.itemsize
+
+def is_packed(fileName):
+	with open(fileName, "rb") as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+# the codec and payload of a block of records
+def encode(records, level = 1):
+	n = len(records)
+	raw = np.frombuffer(bytearray(records.tobytes()), np.uint8).reshape(n, RECORD_SIZE)
+	t = raw[:, :8].copy().view("<u8").ravel()
+	t[1:] = t[1:] - t[:-1]
+	t[:1] = 0
+	raw[:, :8] = t.view(np.uint8).reshape(n, 8)
+	col = raw.T.tobytes()
+	if level > 0:
+		z = zlib.compress(col, level)
+		if len(z) < len(col):
+			return ZLIB, z
+	return RAW, col
+
+# the records of a block from its payload
+def decode(payload, codec, n, first):
+	col = zlib.decompress(payload) if codec == ZLIB else payload
+	if codec not in (RAW, ZLIB) or len(col) != n * RECORD_SIZE:
+		raise ValueError("invalid block")
+	r = np.frombuffer(col, np.uint8).reshape(RECORD_SIZE, n).T.copy().view(TRACE_DTYPE).reshape(n)
+	r["time"] = np.cumsum(r["time"], dtype = np.uint64) + np.uint64(first)
+	return r
+
+class PackedTrace:
+	# the same interface as Trace (trace_reader.py), but the records are decompressed on demand, block by block
+	# trace.blocks has the header of each block (n, codec, size, first, last), trace.offsets where their payload starts
+	def __init__(self, fileName):
+		self.fileName = fileName
+		with open(fileName, "rb") as f:
+			if f.read(len(MAGIC)) != MAGIC:
+				raise ValueError("not a packed trace: %s"%fileName)
+			self.version, self.block = np.frombuffer(f.read(8), "<u4").tolist()
+			if self.version != VERSION:
+				raise ValueError("unknown packed trace version %d"%self.version)
+			self.port_speed, self.win = read_sim_setting(f)
+			self.header_size = f.tell()
+			f.seek(0, 2)
+			file_size = f.tell()
+			f.seek(self.header_size)
+			# a block cut by the end of the file (e.g., the simulation is still running) is left out
+			headers, offsets = [], []
+			while True:
+				h = f.read(BLOCK_HEADER_DTYPE.itemsize)
+				if len(h) < BLOCK_HEADER_DTYPE.itemsize:
+					break
+				h = np.frombuffer(h, BLOCK_HEADER_DTYPE)[0]
+				if f.tell() + int(h["size"]) > file_size:
+					break
+				headers.append(h)
+				offsets.append(f.tell())
+				f.seek(int(h["size"]), 1)
+		self.blocks = np.array(headers, BLOCK_HEADER_DTYPE)
+		self.offsets = np.array(offsets, dtype = np.int64)
+
+	def __len__(self):
+		return int(self.blocks["n"].sum())
+
+	def read_block(self, i):
+		h = self.blocks[i]
+		with open(self.fileName, "rb") as f:
+			f.seek(int(self.offsets[i]))
+			payload = f.read(int(h["size"]))
+		return decode(payload, int(h["codec"]), int(h["n"]), int(h["first"]))
+
+	# yield the blocks of records that may have records with lo <= time <= hi
+	def iter_blocks(self, lo = 0, hi = (1 << 64) - 1):
+		for i in np.nonzero((self.blocks["last"] >= np.uint64(lo)) & (self.blocks["first"] <= np.uint64(hi)))[0]:
+			yield self.read_block(i)
+
+	# all the records, decompressed in memory
+	@property
+	def records(self):
+		return self.time_range()
+
+	# the records with lo <= time < hi, only decompressing the blocks in the range
+	def time_range(self, lo = None, hi = None):
+		if hi is not None and (lo or 0) >= hi:
+			return np.zeros(0, TRACE_DTYPE)
+		blocks = list(self.iter_blocks(lo or 0, hi - 1 if hi is not None else (1 << 64) - 1))
+		r = np.concatenate(blocks) if blocks else np.zeros(0, TRACE_DTYPE)
+		t = r["time"]
+		i = 0 if lo is None else np.searchsorted(t, lo, "left")
+		j = len(t) if hi is None else np.searchsorted(t, hi, "left")
+		return r[i:j]
+
+	# yield the records that pass a filter expression, one block at a time (see Trace.filter)
+	def filter(self, expr = None, block = None, use_index = True):
+		from trace_filter import TraceFilter
+		f = TraceFilter(expr)
+		lo, hi = f.time_range()
+		if lo > hi:
+			return
+		for r in self.iter_blocks(lo, hi):
+			r = r[f.test(r)]
+			if len(r) > 0:
+				yield r
+
+def write_block(f, records, level):
+	codec, payload = encode(records, level)
+	h = np.array([(len(records), codec, len(payload), records["time"][0], records["time"][-1])], BLOCK_HEADER_DTYPE)
+	f.write(h.tobytes())
+	f.write(payload)
+
+# write the packed trace of a .tr file
+def pack(trace_file, output, block = 1 << 16, level = 6):
+	trace = Trace(trace_file)
+	with open(trace_file, "rb") as f:
+		sim_setting = f.read(trace.header_size)
+	tmp = "%s.%d"%(output, os.getpid())
+	with open(tmp, "wb") as f:
+		f.write(MAGIC)
+		f.write(np.array([VERSION, block], dtype = "<u4").tobytes())
+		f.write(sim_setting)
+		for i in range(0, len(trace.records), block):
+			write_block(f, trace.records[i:i + block], level)
+	os.rename(tmp, output)
+
+# write the .tr file of a packed trace
+def unpack(packed_file, output):
+	trace = PackedTrace(packed_file)
+	with open(packed_file, "rb") as f:
+		f.seek(len(MAGIC) + 8)
+		sim_setting = f.read(trace.header_size - len(MAGIC) - 8)
+	tmp = "%s.%d"%(output, os.getpid())
+	with open(tmp, "wb") as f:
+		f.write(sim_setting)
+		for r in trace.iter_blocks():
+			f.write(r.tobytes())
+	os.rename(tmp, output)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "convert a .tr file to a packed trace, or back")
+	parser.add_argument("input", help = "the .tr file (or the packed trace with -u)")
+	parser.add_argument("-o", dest = "output", help = "the output file, by default the input with .trz (or .tr with -u)")
+	parser.add_argument("-u", dest = "unpack", action = "store_true", help = "unpack a packed trace to a .tr file")
+	parser.add_argument("-b", dest = "block", type = int, default = 1 << 16, help = "the number of records per block, by default 65536")
+	parser.add_argument("-l", dest = "level", type = int, default = 6, help = "the zlib level, 0 for no compression; by default 6")
+	args = parser.parse_args()
+
+	base = os.path.splitext(args.input)[0]
+	if args.unpack:
+		output = args.output or base + ".tr"
+		unpack(args.input, output)
+	else:
+		output = args.output or base + ".trz"
+		pack(args.input, output, args.block, args.level)
+	print("%s: %d bytes, %s: %d bytes"%(args.input, os.path.getsize(args.input), output, os.path.getsize(output)))
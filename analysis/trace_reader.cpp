@@ -2,8 +2,11 @@
 #include <unistd.h>
 #include <unordered_map>
 #include <unordered_set>
+#include <vector>
 #include "trace-format.h"
 #include "trace_filter.hpp"
+#include "trace_index.hpp"
+#include "trace_pack.hpp"
 #include "utils.hpp"
 #include "sim-setting.h"
 
@@ -26,6 +29,10 @@ int main(int argc, char** argv){
 	}
 	//printf("filter: %s\n", f.str().c_str());
 
+	// a packed trace (TRACE_COMPRESS) has its own header before SimSetting
+	TracePackReader pack;
+	bool packed = pack.open(file);
+
 	// first read SimSetting
 	SimSetting sim_setting;
 	sim_setting.Deserialize(file);
@@ -37,10 +44,84 @@ int main(int argc, char** argv){
 	#endif
 
 	// read trace
-	TraceFormat tr;
-	while (tr.Deserialize(file) > 0){
-		if (!f.test(tr))
-			continue;
-		print_trace(tr);
+	// the records are sorted by time, so only the records in the time range of the filter are read: the first one is
+	// found by binary search, and the reading stops after the last one
+	uint64_t lo, hi;
+	f.time_range(lo, hi);
+	if (lo > hi)
+		return 0;
+	const uint32_t block = 4096;
+	vector<TraceFormat> tr(block);
+	vector<uint8_t> pass(block);
+
+	// a packed trace is read block by block, skipping the blocks out of the time range without decompressing them
+	if (packed){
+		while (pack.next()){
+			if (pack.last < lo){
+				pack.skip();
+				continue;
+			}
+			if (pack.first > hi || !pack.read(tr))
+				break;
+			pass.resize(pack.n);
+			f.test_block(&tr[0], pack.n, &pass[0]);
+			for (uint32_t i = 0; i < pack.n; i++)
+				if (pass[i])
+					print_trace(tr[i]);
+		}
+		return 0;
+	}
+
+	long header_size = ftell(file);
+	fseek(file, 0, SEEK_END);
+	uint64_t file_size = ftell(file);
+	uint64_t n = (file_size - header_size) / sizeof(TraceFormat);
+
+	// with the sidecar index (trace_index.py), only the blocks of the index that may have records passing the filter are read
+	TraceIndex index;
+	if (f.root != NULL && index.load(argv[1], file_size) && index.header_size == (uint64_t)header_size){
+		vector<uint8_t> cand;
+		index.candidate_blocks(f, cand);
+		for (uint64_t b = 0; b < index.n_block; b++){
+			if (!cand[b])
+				continue;
+			uint64_t begin = b * index.block, end = min(begin + index.block, n);
+			fseek(file, header_size + begin * sizeof(TraceFormat), SEEK_SET);
+			for (uint64_t i = begin; i < end; ){
+				uint32_t cnt = fread(&tr[0], sizeof(TraceFormat), min((uint64_t)block, end - i), file);
+				if (cnt == 0)
+					break;
+				f.test_block(&tr[0], cnt, &pass[0]);
+				for (uint32_t j = 0; j < cnt; j++)
+					if (pass[j])
+						print_trace(tr[j]);
+				i += cnt;
+			}
+		}
+		return 0;
+	}
+
+	uint64_t l = 0, r = n;
+	while (l < r){
+		uint64_t m = (l + r) / 2, t;
+		fseek(file, header_size + m * sizeof(TraceFormat) + offsetof(TraceFormat, time), SEEK_SET);
+		if (fread(&t, sizeof(t), 1, file) != 1)
+			break;
+		if (t < lo)
+			l = m + 1;
+		else
+			r = m;
+	}
+	fseek(file, header_size + l * sizeof(TraceFormat), SEEK_SET);
+
+	// test the records in blocks
+	for (uint32_t cnt; (cnt = fread(&tr[0], sizeof(TraceFormat), block, file)) > 0;){
+		f.test_block(&tr[0], cnt, &pass[0]);
+		for (uint32_t i = 0; i < cnt; i++){
+			if (tr[i].time > hi)
+				return 0;
+			if (pass[i])
+				print_trace(tr[i]);
+		}
 	}
 }
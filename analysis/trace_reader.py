@@ -0,0 +1,200 @@
+import sys
+import argparse
+import numpy as np
+
+# Python reader of the .tr files output by the simulation (see trace_reader.cpp for the C++ one).
+# A .tr file is a SimSetting header (sim-setting.h) followed by TraceFormat records (trace-format.h), which are written
+# as raw structs. TRACE_DTYPE mirrors the struct (with its padding, checked with offsetof on x86-64 g++), so the records
+# are memory-mapped as a numpy structured array: no copy, random access, and every field is a vectorized column.
+
+EVENTS = {0: "Recv", 1: "Enqu", 2: "Dequ", 3: "Drop"}
+RECV, ENQU, DEQU, DROP = 0, 1, 2, 3
+
+# l3Prot of the records, and what the union of the record holds
+L3_TCP, L3_UDP, L3_ACK, L3_NACK, L3_PFC, L3_CNP, L3_QP = 0x6, 0x11, 0xFC, 0xFD, 0xFE, 0xFF, 0x0
+
+def struct(fields, itemsize):
+	return np.dtype({"names": [f[0] for f in fields], "formats": [f[1] for f in fields], "offsets": [f[2] for f in fields], "itemsize": itemsize})
+
+# the variants of the union, all at offset 32
+DATA_DTYPE = struct([("sport", "<u2", 0), ("dport", "<u2", 2), ("seq", "<u4", 4), ("ts", "<u8", 8), ("pg", "<u2", 16), ("payload", "<u2", 18)], 24)
+CNP_DTYPE = struct([("fid", "<u2", 0), ("qIndex", "u1", 2), ("ecnBits", "u1", 3), ("qfb", "<u2", 4), ("total", "<u2", 6), ("seq", "<u4", 4)], 24)
+ACK_DTYPE = struct([("sport", "<u2", 0), ("dport", "<u2", 2), ("flags", "<u2", 4), ("pg", "<u2", 6), ("seq", "<u4", 8), ("ts", "<u8", 16)], 24)
+PFC_DTYPE = struct([("time", "<u4", 0), ("qlen", "<u4", 4), ("qIndex", "u1", 8)], 24)
+QP_DTYPE = struct([("sport", "<u2", 0), ("dport", "<u2", 2)], 24)
+
+TRACE_DTYPE = struct([
+	("time", "<u8", 0),
+	("node", "<u2", 8),
+	("intf", "u1", 10),
+	("qidx", "u1", 11),
+	("qlen", "<u4", 12),
+	("sip", "<u4", 16),
+	("dip", "<u4", 20),
+	("size", "<u2", 24),
+	("l3Prot", "u1", 26),
+	("event", "u1", 27),
+	("ecn", "u1", 28),
+	("nodeType", "u1", 29), # 0: host, 1: switch
+	("data", DATA_DTYPE, 32),
+	("cnp", CNP_DTYPE, 32),
+	("ack", ACK_DTYPE, 32),
+	("pfc", PFC_DTYPE, 32),
+	("qp", QP_DTYPE, 32),
+], 56)
+
+# one port_speed entry of SimSetting, written field by field (no padding)
+PORT_SPEED_DTYPE = np.dtype([("node", "<u2"), ("intf", "u1"), ("bps", "<u8")])
+
+# read the SimSetting at the position of f: port_speed[node][intf] (bps) and win
+def read_sim_setting(f):
+	n = int(np.frombuffer(f.read(4), "<u4")[0])
+	ports = np.frombuffer(f.read(n * PORT_SPEED_DTYPE.itemsize), PORT_SPEED_DTYPE)
+	win = int(np.frombuffer(f.read(4), "<u4")[0])
+	port_speed = {}
+	for node, intf, bps in ports.tolist():
+		port_speed.setdefault(node, {})[intf] = bps
+	return port_speed, win
+
+class Trace:
+	# trace.port_speed[node][intf] is the speed (bps) of the port, trace.win is the window bound
+	# trace.records is the memory-mapped array of the records, in the order they were written (which is by time)
+	def __init__(self, fileName):
+		self.fileName = fileName
+		with open(fileName, "rb") as f:
+			self.port_speed, self.win = read_sim_setting(f)
+			self.header_size = f.tell()
+			f.seek(0, 2)
+			file_size = f.tell()
+		# a record cut by the end of the file (e.g., the simulation is still running) is left out
+		n_record = (file_size - self.header_size) // TRACE_DTYPE.itemsize
+		if n_record > 0:
+			self.records = np.memmap(fileName, TRACE_DTYPE, "r", self.header_size, (n_record,))
+		else:
+			self.records = np.zeros(0, TRACE_DTYPE)
+
+	def __len__(self):
+		return len(self.records)
+
+	# the records with lo <= time < hi, found by binary search since the records are sorted by time
+	def time_range(self, lo = None, hi = None):
+		t = self.records["time"]
+		i = 0 if lo is None else np.searchsorted(t, lo, "left")
+		j = len(t) if hi is None else np.searchsorted(t, hi, "left")
+		return self.records[i:j]
+
+	# yield the records that pass a filter expression (the grammar of trace_filter.hpp), in blocks of records
+	# with the sidecar index (trace_index.py), only the blocks of the index that may have such records are read;
+	# without it, only the records in the time range of the filter
+	def filter(self, expr = None, block = 1 << 20, use_index = True):
+		from trace_filter import TraceFilter
+		from trace_index import load_index
+		f = TraceFilter(expr)
+		index = load_index(self.fileName) if use_index and expr else None
+		if index is not None:
+			for b in np.nonzero(index.candidate_blocks(f))[0]:
+				r = self.records[b * index.block:(b + 1) * index.block]
+				r = r[f.test(r)]
+				if len(r) > 0:
+					yield r
+			return
+		lo, hi = f.time_range()
+		if lo > hi:
+			return
+		records = self.time_range(lo, hi + 1 if hi < (1 << 64) - 1 else None)
+		for i in range(0, len(records), block):
+			r = records[i:i + block]
+			r = r[f.test(r)]
+			if len(r) > 0:
+				yield r
+
+# a Trace, or a PackedTrace (trace_pack.py) if the file was written with TRACE_COMPRESS
+def open_trace(fileName):
+	from trace_pack import PackedTrace, is_packed
+	if is_packed(fileName):
+		return PackedTrace(fileName)
+	return Trace(fileName)
+
+# the sport and dport of records, from the variant of the union their l3Prot uses (0 for the others), like GetFlowInt in utils.hpp
+def ports(records):
+	l3 = records["l3Prot"]
+	data = (l3 == L3_TCP) | (l3 == L3_UDP)
+	ack = (l3 == L3_ACK) | (l3 == L3_NACK)
+	qp = l3 == L3_QP
+	sport = np.where(data, records["data"]["sport"], np.where(ack, records["ack"]["sport"], np.where(qp, records["qp"]["sport"], 0)))
+	dport = np.where(data, records["data"]["dport"], np.where(ack, records["ack"]["dport"], np.where(qp, records["qp"]["dport"], 0)))
+	return sport.astype(np.uint16), dport.astype(np.uint16)
+
+# vectorized GetFlowInt of utils.hpp: the flow of each record as a uint64, from the 2nd and 3rd bytes of the ips and the ports
+def flow_int(records, reverse = False):
+	sip, dip = records["sip"].astype(np.uint64), records["dip"].astype(np.uint64)
+	sport, dport = ports(records)
+	sport, dport = sport.astype(np.uint64), dport.astype(np.uint64)
+	if reverse:
+		sip, dip, sport, dport = dip, sip, dport, sport
+	src = (sip >> np.uint64(8)) & np.uint64(0xffff)
+	dst = (dip >> np.uint64(8)) & np.uint64(0xffff)
+	return (src << np.uint64(48)) | (dst << np.uint64(32)) | (sport << np.uint64(16)) | dport
+
+# vectorized GetStandardFlowInt of utils.hpp: the forward flow for data, the reverse flow for (N)ACK
+def standard_flow_int(records):
+	ack = (records["l3Prot"] == L3_ACK) | (records["l3Prot"] == L3_NACK)
+	return np.where(ack, flow_int(records, True), flow_int(records))
+
+def l3_char(p):
+	return {L3_TCP: "T", L3_UDP: "U", L3_ACK: "A", L3_NACK: "N", L3_PFC: "P", L3_CNP: "C"}.get(p, "X")
+
+# a record as a line of text, the same as print_trace in utils.hpp
+def format_record(r):
+	time, node, intf, qidx, qlen, sip, dip, size, l3, event, ecn = [int(r[k]) for k in ("time", "node", "intf", "qidx", "qlen", "sip", "dip", "size", "l3Prot", "event", "ecn")]
+	ev = EVENTS.get(event, "????")
+	head = "%d n:%d %d:%d %d %s ecn:%x %08x %08x"%(time, node, intf, qidx, qlen, ev, ecn, sip, dip)
+	if l3 == L3_TCP or l3 == L3_UDP:
+		d = r["data"]
+		return "%s %d %d %s %d %d %d %d(%d)"%(head, d["sport"], d["dport"], l3_char(l3), d["seq"], d["ts"], d["pg"], size, d["payload"])
+	if l3 == L3_ACK or l3 == L3_NACK:
+		a = r["ack"]
+		return "%s %d %d %s 0x%02X %d %d %d %d"%(head, a["sport"], a["dport"], l3_char(l3), a["flags"], a["pg"], a["seq"], a["ts"], size)
+	if l3 == L3_PFC:
+		p = r["pfc"]
+		return "%s %s %d %d %d %d"%(head, l3_char(l3), p["time"], p["qlen"], p["qIndex"], size)
+	if l3 == L3_CNP:
+		c = r["cnp"]
+		return "%s %s %d %d %d %d %d"%(head, l3_char(l3), c["fid"], c["qIndex"], c["ecnBits"], c["seq"], size)
+	if l3 == L3_QP:
+		q = r["qp"]
+		return "%d n:%d %d:%d %s %08x %08x %d %d"%(time, node, intf, qidx, ev, sip, dip, q["sport"], q["dport"])
+	return "%s %x %d"%(head, l3, size)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "read a .tr file of the simulation")
+	parser.add_argument("trace", help = "the .tr file (or a packed trace)")
+	parser.add_argument("filter", nargs = "?", help = "a filter expression, the same as trace_reader's (e.g. 'time>2000010000&node=338')")
+	parser.add_argument("--start", type = int, help = "only the records at or after this time (ns)")
+	parser.add_argument("--end", type = int, help = "only the records before this time (ns)")
+	parser.add_argument("--node", type = int, help = "only the records of this node")
+	parser.add_argument("--summary", action = "store_true", help = "print the header and a summary of the records instead of the records")
+	args = parser.parse_args()
+
+	trace = open_trace(args.trace)
+	try:
+		blocks = list(trace.filter(args.filter)) if args.filter else [trace.time_range(args.start, args.end)]
+	except ValueError:
+		print("Invalid filter")
+		sys.exit(0)
+	records = np.concatenate(blocks) if blocks else np.zeros(0, TRACE_DTYPE)
+	if args.start is not None or args.end is not None:
+		t = records["time"]
+		records = records[np.searchsorted(t, args.start or 0, "left"):np.searchsorted(t, args.end, "left") if args.end is not None else len(t)]
+	if args.node is not None:
+		records = records[records["node"] == args.node]
+	if args.summary:
+		print("window bound: %d, ports: %d, records: %d (%d selected)"%(trace.win, sum(len(p) for p in trace.port_speed.values()), len(trace), len(records)))
+		if len(records) > 0:
+			print("time: %d - %d"%(records["time"][0], records["time"][-1]))
+			for e, name in sorted(EVENTS.items()):
+				print("%s: %d"%(name, (records["event"] == e).sum()))
+		sys.exit(0)
+	out = sys.stdout
+	for i in range(0, len(records), 1 << 16):
+		out.write("".join(format_record(r) + "\n" for r in records[i:i + (1 << 16)]))
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# The heartbeats of a run: with HEARTBEAT_FILE in its config, scratch/third.cc writes a json line to the file every
+# HEARTBEAT_INTERVAL seconds of wall clock time, with the simulated time (sim_ns, and stop_ns the SIMULATOR_STOP_TIME),
+# the wall clock time (wall_s), the events processed (events, and events_per_s since the last heartbeat), the flows
+# (active_qps, completed_flows, of flows), the resident memory (rss_kb) and the process (pid, a continuation forked from
+# the run writes its own from the fork on); the last one has final 1.
+# A Monitor follows the heartbeats of a run, for its progress and ETA, and tells if the run stalls: no heartbeat for
+# stall_time seconds, or the simulated time per wall clock second over the last stall_time seconds collapses to less
+# than `collapse` of its median before them (e.g., a PFC deadlock). third.cc checks the wall clock from an event every
+# 10us of simulated time, so a run stuck at one simulated time writes no heartbeat at all and is only caught by the
+# first case. Once all flows are done, third.cc writes a last heartbeat and no more until the final one, so a run is
+# no longer taken as stalled then.
+
+# the heartbeats in the complete lines of fileName after offset, and the offset after them
+def read_heartbeats(fileName, offset = 0):
+	beats = []
+	try:
+		with open(fileName, "rb") as f:
+			f.seek(offset)
+			data = f.read()
+	except IOError:
+		return beats, offset
+	end = data.rfind(b"\n") + 1
+	for line in data[:end].splitlines():
+		if line.strip():
+			beats.append(json.loads(line.decode("utf-8")))
+	return beats, offset + end
+
+def format_time(s):
+	s = int(s)
+	if s >= 3600:
+		return "%dh%02dm"%(s // 3600, s % 3600 // 60)
+	if s >= 60:
+		return "%dm%02ds"%(s // 60, s % 60)
+	return "%ds"%s
+
+class Monitor:
+	def __init__(self, fileName, stall_time = 600, collapse = 0.01):
+		self.fileName = fileName
+		self.stall_time = stall_time
+		self.collapse = collapse
+		self.offset = 0
+		self.last = None # the last heartbeat
+		self.last_seen = None # when a heartbeat was last read
+		self.beats = [] # the heartbeats since the first flow started (before it, the simulated time goes much faster)
+		self.rates = [] # (wall_s, the simulated ns per wall clock second since the heartbeat before) of the heartbeats in beats
+
+	# read the new heartbeats; returns the number of them
+	def poll(self):
+		beats, self.offset = read_heartbeats(self.fileName, self.offset)
+		for b in beats:
+			if b["active_qps"] + b["completed_flows"] > 0:
+				if self.beats and b["wall_s"] > self.beats[-1]["wall_s"]:
+					self.rates.append((b["wall_s"], (b["sim_ns"] - self.beats[-1]["sim_ns"]) / (b["wall_s"] - self.beats[-1]["wall_s"])))
+				self.beats.append(b)
+			self.last = b
+		if beats:
+			self.last_seen = time.time()
+		return len(beats)
+
+	# the simulated ns per wall clock second over the last `window` seconds of heartbeats (at least two of them), or None
+	def sim_rate(self, window):
+		if len(self.beats) < 2:
+			return None
+		last = self.beats[-1]
+		i = len(self.beats) - 2
+		while i > 0 and last["wall_s"] - self.beats[i]["wall_s"] < window:
+			i -= 1
+		first = self.beats[i]
+		if last["wall_s"] <= first["wall_s"]:
+			return None
+		return (last["sim_ns"] - first["sim_ns"]) / (last["wall_s"] - first["wall_s"])
+
+	# the wall clock seconds left to the end of the simulation, from the rate of the last minute, or None
+	def eta(self):
+		if self.last is None:
+			return None
+		if self.last["final"]:
+			return 0
+		rate = self.sim_rate(60)
+		if not rate:
+			return None
+		return (self.last["stop_ns"] - self.last["sim_ns"]) / rate
+
+	# why the run has stalled at time now, or None if it has not. The time before the first heartbeat (the setup of the
+	# topology and the routes, which can be long) is not counted
+	def stalled(self, now):
+		if self.last is None or self.last["final"] or self.last["completed_flows"] == self.last["flows"]:
+			return None
+		if now - self.last_seen > self.stall_time:
+			return "no heartbeat for %s"%format_time(now - self.last_seen)
+		before = sorted(r for t, r in self.rates if t <= self.beats[-1]["wall_s"] - self.stall_time)
+		if len(before) == 0:
+			return None
+		median = before[(len(before) - 1) // 2]
+		rate = self.sim_rate(self.stall_time)
+		if rate is not None and rate < self.collapse * median:
+			return "the simulated time rate collapsed to %.0f ns/s (median %.0f ns/s) in the last %s"%(rate, median, format_time(self.stall_time))
+		return None
+
+	def status(self):
+		b = self.last
+		if b is None:
+			return "starting"
+		eta = self.eta()
+		return "%.6fs/%.6fs simulated (%.1f%%), %d/%d flows done, %d active qps, %.2fM events/s, %dMB, ETA %s"%(
+			b["sim_ns"] * 1e-9, b["stop_ns"] * 1e-9, 100.0 * b["sim_ns"] / b["stop_ns"] if b["stop_ns"] > 0 else 0,
+			b["completed_flows"], b["flows"], b["active_qps"], b["events_per_s"] * 1e-6, b["rss_kb"] // 1024,
+			"?" if eta is None else format_time(eta))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "show the progress of a run from its heartbeats (HEARTBEAT_FILE)")
+	parser.add_argument("heartbeat", help = "the heartbeat file of the run, e.g. mix/heartbeat_fat_flow_dcqcn.txt")
+	parser.add_argument("-f", dest = "follow", action = "store_true", help = "follow the run until it ends, showing each heartbeat")
+	args = parser.parse_args()
+
+	if not os.path.exists(args.heartbeat):
+		print("%s not found"%args.heartbeat)
+		sys.exit(1)
+	mon = Monitor(args.heartbeat)
+	mon.poll()
+	print(mon.status())
+	while args.follow and not (mon.last is not None and mon.last["final"]):
+		time.sleep(1)
+		if mon.poll() > 0:
+			print(mon.status())
+			sys.stdout.flush()
@@ -0,0 +1,149 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+
+# A cache of the results of simulations, keyed by their content: the config (without the names of its outputs and the
+# keys that do not change the results, RUNTIME), the contents of its input files, and the build ids of the third binary
+# and the ns-3 libraries. Two runs with the same key give the same results, whatever the names of their outputs; and two
+# runs that differ in anything, even a parameter that is not in the output names (e.g. BUFFER_SIZE or KMAX_MAP), have
+# different keys.
+#
+# An entry is a folder <cache>/<key[:2]>/<key> with the outputs of the run (OUTPUTS), its config and meta.json. A run
+# writes to a temporary folder, which is renamed to the entry when it completes, so an entry is always complete.
+
+# the output files of a config, and their name in an entry
+OUTPUTS = {"FCT_OUTPUT_FILE": "fct.txt", "PFC_OUTPUT_FILE": "pfc.txt", "QLEN_MON_FILE": "qlen.txt", "TRACE_OUTPUT_FILE": "mix.tr", "HEARTBEAT_FILE": "heartbeat.txt"}
+# the keys of a config that only change how a run reports its progress, not its results
+RUNTIME = ["HEARTBEAT_INTERVAL"]
+# the input files of a config, whose contents are part of the key
+INPUTS = ["TOPOLOGY_FILE", "FLOW_FILE", "TRACE_FILE"]
+
+# the (key, value) of each line of a config, in order
+def parse_config(config):
+	items = []
+	for line in config.splitlines():
+		line = line.strip()
+		if line:
+			key, _, value = line.partition(" ")
+			items.append((key, value.strip()))
+	return items
+
+# the config with the given values replacing those of their keys
+def replace_config(config, values):
+	lines = []
+	for line in config.splitlines():
+		key = line.strip().partition(" ")[0]
+		lines.append("%s %s"%(key, values[key]) if key in values else line)
+	return "\n".join(lines) + "\n"
+
+_file_hashes = {}
+def file_hash(path):
+	st = os.stat(path)
+	k = (os.path.abspath(path), st.st_size, st.st_mtime)
+	if k not in _file_hashes:
+		h = hashlib.sha1()
+		with open(path, "rb") as f:
+			for b in iter(lambda: f.read(1 << 20), b""):
+				h.update(b)
+		_file_hashes[k] = h.hexdigest()
+	return _file_hashes[k]
+
+# the GNU build id of an ELF file (64-bit little endian, as built by gcc on x86-64), or None
+def elf_build_id(path):
+	with open(path, "rb") as f:
+		data = f.read()
+	if data[:4] != b"\x7fELF" or data[4:6] != b"\x02\x01":
+		return None
+	shoff, = struct.unpack_from("<Q", data, 0x28)
+	shentsize, shnum = struct.unpack_from("<HH", data, 0x3a)
+	for i in range(shnum):
+		sh_type, = struct.unpack_from("<I", data, shoff + i * shentsize + 4)
+		if sh_type != 7: # SHT_NOTE
+			continue
+		offset, size = struct.unpack_from("<QQ", data, shoff + i * shentsize + 0x18)
+		p = offset
+		while p + 12 <= offset + size:
+			namesz, descsz, note_type = struct.unpack_from("<III", data, p)
+			name = data[p + 12:p + 12 + namesz]
+			desc = p + 12 + (namesz + 3) // 4 * 4
+			if note_type == 3 and name == b"GNU\x00": # NT_GNU_BUILD_ID
+				return "".join("%02x"%c for c in bytearray(data[desc:desc + descsz]))
+			p = desc + (descsz + 3) // 4 * 4
+	return None
+
+# the id of a build: the build ids (or the hashes, without a build id) of the binary and of the ns-3 libraries it loads
+def build_id(binary, lib):
+	h = hashlib.sha1()
+	for path in [binary] + sorted(glob.glob(os.path.join(lib, "libns3*.so"))):
+		h.update(("%s %s\n"%(os.path.basename(path), elf_build_id(path) or file_hash(path))).encode("utf-8"))
+	return h.hexdigest()
+
+# the key of a run of config (with its input files relative to sim_dir) by the build build_id
+def run_key(config, sim_dir, build_id):
+	values = dict(parse_config(config))
+	for k in list(OUTPUTS) + RUNTIME:
+		values.pop(k, None)
+	# the inputs count by their contents, not their names
+	inputs = dict((k, file_hash(os.path.join(sim_dir, values.pop(k)))) for k in INPUTS if k in values)
+	s = json.dumps({"config": sorted(values.items()), "inputs": inputs, "build": build_id}, sort_keys = True)
+	return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+# copy a file to dst, replacing dst. Not a hard link: the simulation truncates its outputs when it opens them, so a later
+# run to the same names (e.g. by run.py) would also overwrite the entry
+def publish_file(src, dst):
+	tmp = "%s.%d"%(dst, os.getpid())
+	shutil.copyfile(src, tmp)
+	os.rename(tmp, dst)
+
+class ResultCache:
+	def __init__(self, dir):
+		self.dir = dir
+
+	def path(self, key):
+		return os.path.join(self.dir, key[:2], key)
+
+	# the meta of the entry of key, or None if it is not in the cache
+	def lookup(self, key):
+		meta = os.path.join(self.path(key), "meta.json")
+		if not os.path.exists(meta):
+			return None
+		with open(meta) as f:
+			return json.load(f)
+
+	# a temporary folder for a run of config, with the config (config.txt), and the config to run, writing its outputs
+	# to the folder (run_config.txt); returns the folder and the config to run
+	def prepare(self, key, config):
+		tmp = "%s.tmp%d"%(self.path(key), os.getpid())
+		if os.path.exists(tmp):
+			shutil.rmtree(tmp)
+		os.makedirs(tmp)
+		with open(os.path.join(tmp, "config.txt"), "w") as f:
+			f.write(config)
+		values = dict(parse_config(config))
+		with open(os.path.join(tmp, "run_config.txt"), "w") as f:
+			f.write(replace_config(config, dict((k, os.path.join(tmp, v)) for k, v in OUTPUTS.items() if k in values)))
+		return tmp, os.path.join(tmp, "run_config.txt")
+
+	# make the temporary folder of a completed run the entry of key (replacing the entry, if any)
+	def commit(self, key, tmp, meta):
+		meta = dict(meta, key = key, time = time.time())
+		with open(os.path.join(tmp, "meta.json"), "w") as f:
+			json.dump(meta, f, indent = 1, sort_keys = True)
+		old = "%s.old%d"%(self.path(key), os.getpid())
+		if os.path.exists(self.path(key)):
+			os.rename(self.path(key), old)
+		os.rename(tmp, self.path(key))
+		shutil.rmtree(old, ignore_errors = True)
+
+	def discard(self, tmp):
+		shutil.rmtree(tmp, ignore_errors = True)
+
+	# put the outputs of the entry of key at the output names of config (relative to sim_dir)
+	def publish(self, key, config, sim_dir):
+		for k, v in parse_config(config):
+			if k in OUTPUTS and os.path.exists(os.path.join(self.path(key), OUTPUTS[k])):
+				publish_file(os.path.join(self.path(key), OUTPUTS[k]), os.path.join(sim_dir, v))
@@ -21,6 +21,12 @@
 #include <fstream>
 #include <unordered_map>
 #include <time.h> 
+#include <cstring>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <sys/wait.h>
 #include "ns3/core-module.h"
 #include "ns3/qbb-helper.h"
 #include "ns3/point-to-point-helper.h"
@@ -75,6 +81,7 @@ uint64_t link_down_time = 0;
 uint32_t link_down_A = 0, link_down_B = 0;
 
 uint32_t enable_trace = 1;
+uint32_t trace_compress = 0;
 
 uint32_t buffer_size = 16;
 
@@ -82,6 +89,9 @@ uint32_t qlen_dump_interval = 100000000, qlen_mon_interval = 100;
 uint64_t qlen_mon_start = 2000000000, qlen_mon_end = 2100000000;
 string qlen_mon_file;
 
+string heartbeat_file;
+double heartbeat_interval = 10; // wall clock seconds between two heartbeats
+
 unordered_map<uint64_t, uint32_t> rate2kmax, rate2kmin;
 unordered_map<uint64_t, double> rate2pmax;
 
@@ -125,10 +135,84 @@ struct FlowInput{
 };
 FlowInput flow_input = {0};
 uint32_t flow_num;
+uint32_t flow_finished = 0;
+
+/*
+ * Binary flow file written by traffic_gen.py -f bin (see traffic_gen/flow_file.py), read through mmap:
+ * magic "HPCCFLOW", uint64 flow count, then blocks of: uint64 n, and the columns
+ * start_ns[n] (uint64), size[n] (uint64), src[n] (uint32), dst[n] (uint32), pg[n] (uint16), dport[n] (uint16),
+ * padded to a multiple of 8 bytes.
+ */
+struct FlowBlock{
+	uint64_t n, i;
+	const uint64_t *start_ns, *size;
+	const uint32_t *src, *dst;
+	const uint16_t *pg, *dport;
+};
+const uint8_t *flow_map = NULL, *flow_map_next = NULL;
+size_t flow_map_len = 0;
+FlowBlock flow_block = {0};
+
+// open the flow file: a binary flow file is mmap'ed, otherwise it is read as text
+void OpenFlowInput(){
+	int fd = open(flow_file.c_str(), O_RDONLY);
+	struct stat st;
+	char magic[8];
+	if (fd >= 0 && fstat(fd, &st) == 0 && st.st_size >= 16 && pread(fd, magic, 8, 0) == 8 && memcmp(magic, "HPCCFLOW", 8) == 0){
+		void *p = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+		NS_ASSERT_MSG(p != MAP_FAILED, "cannot mmap the flow file");
+		madvise(p, st.st_size, MADV_SEQUENTIAL);
+		flow_map = (const uint8_t*)p;
+		flow_map_len = st.st_size;
+		// every flow takes at least 28 bytes of columns, so a count that does not fit the file (or flow_num) is corrupt
+		uint64_t count = *(const uint64_t*)(flow_map + 8);
+		NS_ASSERT_MSG(count <= 0xffffffffu && 16 + count * 28 <= flow_map_len, "bad flow count in the flow file header");
+		flow_num = count;
+		flow_map_next = flow_map + 16;
+		flow_block.n = flow_block.i = 0;
+	}else{
+		flowf.open(flow_file.c_str());
+		flowf >> flow_num;
+	}
+	if (fd >= 0)
+		close(fd);
+}
+
+void CloseFlowInput(){
+	if (flow_map){
+		munmap((void*)flow_map, flow_map_len);
+		flow_map = NULL;
+	}else
+		flowf.close();
+}
 
 void ReadFlowInput(){
 	if (flow_input.idx < flow_num){
-		flowf >> flow_input.src >> flow_input.dst >> flow_input.pg >> flow_input.dport >> flow_input.maxPacketCount >> flow_input.start_time;
+		if (flow_map){
+			if (flow_block.i == flow_block.n){ // move to the next block
+				NS_ASSERT_MSG(flow_map_next + 8 <= flow_map + flow_map_len, "flow file is truncated");
+				uint64_t n = *(const uint64_t*)flow_map_next;
+				const uint8_t *p = flow_map_next + 8;
+				flow_block.n = n;
+				flow_block.i = 0;
+				flow_block.start_ns = (const uint64_t*)p; p += n * 8;
+				flow_block.size = (const uint64_t*)p; p += n * 8;
+				flow_block.src = (const uint32_t*)p; p += n * 4;
+				flow_block.dst = (const uint32_t*)p; p += n * 4;
+				flow_block.pg = (const uint16_t*)p; p += n * 2;
+				flow_block.dport = (const uint16_t*)p; p += n * 2;
+				flow_map_next = flow_map_next + ((8 + n * 28 + 7) & ~7lu);
+				NS_ASSERT_MSG(flow_map_next <= flow_map + flow_map_len, "flow file is truncated");
+			}
+			uint64_t i = flow_block.i++;
+			flow_input.src = flow_block.src[i];
+			flow_input.dst = flow_block.dst[i];
+			flow_input.pg = flow_block.pg[i];
+			flow_input.dport = flow_block.dport[i];
+			flow_input.maxPacketCount = flow_block.size[i];
+			flow_input.start_time = flow_block.start_ns[i] * 1e-9;
+		}else
+			flowf >> flow_input.src >> flow_input.dst >> flow_input.pg >> flow_input.dport >> flow_input.maxPacketCount >> flow_input.start_time;
 		NS_ASSERT(n.Get(flow_input.src)->GetNodeType() == 0 && n.Get(flow_input.dst)->GetNodeType() == 0);
 	}
 }
@@ -148,7 +232,7 @@ void ScheduleFlowInputs(){
 	if (flow_input.idx < flow_num){
 		Simulator::Schedule(Seconds(flow_input.start_time)-Simulator::Now(), ScheduleFlowInputs);
 	}else { // no more flows, close the file
-		flowf.close();
+		CloseFlowInput();
 	}
 }
 
@@ -168,6 +252,7 @@ void qp_finish(FILE* fout, Ptr<RdmaQueuePair> q){
 	// sip, dip, sport, dport, size (B), start_time, fct (ns), standalone_fct (ns)
 	fprintf(fout, "%08x %08x %u %u %lu %lu %lu %lu\n", q->sip.Get(), q->dip.Get(), q->sport, q->dport, q->m_size, q->startTime.GetTimeStep(), (Simulator::Now() - q->startTime).GetTimeStep(), standalone_fct);
 	fflush(fout);
+	flow_finished++;
 
 	// remove rxQp from the receiver
 	Ptr<Node> dstNode = n.Get(did);
@@ -175,6 +260,63 @@ void qp_finish(FILE* fout, Ptr<RdmaQueuePair> q){
 	rdma->m_rdma->DeleteRxQp(q->sip.Get(), q->m_pg, q->sport);
 }
 
+/************************************************
+ * Heartbeats: a json line of the progress of the simulation every heartbeat_interval seconds of wall clock time
+ ***********************************************/
+struct timespec wall_begin;
+double heartbeat_last_wall = 0;
+uint64_t heartbeat_last_events = 0;
+// ns of simulated time between two checks of the wall clock. The check is an event, so a run stuck at one simulated
+// time (e.g. events rescheduling themselves with no delay) writes no heartbeat; only the wall clock staleness of the
+// heartbeat file (sweep.py --stall-time) catches it
+uint64_t heartbeat_check = 10000;
+uint64_t heartbeat_events = 0; // the checks so far, which are left out of the events of the heartbeats
+
+double wall_time(){
+	struct timespec t;
+	clock_gettime(CLOCK_MONOTONIC, &t);
+	return (t.tv_sec - wall_begin.tv_sec) + (t.tv_nsec - wall_begin.tv_nsec) * 1e-9;
+}
+
+// the resident memory (KB) of this process, from /proc/self/statm
+uint64_t rss_kb(){
+	uint64_t size = 0, resident = 0;
+	FILE* f = fopen("/proc/self/statm", "r");
+	if (f != NULL){
+		if (fscanf(f, "%lu %lu", &size, &resident) != 2)
+			resident = 0;
+		fclose(f);
+	}
+	return resident * (sysconf(_SC_PAGESIZE) / 1024);
+}
+
+// sim_ns: simulated time, stop_ns: SIMULATOR_STOP_TIME, wall_s: wall clock time since the start of the program,
+// events_per_s: the events per wall clock second since the last heartbeat, active_qps: the flows started and not finished,
+// pid: the process (a continuation has its own), final: 1 for the heartbeat at the end of the simulation
+void write_heartbeat(FILE* fout, bool final){
+	double wall = wall_time();
+	uint64_t events = Simulator::GetEventCount() - heartbeat_events;
+	double rate = wall > heartbeat_last_wall ? (events - heartbeat_last_events) / (wall - heartbeat_last_wall) : 0;
+	fprintf(fout, "{\"sim_ns\": %lu, \"stop_ns\": %lu, \"wall_s\": %.3f, \"events\": %lu, \"events_per_s\": %.0f, \"active_qps\": %u, \"completed_flows\": %u, \"flows\": %u, \"rss_kb\": %lu, \"pid\": %d, \"final\": %d}\n",
+			Simulator::Now().GetTimeStep(), Seconds(simulator_stop_time).GetTimeStep(), wall, events, rate, flow_input.idx - flow_finished, flow_finished, flow_num, rss_kb(), (int)getpid(), final);
+	fflush(fout);
+	heartbeat_last_wall = wall;
+	heartbeat_last_events = events;
+}
+
+// once all flows are done, a last heartbeat is written and the checks stop, so they do not run until
+// SIMULATOR_STOP_TIME; the final heartbeat follows at the end of the simulation
+void heartbeat(FILE* fout){
+	heartbeat_events++;
+	if (flow_finished == flow_num){
+		write_heartbeat(fout, false);
+		return;
+	}
+	if (wall_time() - heartbeat_last_wall >= heartbeat_interval)
+		write_heartbeat(fout, false);
+	Simulator::Schedule(NanoSeconds(heartbeat_check), &heartbeat, fout);
+}
+
 void get_pfc(FILE* fout, Ptr<QbbNetDevice> dev, uint32_t type){
 	fprintf(fout, "%lu %u %u %u %u\n", Simulator::Now().GetTimeStep(), dev->GetNode()->GetId(), dev->GetNode()->GetNodeType(), dev->GetIfIndex(), type);
 }
@@ -327,6 +469,218 @@ void TakeDownLink(NodeContainer n, Ptr<Node> a, Ptr<Node> b){
 	}
 }
 
+// the parameters of the congestion control of a host
+void SetRdmaHwAttributes(Ptr<RdmaHw> rdmaHw){
+	rdmaHw->SetAttribute("ClampTargetRate", BooleanValue(clamp_target_rate));
+	rdmaHw->SetAttribute("AlphaResumInterval", DoubleValue(alpha_resume_interval));
+	rdmaHw->SetAttribute("RPTimer", DoubleValue(rp_timer));
+	rdmaHw->SetAttribute("FastRecoveryTimes", UintegerValue(fast_recovery_times));
+	rdmaHw->SetAttribute("EwmaGain", DoubleValue(ewma_gain));
+	rdmaHw->SetAttribute("RateAI", DataRateValue(DataRate(rate_ai)));
+	rdmaHw->SetAttribute("RateHAI", DataRateValue(DataRate(rate_hai)));
+	rdmaHw->SetAttribute("L2BackToZero", BooleanValue(l2_back_to_zero));
+	rdmaHw->SetAttribute("L2ChunkSize", UintegerValue(l2_chunk_size));
+	rdmaHw->SetAttribute("L2AckInterval", UintegerValue(l2_ack_interval));
+	rdmaHw->SetAttribute("CcMode", UintegerValue(cc_mode));
+	rdmaHw->SetAttribute("RateDecreaseInterval", DoubleValue(rate_decrease_interval));
+	rdmaHw->SetAttribute("MinRate", DataRateValue(DataRate(min_rate)));
+	rdmaHw->SetAttribute("Mtu", UintegerValue(packet_payload_size));
+	rdmaHw->SetAttribute("MiThresh", UintegerValue(mi_thresh));
+	rdmaHw->SetAttribute("VarWin", BooleanValue(var_win));
+	rdmaHw->SetAttribute("FastReact", BooleanValue(fast_react));
+	rdmaHw->SetAttribute("MultiRate", BooleanValue(multi_rate));
+	rdmaHw->SetAttribute("SampleFeedback", BooleanValue(sample_feedback));
+	rdmaHw->SetAttribute("TargetUtil", DoubleValue(u_target));
+	rdmaHw->SetAttribute("RateBound", BooleanValue(rate_bound));
+	rdmaHw->SetAttribute("DctcpRateAI", DataRateValue(DataRate(dctcp_rate_ai)));
+	rdmaHw->SetPintSmplThresh(pint_prob);
+}
+
+/************************************************
+ * Fork: at fork_time, a child process is forked (with fork(), so it starts from a copy-on-write copy of the simulation)
+ * for each of fork_configs, and continues the simulation with the keys of its config: the outputs, which must all
+ * change and start with what was written before the fork, LINK_DOWN, and the parameters of RdmaHw. The parent goes on
+ * with its own config, and waits for the children at the end.
+ ***********************************************/
+uint64_t fork_time = 0;
+vector<string> fork_configs;
+map<pid_t, uint32_t> fork_children; // pid -> the index of its config
+int fork_failed = 0;
+EventId link_down_event;
+
+// an output file, which a continuation moves to its own name
+struct ForkOutput{
+	const char *key;
+	string *name;
+	FILE *file;
+	long size; // the bytes written before the fork
+};
+vector<ForkOutput> fork_outputs;
+
+void AddForkOutput(const char *key, string *name, FILE *file){
+	ForkOutput o = {key, name, file, 0};
+	fork_outputs.push_back(o);
+}
+
+// read the config of a continuation; returns false if it cannot be read, or has a key that cannot change after the fork
+bool ReadForkConfig(const string &fileName){
+	std::ifstream conf(fileName.c_str());
+	if (!conf.is_open()){
+		std::cout << "FORK: cannot open " << fileName << '\n';
+		return false;
+	}
+	std::string key;
+	while (conf >> key){
+		uint32_t v;
+		if (key.compare("FCT_OUTPUT_FILE") == 0){
+			conf >> fct_output_file;
+		}else if (key.compare("PFC_OUTPUT_FILE") == 0){
+			conf >> pfc_output_file;
+		}else if (key.compare("QLEN_MON_FILE") == 0){
+			conf >> qlen_mon_file;
+		}else if (key.compare("TRACE_OUTPUT_FILE") == 0){
+			conf >> trace_output_file;
+		}else if (key.compare("HEARTBEAT_FILE") == 0){
+			conf >> heartbeat_file;
+		}else if (key.compare("LINK_DOWN") == 0){
+			conf >> link_down_time >> link_down_A >> link_down_B;
+		}else if (key.compare("CLAMP_TARGET_RATE") == 0){
+			conf >> v;
+			clamp_target_rate = v;
+		}else if (key.compare("ALPHA_RESUME_INTERVAL") == 0){
+			conf >> alpha_resume_interval;
+		}else if (key.compare("RATE_DECREASE_INTERVAL") == 0){
+			conf >> rate_decrease_interval;
+		}else if (key.compare("RP_TIMER") == 0){
+			conf >> rp_timer;
+		}else if (key.compare("EWMA_GAIN") == 0){
+			conf >> ewma_gain;
+		}else if (key.compare("FAST_RECOVERY_TIMES") == 0){
+			conf >> fast_recovery_times;
+		}else if (key.compare("RATE_AI") == 0){
+			conf >> rate_ai;
+		}else if (key.compare("RATE_HAI") == 0){
+			conf >> rate_hai;
+		}else if (key.compare("MIN_RATE") == 0){
+			conf >> min_rate;
+		}else if (key.compare("DCTCP_RATE_AI") == 0){
+			conf >> dctcp_rate_ai;
+		}else if (key.compare("MI_THRESH") == 0){
+			conf >> mi_thresh;
+		}else if (key.compare("FAST_REACT") == 0){
+			conf >> v;
+			fast_react = v;
+		}else if (key.compare("MULTI_RATE") == 0){
+			conf >> v;
+			multi_rate = v;
+		}else if (key.compare("SAMPLE_FEEDBACK") == 0){
+			conf >> v;
+			sample_feedback = v;
+		}else if (key.compare("U_TARGET") == 0){
+			conf >> u_target;
+		}else if (key.compare("RATE_BOUND") == 0){
+			conf >> v;
+			rate_bound = v;
+		}else if (key.compare("PINT_PROB") == 0){
+			conf >> pint_prob;
+		}else{
+			std::cout << "FORK: " << key << " in " << fileName << " cannot change after the fork\n";
+			return false;
+		}
+	}
+	return true;
+}
+
+// move an output of a continuation from old_name to its own name, starting with the bytes written before the fork
+bool MoveForkOutput(ForkOutput &o, const string &old_name){
+	if (o.name->compare(old_name) == 0){
+		std::cout << "FORK: " << o.key << " must change in a continuation\n";
+		return false;
+	}
+	FILE* src = fopen(old_name.c_str(), "r");
+	if (src == NULL || freopen(o.name->c_str(), "w", o.file) == NULL){
+		std::cout << "FORK: cannot copy " << old_name << " to " << *o.name << '\n';
+		return false;
+	}
+	char buf[65536];
+	long left = o.size;
+	while (left > 0){
+		size_t k = fread(buf, 1, std::min(left, (long)sizeof(buf)), src);
+		if (k == 0)
+			break;
+		fwrite(buf, 1, k, o.file);
+		left -= k;
+	}
+	fclose(src);
+	return left == 0;
+}
+
+// in the child of a continuation: apply its config
+void StartContinuation(uint32_t idx, NodeContainer n, std::streampos flow_pos){
+	std::cout << "FORK " << idx << " (pid " << getpid() << "): " << fork_configs[idx] << '\n';
+	vector<string> old_names;
+	for (uint32_t i = 0; i < fork_outputs.size(); i++)
+		old_names.push_back(*fork_outputs[i].name);
+	uint64_t old_down_time = link_down_time;
+	uint32_t old_down_A = link_down_A, old_down_B = link_down_B;
+	bool ok = ReadForkConfig(fork_configs[idx]);
+	for (uint32_t i = 0; ok && i < fork_outputs.size(); i++)
+		ok = MoveForkOutput(fork_outputs[i], old_names[i]);
+	// a link down can only change if it is after the fork
+	if (ok && (link_down_time != old_down_time || link_down_A != old_down_A || link_down_B != old_down_B)){
+		if ((old_down_time > 0 && Seconds(2) + MicroSeconds(old_down_time) <= Simulator::Now()) || (link_down_time > 0 && Seconds(2) + MicroSeconds(link_down_time) <= Simulator::Now())){
+			std::cout << "FORK: LINK_DOWN cannot change at or before the fork\n";
+			ok = false;
+		}else{
+			link_down_event.Cancel();
+			if (link_down_time > 0)
+				link_down_event = Simulator::Schedule(Seconds(2) + MicroSeconds(link_down_time) - Simulator::Now(), &TakeDownLink, n, n.Get(link_down_A), n.Get(link_down_B));
+		}
+	}
+	if (!ok){
+		fflush(stdout);
+		_exit(1);
+	}
+	// the flow file is read through a file offset shared with the parent, so the continuation opens it again
+	if (flowf.is_open() && flow_pos != std::streampos(-1)){
+		flowf.close();
+		flowf.open(flow_file.c_str());
+		flowf.seekg(flow_pos);
+	}
+	for (uint32_t i = 0; i < n.GetN(); i++)
+		if (n.Get(i)->GetNodeType() == 0)
+			SetRdmaHwAttributes(n.Get(i)->GetObject<RdmaDriver>()->m_rdma);
+	// a heartbeat right away, with the pid of the continuation (the heartbeats before it are the parent's)
+	for (uint32_t i = 0; i < fork_outputs.size(); i++)
+		if (strcmp(fork_outputs[i].key, "HEARTBEAT_FILE") == 0)
+			write_heartbeat(fork_outputs[i].file, false);
+	fflush(stdout);
+}
+
+void ForkContinuations(NodeContainer n, TracePackWriter *trace_pack){
+	// write out what is buffered, so the outputs before the fork are in the files, once
+	if (trace_pack)
+		trace_pack->Flush();
+	fflush(NULL);
+	for (uint32_t i = 0; i < fork_outputs.size(); i++)
+		fork_outputs[i].size = ftell(fork_outputs[i].file);
+	std::streampos flow_pos = flowf.is_open() ? flowf.tellg() : std::streampos(-1);
+	for (uint32_t i = 0; i < fork_configs.size(); i++){
+		pid_t pid = fork();
+		if (pid == 0){
+			fork_children.clear();
+			fork_failed = 0; // a fork that failed before this one is the parent's
+			StartContinuation(i, n, flow_pos);
+			return;
+		}
+		if (pid < 0){
+			std::cout << "FORK " << i << ": fork failed: " << strerror(errno) << '\n';
+			fork_failed = 1;
+		}else
+			fork_children[pid] = i;
+	}
+}
+
 uint64_t get_nic_rate(NodeContainer &n){
 	for (uint32_t i = 0; i < n.GetN(); i++)
 		if (n.Get(i)->GetNodeType() == 0)
@@ -337,6 +691,7 @@ int main(int argc, char *argv[])
 {
 	clock_t begint, endt;
 	begint = clock();
+	clock_gettime(CLOCK_MONOTONIC, &wall_begin);
 #ifndef PGO_TRAINING
 	if (argc > 1)
 #else
@@ -586,6 +941,9 @@ int main(int argc, char *argv[])
 			}else if (key.compare("ENABLE_TRACE") == 0){
 				conf >> enable_trace;
 				std::cout << "ENABLE_TRACE\t\t\t\t" << enable_trace << '\n';
+			}else if (key.compare("TRACE_COMPRESS") == 0){
+				conf >> trace_compress;
+				std::cout << "TRACE_COMPRESS\t\t\t\t" << trace_compress << '\n';
 			}else if (key.compare("KMAX_MAP") == 0){
 				int n_k ;
 				conf >> n_k;
@@ -634,6 +992,25 @@ int main(int argc, char *argv[])
 			}else if (key.compare("QLEN_MON_END") == 0){
 				conf >> qlen_mon_end;
 				std::cout << "QLEN_MON_END\t\t\t\t" << qlen_mon_end << '\n';
+			}else if (key.compare("HEARTBEAT_FILE") == 0){
+				conf >> heartbeat_file;
+				std::cout << "HEARTBEAT_FILE\t\t\t\t" << heartbeat_file << '\n';
+			}else if (key.compare("HEARTBEAT_INTERVAL") == 0){
+				conf >> heartbeat_interval;
+				std::cout << "HEARTBEAT_INTERVAL\t\t\t" << heartbeat_interval << '\n';
+			}else if (key.compare("FORK_TIME") == 0){
+				conf >> fork_time;
+				std::cout << "FORK_TIME\t\t\t\t" << fork_time << '\n';
+			}else if (key.compare("FORK_CONFIGS") == 0){
+				uint32_t n_fork;
+				conf >> n_fork;
+				fork_configs.resize(n_fork);
+				std::cout << "FORK_CONFIGS\t\t\t\t" << n_fork;
+				for (uint32_t i = 0; i < n_fork; i++){
+					conf >> fork_configs[i];
+					std::cout << ' ' << fork_configs[i];
+				}
+				std::cout << '\n';
 			}else if (key.compare("MULTI_RATE") == 0){
 				int v;
 				conf >> v;
@@ -691,11 +1068,10 @@ int main(int argc, char *argv[])
 	//SeedManager::SetSeed(time(NULL));
 
 	topof.open(topology_file.c_str());
-	flowf.open(flow_file.c_str());
+	OpenFlowInput();
 	tracef.open(trace_file.c_str());
 	uint32_t node_num, switch_num, link_num, trace_num;
 	topof >> node_num >> switch_num >> link_num;
-	flowf >> flow_num;
 	tracef >> trace_num;
 
 
@@ -747,6 +1123,7 @@ int main(int argc, char *argv[])
 	rem->SetAttribute("ErrorUnit", StringValue("ERROR_UNIT_PACKET"));
 
 	FILE *pfc_file = fopen(pfc_output_file.c_str(), "w");
+	AddForkOutput("PFC_OUTPUT_FILE", &pfc_output_file, pfc_file);
 
 	QbbHelper qbb;
 	Ipv4AddressHelper ipv4;
@@ -851,6 +1228,7 @@ int main(int argc, char *argv[])
 
 	#if ENABLE_QP
 	FILE *fct_output = fopen(fct_output_file.c_str(), "w");
+	AddForkOutput("FCT_OUTPUT_FILE", &fct_output_file, fct_output);
 	//
 	// install RDMA driver
 	//
@@ -858,29 +1236,7 @@ int main(int argc, char *argv[])
 		if (n.Get(i)->GetNodeType() == 0){ // is server
 			// create RdmaHw
 			Ptr<RdmaHw> rdmaHw = CreateObject<RdmaHw>();
-			rdmaHw->SetAttribute("ClampTargetRate", BooleanValue(clamp_target_rate));
-			rdmaHw->SetAttribute("AlphaResumInterval", DoubleValue(alpha_resume_interval));
-			rdmaHw->SetAttribute("RPTimer", DoubleValue(rp_timer));
-			rdmaHw->SetAttribute("FastRecoveryTimes", UintegerValue(fast_recovery_times));
-			rdmaHw->SetAttribute("EwmaGain", DoubleValue(ewma_gain));
-			rdmaHw->SetAttribute("RateAI", DataRateValue(DataRate(rate_ai)));
-			rdmaHw->SetAttribute("RateHAI", DataRateValue(DataRate(rate_hai)));
-			rdmaHw->SetAttribute("L2BackToZero", BooleanValue(l2_back_to_zero));
-			rdmaHw->SetAttribute("L2ChunkSize", UintegerValue(l2_chunk_size));
-			rdmaHw->SetAttribute("L2AckInterval", UintegerValue(l2_ack_interval));
-			rdmaHw->SetAttribute("CcMode", UintegerValue(cc_mode));
-			rdmaHw->SetAttribute("RateDecreaseInterval", DoubleValue(rate_decrease_interval));
-			rdmaHw->SetAttribute("MinRate", DataRateValue(DataRate(min_rate)));
-			rdmaHw->SetAttribute("Mtu", UintegerValue(packet_payload_size));
-			rdmaHw->SetAttribute("MiThresh", UintegerValue(mi_thresh));
-			rdmaHw->SetAttribute("VarWin", BooleanValue(var_win));
-			rdmaHw->SetAttribute("FastReact", BooleanValue(fast_react));
-			rdmaHw->SetAttribute("MultiRate", BooleanValue(multi_rate));
-			rdmaHw->SetAttribute("SampleFeedback", BooleanValue(sample_feedback));
-			rdmaHw->SetAttribute("TargetUtil", DoubleValue(u_target));
-			rdmaHw->SetAttribute("RateBound", BooleanValue(rate_bound));
-			rdmaHw->SetAttribute("DctcpRateAI", DataRateValue(DataRate(dctcp_rate_ai)));
-			rdmaHw->SetPintSmplThresh(pint_prob);
+			SetRdmaHwAttributes(rdmaHw);
 			// create and install RdmaDriver
 			Ptr<RdmaDriver> rdma = CreateObject<RdmaDriver>();
 			Ptr<Node> node = n.Get(i);
@@ -956,6 +1312,13 @@ int main(int argc, char *argv[])
 	}
 
 	FILE *trace_output = fopen(trace_output_file.c_str(), "w");
+	AddForkOutput("TRACE_OUTPUT_FILE", &trace_output_file, trace_output);
+	// with TRACE_COMPRESS, the records are written in compressed blocks (see trace-pack.h)
+	TracePackWriter *trace_pack = NULL;
+	if (enable_trace && trace_compress){
+		trace_pack = new TracePackWriter(trace_output);
+		QbbHelper::SetTracePack(trace_pack);
+	}
 	if (enable_trace)
 		qbb.EnableTracing(trace_output, trace_nodes);
 
@@ -1000,13 +1363,27 @@ int main(int argc, char *argv[])
 
 	// schedule link down
 	if (link_down_time > 0){
-		Simulator::Schedule(Seconds(2) + MicroSeconds(link_down_time), &TakeDownLink, n, n.Get(link_down_A), n.Get(link_down_B));
+		link_down_event = Simulator::Schedule(Seconds(2) + MicroSeconds(link_down_time), &TakeDownLink, n, n.Get(link_down_A), n.Get(link_down_B));
 	}
 
 	// schedule buffer monitor
 	FILE* qlen_output = fopen(qlen_mon_file.c_str(), "w");
+	AddForkOutput("QLEN_MON_FILE", &qlen_mon_file, qlen_output);
 	Simulator::Schedule(NanoSeconds(qlen_mon_start), &monitor_buffer, qlen_output, &n);
 
+	// schedule heartbeats
+	FILE* heartbeat_output = NULL;
+	if (heartbeat_file.size() > 0 && heartbeat_interval > 0){
+		heartbeat_output = fopen(heartbeat_file.c_str(), "w");
+		AddForkOutput("HEARTBEAT_FILE", &heartbeat_file, heartbeat_output);
+		write_heartbeat(heartbeat_output, false);
+		Simulator::Schedule(Seconds(0), &heartbeat, heartbeat_output);
+	}
+
+	// schedule the fork of the continuations
+	if (fork_time > 0 && fork_configs.size() > 0)
+		Simulator::Schedule(NanoSeconds(fork_time), &ForkContinuations, n, trace_pack);
+
 	//
 	// Now, do the actual simulation.
 	//
@@ -1015,11 +1392,29 @@ int main(int argc, char *argv[])
 	NS_LOG_INFO("Run Simulation.");
 	Simulator::Stop(Seconds(simulator_stop_time));
 	Simulator::Run();
+	if (heartbeat_output){
+		write_heartbeat(heartbeat_output, true);
+		fclose(heartbeat_output);
+	}
 	Simulator::Destroy();
 	NS_LOG_INFO("Done.");
+	if (trace_pack){
+		trace_pack->Flush();
+		delete trace_pack;
+	}
 	fclose(trace_output);
 
+	// wait for the continuations
+	int ret = fork_failed;
+	for (map<pid_t, uint32_t>::iterator it = fork_children.begin(); it != fork_children.end(); it++){
+		int status;
+		if (waitpid(it->first, &status, 0) < 0 || !WIFEXITED(status) || WEXITSTATUS(status) != 0){
+			std::cout << "FORK " << it->second << " failed\n";
+			ret = 1;
+		}
+	}
+
 	endt = clock();
 	std::cout << (double)(endt - begint) / CLOCKS_PER_SEC << "\n";
-
+	return ret;
 }
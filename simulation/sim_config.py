@@ -0,0 +1,209 @@
+import json
+
+# The config of scratch/third.cc as a typed object, and the presets of the cc modes of run.py.
+# A SimConfig has a value for each key of FIELDS; render() writes them in the key/value format of third.cc (see
+# mix/config_doc.txt), in the order of FIELDS. A preset of CC_PRESETS gives the values of its cc for the parameters of a
+# run (the DEFAULTS of run.py), and the name of the cc in the outputs.
+
+RATE = "Mb/s" # the unit of the rates, which are ints in Mb/s
+
+# (key, type, default, format) of each key, in the order they are written; None is a blank line. A default of None is
+# set by make_config()
+FIELDS = [
+	("ENABLE_QCN", int, 1, "{}"),
+	("USE_DYNAMIC_PFC_THRESHOLD", int, 1, "{}"),
+	None,
+	("PACKET_PAYLOAD_SIZE", int, 1000, "{}"),
+	None,
+	("TOPOLOGY_FILE", str, None, "{}"),
+	("FLOW_FILE", str, None, "{}"),
+	("TRACE_FILE", str, "mix/trace.txt", "{}"),
+	("TRACE_OUTPUT_FILE", str, None, "{}"),
+	("FCT_OUTPUT_FILE", str, None, "{}"),
+	("PFC_OUTPUT_FILE", str, None, "{}"),
+	None,
+	("SIMULATOR_STOP_TIME", float, 4.0, "{:.2f}"),
+	None,
+	("CC_MODE", int, None, "{}"),
+	("ALPHA_RESUME_INTERVAL", int, 1, "{}"),
+	("RATE_DECREASE_INTERVAL", int, 4, "{}"),
+	("CLAMP_TARGET_RATE", int, 0, "{}"),
+	("RP_TIMER", int, 300, "{}"),
+	("EWMA_GAIN", float, 0.00390625, "{}"),
+	("FAST_RECOVERY_TIMES", int, 1, "{}"),
+	("RATE_AI", int, None, "{}" + RATE),
+	("RATE_HAI", int, None, "{}" + RATE),
+	("MIN_RATE", int, 1000, "{}" + RATE),
+	("DCTCP_RATE_AI", int, 1000, "{}" + RATE),
+	None,
+	("ERROR_RATE_PER_LINK", float, 0.0, "{:.4f}"),
+	("L2_CHUNK_SIZE", int, 4000, "{}"),
+	("L2_ACK_INTERVAL", int, 1, "{}"),
+	("L2_BACK_TO_ZERO", int, 0, "{}"),
+	None,
+	("HAS_WIN", int, 0, "{}"),
+	("GLOBAL_T", int, 1, "{}"),
+	("VAR_WIN", int, 0, "{}"),
+	("FAST_REACT", int, 0, "{}"),
+	("U_TARGET", float, 0.95, "{}"),
+	("MI_THRESH", int, 0, "{}"),
+	("INT_MULTI", int, 1, "{}"),
+	("MULTI_RATE", int, 0, "{}"),
+	("SAMPLE_FEEDBACK", int, 0, "{}"),
+	("PINT_LOG_BASE", float, 1.01, "{}"),
+	("PINT_PROB", float, 1.0, "{}"),
+	None,
+	("RATE_BOUND", int, 1, "{}"),
+	None,
+	("ACK_HIGH_PRIO", int, 0, "{}"),
+	None,
+	("LINK_DOWN", str, "0 0 0", "{}"),
+	None,
+	("ENABLE_TRACE", int, 0, "{}"),
+	None,
+	("KMAX_MAP", str, None, "{}"),
+	("KMIN_MAP", str, None, "{}"),
+	("PMAX_MAP", str, None, "{}"),
+	("BUFFER_SIZE", int, None, "{}"),
+	("QLEN_MON_FILE", str, None, "{}"),
+	("QLEN_MON_START", int, 2000000000, "{}"),
+	("QLEN_MON_END", int, 3000000000, "{}"),
+	None,
+	("HEARTBEAT_FILE", str, None, "{}"),
+	("HEARTBEAT_INTERVAL", float, 10.0, "{}"),
+]
+FIELD_TYPES = dict((f[0], f[1]) for f in FIELDS if f is not None)
+# the keys that a continuation forked from a run (FORK_CONFIGS of third.cc) can change: the outputs, the link down, and
+# the parameters of the cc at the hosts
+FORK_KEYS = ["FCT_OUTPUT_FILE", "PFC_OUTPUT_FILE", "QLEN_MON_FILE", "TRACE_OUTPUT_FILE", "HEARTBEAT_FILE", "LINK_DOWN",
+	"CLAMP_TARGET_RATE", "ALPHA_RESUME_INTERVAL", "RATE_DECREASE_INTERVAL", "RP_TIMER", "EWMA_GAIN", "FAST_RECOVERY_TIMES",
+	"RATE_AI", "RATE_HAI", "MIN_RATE", "DCTCP_RATE_AI", "MI_THRESH", "FAST_REACT", "MULTI_RATE", "SAMPLE_FEEDBACK",
+	"U_TARGET", "RATE_BOUND", "PINT_PROB"]
+
+# the value v of key, as the type of key; raises ValueError for an unknown key or a value of another type
+def check_value(key, v):
+	if key not in FIELD_TYPES:
+		raise ValueError("unknown config key: %s"%key)
+	t = FIELD_TYPES[key]
+	if t is str:
+		return str(v)
+	if isinstance(v, bool) or not isinstance(v, (int, float)) or t is int and int(v) != v:
+		raise ValueError("%s must be %s, not %r"%(key, "an int" if t is int else "a number", v))
+	return t(v)
+
+class SimConfig:
+	def __init__(self, **values):
+		self.values = dict((f[0], f[2]) for f in FIELDS if f is not None)
+		self.set(**values)
+
+	def set(self, **values):
+		for k, v in values.items():
+			self.values[k] = check_value(k, v)
+		return self
+
+	def __getitem__(self, key):
+		return self.values[key]
+
+	# the config file of third.cc; raises ValueError if a key has no value
+	def render(self):
+		missing = [k for k, v in self.values.items() if v is None]
+		if missing:
+			raise ValueError("no value for %s"%", ".join(sorted(missing)))
+		return "".join("\n" if f is None else ("{} " + f[3] + "\n").format(f[0], self.values[f[0]]) for f in FIELDS)
+
+	def to_dict(self):
+		return dict(self.values)
+
+# ECN marking: (kmin, kmax) in KB per 25Gbps, and pmax, on the links of bw and 4 * bw Gbps
+def ecn_maps(bw, kmin, kmax, pmax):
+	kmax_map = "2 %d %d %d %d"%(bw*1000000000, kmax*bw/25, bw*4*1000000000, kmax*bw*4/25)
+	kmin_map = "2 %d %d %d %d"%(bw*1000000000, kmin*bw/25, bw*4*1000000000, kmin*bw*4/25)
+	pmax_map = "2 %d %.2f %d %.2f"%(bw*1000000000, pmax, bw*4*1000000000, pmax)
+	return dict(KMAX_MAP = kmax_map, KMIN_MAP = kmin_map, PMAX_MAP = pmax_map)
+
+class CCPreset:
+	# values(p, bw): the config values of the cc for the run parameters p; label(p): the name of the cc (with its
+	# parameters) in the output names; params: the run parameters that only matter for this cc
+	def __init__(self, values, label, params = ()):
+		self.values = values
+		self.label = label
+		self.params = list(params)
+
+def dcqcn(paper, vwin):
+	def values(p, bw):
+		v = dict(CC_MODE = 1, RATE_AI = 5 * bw // 25, RATE_HAI = 50 * bw // 25, HAS_WIN = int(vwin), VAR_WIN = int(vwin), ACK_HIGH_PRIO = 0 if vwin else 1)
+		if paper:
+			v.update(ALPHA_RESUME_INTERVAL = 50, RATE_DECREASE_INTERVAL = 50, RP_TIMER = 55)
+		return v
+	return values
+
+def timely(vwin):
+	def values(p, bw):
+		return dict(CC_MODE = 7, RATE_AI = 10 * bw // 10, RATE_HAI = 50 * bw // 10, HAS_WIN = int(vwin), VAR_WIN = int(vwin), ACK_HIGH_PRIO = 1)
+	return values
+
+def dctcp(p, bw):
+	# DCTCP_RATE_AI is calculated from RTT=13us and MTU=1KB, because DCTCP add 1 MTU per RTT; RATE_AI is not used
+	v = dict(CC_MODE = 8, EWMA_GAIN = 0.0625, RATE_AI = 10, RATE_HAI = 10, DCTCP_RATE_AI = 615, HAS_WIN = 1, VAR_WIN = 1)
+	# kmin = kmax = 30KB per 10Gbps
+	v.update(ecn_maps(bw, 75, 75, 1.0))
+	return v
+
+def hpcc(mode):
+	def values(p, bw):
+		ai = p["hpai"] if p["hpai"] > 0 else 10 * bw // 25
+		# RATE_HAI is not used
+		return dict(CC_MODE = mode, RATE_AI = ai, RATE_HAI = ai, HAS_WIN = 1, VAR_WIN = 1, FAST_REACT = 1, INT_MULTI = bw // 25)
+	return values
+
+def hpcc_label(p):
+	label = "%s%d"%(p["cc"], p["utgt"])
+	if p["mi"] > 0:
+		label += "mi%d"%p["mi"]
+	if p["hpai"] > 0:
+		label += "ai%d"%p["hpai"]
+	if p["cc"] == "hpccPint":
+		label += "log%.3fp%.3f"%(p["pint_log_base"], p["pint_prob"])
+	return label
+
+# the cc of run.py; a new cc only needs a preset here
+CC_PRESETS = {
+	"dcqcn": CCPreset(dcqcn(False, False), lambda p: "dcqcn"),
+	"dcqcn_paper": CCPreset(dcqcn(True, False), lambda p: "dcqcn_paper"),
+	"dcqcn_vwin": CCPreset(dcqcn(False, True), lambda p: "dcqcn_vwin"),
+	"dcqcn_paper_vwin": CCPreset(dcqcn(True, True), lambda p: "dcqcn_paper_vwin"),
+	"hp": CCPreset(hpcc(3), hpcc_label, ["utgt", "mi", "hpai"]),
+	"hpccPint": CCPreset(hpcc(10), hpcc_label, ["utgt", "mi", "hpai", "pint_log_base", "pint_prob"]),
+	"dctcp": CCPreset(dctcp, lambda p: "dctcp"),
+	"timely": CCPreset(timely(False), lambda p: "timely"),
+	"timely_vwin": CCPreset(timely(True), lambda p: "timely_vwin"),
+}
+# the run parameters of some cc, which the others do not use
+CC_PARAMS = sorted(set(k for c in CC_PRESETS.values() for k in c.params))
+
+# the name of the cc in the outputs (e.g., hp95ai50) and the SimConfig of a run with the parameters p
+# raises ValueError for an unknown cc
+def make_config(p):
+	if p["cc"] not in CC_PRESETS:
+		raise ValueError("unknown cc: %s"%p["cc"])
+	preset = CC_PRESETS[p["cc"]]
+	bw = int(p["bw"])
+	label = preset.label(p)
+	failure = "_down" if p["down"] != "0 0 0" else ""
+	name = "%s_%s_%s%s"%(p["topo"], p["trace"], label, failure)
+	config = SimConfig(TOPOLOGY_FILE = "mix/%s.txt"%p["topo"], FLOW_FILE = "mix/%s.txt"%p["trace"],
+		TRACE_OUTPUT_FILE = "mix/mix_%s.tr"%name, FCT_OUTPUT_FILE = "mix/fct_%s.txt"%name, PFC_OUTPUT_FILE = "mix/pfc_%s.txt"%name,
+		QLEN_MON_FILE = "mix/qlen_%s.txt"%name, HEARTBEAT_FILE = "mix/heartbeat_%s.txt"%name, U_TARGET = p["utgt"] / 100., MI_THRESH = p["mi"],
+		PINT_LOG_BASE = p["pint_log_base"], PINT_PROB = p["pint_prob"], LINK_DOWN = p["down"], ENABLE_TRACE = p["enable_tr"],
+		BUFFER_SIZE = 16 * bw // 50, **ecn_maps(bw, 100, 400, 0.2))
+	config.set(**preset.values(p, bw))
+	return label, config
+
+# the metadata of a run, written as json next to its config: its parameters, the cc name, the config values and outputs
+def run_meta(p, label, config):
+	return {"params": p, "cc": label, "config": config.to_dict(),
+		"outputs": dict((k, config[k]) for k in ("FCT_OUTPUT_FILE", "PFC_OUTPUT_FILE", "QLEN_MON_FILE", "TRACE_OUTPUT_FILE", "HEARTBEAT_FILE"))}
+
+def write_meta(fileName, meta):
+	with open(fileName, "w") as f:
+		json.dump(meta, f, indent = 1, sort_keys = True)
@@ -61,6 +61,7 @@ DefaultSimulatorImpl::DefaultSimulatorImpl ()
   m_uid = 4;
   // before ::Run is entered, the m_currentUid will be zero
   m_currentUid = 0;
+  m_eventCount = 0;
   m_currentTs = 0;
   m_currentContext = 0xffffffff;
   m_unscheduledEvents = 0;
@@ -139,6 +140,7 @@ DefaultSimulatorImpl::ProcessOneEvent (void)
   m_currentTs = next.key.m_ts;
   m_currentContext = next.key.m_context;
   m_currentUid = next.key.m_uid;
+  m_eventCount++;
   next.impl->Invoke ();
   next.impl->Unref ();
 
@@ -417,6 +419,12 @@ DefaultSimulatorImpl::IsExpired (const EventId &ev) const
     }
 }
 
+uint64_t
+DefaultSimulatorImpl::GetEventCount (void) const
+{
+  return m_eventCount;
+}
+
 Time 
 DefaultSimulatorImpl::GetMaximumSimulationTime (void) const
 {
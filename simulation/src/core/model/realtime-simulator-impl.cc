@@ -80,6 +80,7 @@ RealtimeSimulatorImpl::RealtimeSimulatorImpl ()
   m_uid = 4; 
   // before ::Run is entered, the m_currentUid will be zero
   m_currentUid = 0;
+  m_eventCount = 0;
   m_currentTs = 0;
   m_currentContext = 0xffffffff;
   m_unscheduledEvents = 0;
@@ -342,6 +343,7 @@ RealtimeSimulatorImpl::ProcessOneEvent (void)
     m_currentTs = next.key.m_ts;
     m_currentContext = next.key.m_context;
     m_currentUid = next.key.m_uid;
+    m_eventCount++;
 
     // 
     // We're about to run the event and we've done our best to synchronize this
@@ -792,6 +794,12 @@ RealtimeSimulatorImpl::IsExpired (const EventId &ev) const
     }
 }
 
+uint64_t
+RealtimeSimulatorImpl::GetEventCount (void) const
+{
+  return m_eventCount;
+}
+
 Time 
 RealtimeSimulatorImpl::GetMaximumSimulationTime (void) const
 {
@@ -165,6 +165,11 @@ public:
    * The returned value will always be bigger than or equal to Simulator::Now.
    */
   virtual Time GetMaximumSimulationTime (void) const = 0;
+  /**
+   * \return the number of events processed since the start of the
+   *          simulation.
+   */
+  virtual uint64_t GetEventCount (void) const = 0;
   /**
    * \param schedulerFactory a new event scheduler factory
    *
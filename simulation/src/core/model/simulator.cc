@@ -296,6 +296,12 @@ Simulator::GetMaximumSimulationTime (void)
   return GetImpl ()->GetMaximumSimulationTime ();
 }
 
+uint64_t
+Simulator::GetEventCount (void)
+{
+  return GetImpl ()->GetEventCount ();
+}
+
 uint32_t
 Simulator::GetContext (void)
 {
@@ -743,6 +743,15 @@ public:
    */
   static Time GetMaximumSimulationTime (void);
 
+  /**
+   * \returns the number of events processed since the start of the
+   *          simulation.
+   *
+   * This is meant for progress reports: the events per second of
+   * wall clock time tell how fast a simulation runs.
+   */
+  static uint64_t GetEventCount (void);
+
   /**
    * \returns the current simulation context
    */
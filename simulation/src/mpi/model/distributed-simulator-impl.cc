@@ -101,6 +101,7 @@ DistributedSimulatorImpl::DistributedSimulatorImpl ()
   m_uid = 4;
   // before ::Run is entered, the m_currentUid will be zero
   m_currentUid = 0;
+  m_eventCount = 0;
   m_currentTs = 0;
   m_currentContext = 0xffffffff;
   m_unscheduledEvents = 0;
@@ -243,6 +244,7 @@ DistributedSimulatorImpl::ProcessOneEvent (void)
   m_currentTs = next.key.m_ts;
   m_currentContext = next.key.m_context;
   m_currentUid = next.key.m_uid;
+  m_eventCount++;
   next.impl->Invoke ();
   next.impl->Unref ();
 }
@@ -496,6 +498,12 @@ DistributedSimulatorImpl::IsExpired (const EventId &ev) const
     }
 }
 
+uint64_t
+DistributedSimulatorImpl::GetEventCount (void) const
+{
+  return m_eventCount;
+}
+
 Time
 DistributedSimulatorImpl::GetMaximumSimulationTime (void) const
 {
@@ -112,6 +112,7 @@ public:
   virtual Time Now (void) const;
   virtual Time GetDelayLeft (const EventId &id) const;
   virtual Time GetMaximumSimulationTime (void) const;
+  virtual uint64_t GetEventCount (void) const;
   virtual void SetScheduler (ObjectFactory schedulerFactory);
   virtual uint32_t GetSystemId (void) const;
   virtual uint32_t GetContext (void) const;
@@ -130,6 +131,7 @@ private:
   Ptr<Scheduler> m_events;
   uint32_t m_uid;
   uint32_t m_currentUid;
+  uint64_t m_eventCount;
   uint64_t m_currentTs;
   uint32_t m_currentContext;
   // number of events that have been inserted but not yet scheduled,
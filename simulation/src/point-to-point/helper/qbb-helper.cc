@@ -45,6 +45,8 @@ NS_LOG_COMPONENT_DEFINE ("QbbHelper");
 
 namespace ns3 {
 
+TracePackWriter *QbbHelper::m_tracePack = NULL;
+
 QbbHelper::QbbHelper ()
 {
   m_queueFactory.SetTypeId ("ns3::DropTailQueue");
@@ -369,7 +371,10 @@ void QbbHelper::GetTraceFromPacket(TraceFormat &tr, Ptr<QbbNetDevice> dev, Ptr<c
 void QbbHelper::PacketEventCallback(FILE *file, Ptr<QbbNetDevice> dev, Ptr<const Packet> p, uint32_t qidx, Event event, bool hasL2){
 	TraceFormat tr;
 	GetTraceFromPacket(tr, dev, p, qidx, event, hasL2);
-	tr.Serialize(file);
+	if (m_tracePack)
+		m_tracePack->Write(tr);
+	else
+		tr.Serialize(file);
 }
 
 void QbbHelper::MacRxDetailCallback (FILE* file, Ptr<QbbNetDevice> dev, Ptr<const Packet> p){
@@ -391,7 +396,10 @@ void QbbHelper::DropDetailCallback(FILE* file, Ptr<QbbNetDevice> dev, Ptr<const
 void QbbHelper::QpDequeueCallback(FILE *file, Ptr<QbbNetDevice> dev, Ptr<const Packet> p, Ptr<RdmaQueuePair> qp){
 	TraceFormat tr;
 	GetTraceFromPacket(tr, dev, p, qp->m_pg, Dequ, true);
-	tr.Serialize(file);
+	if (m_tracePack)
+		m_tracePack->Write(tr);
+	else
+		tr.Serialize(file);
 }
 
 void QbbHelper::EnableTracingDevice(FILE *file, Ptr<QbbNetDevice> nd){
@@ -430,6 +438,10 @@ void QbbHelper::EnableTracingDevice(FILE *file, Ptr<QbbNetDevice> nd){
 	//Config::ConnectWithoutContext (oss.str (), MakeBoundCallback (&QbbHelper::DequeueDetailCallback, file, nd));
 }
 
+void QbbHelper::SetTracePack(TracePackWriter *pack){
+	m_tracePack = pack;
+}
+
 void QbbHelper::EnableTracing(FILE *file, NodeContainer node_container){
   NetDeviceContainer devs;
   for (NodeContainer::Iterator i = node_container.Begin (); i != node_container.End (); ++i)
@@ -28,6 +28,7 @@
 #include "ns3/deprecated.h"
 #include "ns3/trace-helper.h"
 #include "ns3/trace-format.h"
+#include "ns3/trace-pack.h"
 #include "ns3/qbb-net-device.h"
 
 namespace ns3 {
@@ -159,6 +160,9 @@ public:
 
   void EnableTracing(FILE *file, NodeContainer node_container);
 
+  // when set, the trace records are written to the packed trace instead of the file given to EnableTracing
+  static void SetTracePack(TracePackWriter *pack);
+
 private:
   /**
    * \brief Enable pcap output the indicated net device.
@@ -195,6 +199,7 @@ private:
   ObjectFactory m_channelFactory;
   ObjectFactory m_remoteChannelFactory;
   ObjectFactory m_deviceFactory;
+  static TracePackWriter *m_tracePack;
 };
 
 } // namespace ns3
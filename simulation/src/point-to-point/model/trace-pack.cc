@@ -0,0 +1,59 @@
+#include "trace-pack.h"
+#ifdef HAVE_ZLIB
+#include <zlib.h>
+#endif
+
+namespace ns3{
+
+TracePackWriter::TracePackWriter(FILE *file, uint32_t block) : m_file(file), m_block(block){
+	uint32_t version = TRACE_PACK_VERSION;
+	fwrite(TRACE_PACK_MAGIC, 1, 8, m_file);
+	fwrite(&version, sizeof(version), 1, m_file);
+	fwrite(&m_block, sizeof(m_block), 1, m_file);
+	m_buf.reserve(m_block);
+}
+
+void TracePackWriter::Write(TraceFormat &tr){
+	m_buf.push_back(tr);
+	if (m_buf.size() >= m_block)
+		Flush();
+}
+
+void TracePackWriter::Flush(){
+	uint32_t n = m_buf.size();
+	if (n == 0)
+		return;
+	uint64_t first = m_buf[0].time, last = m_buf[n - 1].time;
+	// delta-encode time
+	for (uint32_t i = n - 1; i > 0; i--)
+		m_buf[i].time -= m_buf[i - 1].time;
+	m_buf[0].time = 0;
+	// byte k of record i goes to m_col[k * n + i]
+	m_col.resize(n * sizeof(TraceFormat));
+	const uint8_t *p = (const uint8_t*)&m_buf[0];
+	for (uint32_t k = 0; k < sizeof(TraceFormat); k++)
+		for (uint32_t i = 0; i < n; i++)
+			m_col[k * n + i] = p[i * sizeof(TraceFormat) + k];
+
+	uint32_t codec = RAW, size = m_col.size();
+	const uint8_t *payload = &m_col[0];
+	#ifdef HAVE_ZLIB
+	// the fastest level: the columns are very redundant, so it already compresses well, and the simulation waits for it
+	uLongf len = compressBound(size);
+	m_out.resize(len);
+	if (compress2(&m_out[0], &len, &m_col[0], size, 1) == Z_OK && len < size){
+		codec = ZLIB;
+		size = len;
+		payload = &m_out[0];
+	}
+	#endif
+	fwrite(&n, sizeof(n), 1, m_file);
+	fwrite(&codec, sizeof(codec), 1, m_file);
+	fwrite(&size, sizeof(size), 1, m_file);
+	fwrite(&first, sizeof(first), 1, m_file);
+	fwrite(&last, sizeof(last), 1, m_file);
+	fwrite(payload, 1, size, m_file);
+	m_buf.clear();
+}
+
+}
@@ -0,0 +1,47 @@
+#ifndef TRACE_PACK_H
+#define TRACE_PACK_H
+
+#include <stdint.h>
+#include <cstdio>
+#include <vector>
+#include "trace-format.h"
+
+namespace ns3{
+
+/*
+ * A packed trace holds the same records as a .tr file, in compressed blocks.
+ * It is written when TRACE_COMPRESS is 1, and read by analysis/trace_reader and analysis/trace_pack.py.
+ *
+ * file: "HPCCTRPK", uint32 version, uint32 records per block, the SimSetting (as in a .tr file), then the blocks
+ * block: uint32 number of records n, uint32 codec, uint32 size of the payload, uint64 time of the first record,
+ *        uint64 time of the last record, then the payload
+ * payload: the n TraceFormat with time replaced by its difference to the previous record (0 for the first), stored
+ *          byte by byte in columns: byte 0 of the n records, then byte 1, ... so each field is a column and the bytes
+ *          that barely change become long runs. The payload is stored as is (codec 0) or compressed by zlib (codec 1).
+ */
+#define TRACE_PACK_MAGIC "HPCCTRPK"
+#define TRACE_PACK_VERSION 1
+
+class TracePackWriter{
+public:
+	enum Codec{
+		RAW = 0,
+		ZLIB = 1
+	};
+
+	// writes the file header, so it must be created before the SimSetting is written
+	TracePackWriter(FILE *file, uint32_t block = 65536);
+	void Write(TraceFormat &tr);
+	// write the records of the current block, if any; must be called before the file is closed
+	void Flush();
+
+private:
+	FILE *m_file;
+	uint32_t m_block;
+	std::vector<TraceFormat> m_buf;
+	std::vector<uint8_t> m_col, m_out;
+};
+
+}
+
+#endif /* TRACE_PACK_H */
@@ -210,6 +210,12 @@ VisualSimulatorImpl::GetMaximumSimulationTime (void) const
   return m_simulator->GetMaximumSimulationTime ();
 }
 
+uint64_t
+VisualSimulatorImpl::GetEventCount (void) const
+{
+  return m_simulator->GetEventCount ();
+}
+
 uint32_t
 VisualSimulatorImpl::GetContext (void) const
 {
@@ -0,0 +1,455 @@
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+from run import DEFAULTS, gen_config, meta_name
+from sim_config import CC_PRESETS, CC_PARAMS, FORK_KEYS, write_meta
+from result_cache import RUNTIME, ResultCache, build_id, parse_config, run_key
+from heartbeat import Monitor, format_time
+
+# Parameter sweeps over run.py: a grid of parameters is expanded into the configs of run.py, and the configs are run by
+# the built third binary directly (not through waf), in a pool of processes bounded by the cores and the memory.
+# The state of each point (by its config file) is kept in a json file, so a point already done with the same config is
+# skipped when the sweep is run again. With a result cache (result_cache.py), the runs write to the cache, and a point
+# whose run is already in the cache is not run again but gets the outputs of the cache.
+# The heartbeats of the runs (heartbeat.py) give their progress and ETA, printed every `progress` seconds, and a run that
+# stalls is killed (its status is then "stalled").
+# With a fork time, the points that only differ after it (in LINK_DOWN after it, or the parameters of the cc at the hosts)
+# share the simulation before it: one process runs the first of them, and forks the others from it at that time (see
+# FORK_TIME in mix/config_doc.txt).
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# the values of a parameter from a string of comma-separated values, with the type of its default
+def parse_values(key, s):
+	if key not in DEFAULTS:
+		raise ValueError("unknown parameter: %s"%key)
+	return [type(DEFAULTS[key])(v) for v in s.split(",")]
+
+# the parameters of a point, without the parameters of other cc (e.g. utgt for dcqcn), which are in the config but not
+# in the output names
+def used_params(p):
+	preset = CC_PRESETS.get(p.get("cc", DEFAULTS["cc"]))
+	used = preset.params if preset is not None else CC_PARAMS
+	return dict((k, v) for k, v in p.items() if k not in CC_PARAMS or k in used)
+
+# the list of (parameters, config name, config, metadata) of the points of a grid {parameter: list of values}, in the order of the grid
+# the parameters a cc does not use are left out, and the same config is only kept once; two different configs
+# with the same name (their outputs would overwrite each other, e.g. with two bw) raise ValueError
+def expand(grid):
+	keys = sorted(grid)
+	points, seen = [], {}
+	for values in itertools.product(*[grid[k] if isinstance(grid[k], list) else [grid[k]] for k in keys]):
+		p = used_params(dict(zip(keys, values)))
+		config_name, config, meta = gen_config(**p)
+		if config_name in seen:
+			if seen[config_name][1] != config:
+				raise ValueError("%s and %s have the same outputs (%s), please run them in separate sweeps"%(seen[config_name][0], p, config_name))
+			continue
+		seen[config_name] = (p, config)
+		points.append((p, config_name, config, meta))
+	return points
+
+# bytes of memory available, or None if unknown
+def mem_available():
+	try:
+		with open("/proc/meminfo") as f:
+			for line in f:
+				if line.startswith("MemAvailable:"):
+					return int(line.split()[1]) * 1024
+	except IOError:
+		pass
+	return None
+
+# the number of runs at the same time: one per core, and no more than fit in the memory with mem bytes per run
+def worker_count(mem):
+	n = multiprocessing.cpu_count()
+	avail = mem_available()
+	if mem > 0 and avail is not None:
+		n = min(n, max(1, int(avail // mem)))
+	return n
+
+def config_hash(config):
+	return hashlib.sha1(config.encode("utf-8")).hexdigest()
+
+# the ns of simulated time of the link down of a LINK_DOWN value (in us after 2s, as in third.cc), 0 without one
+def link_down_ns(v):
+	t = int(v.split()[0])
+	return 2000000000 + t * 1000 if t > 0 else 0
+
+# the part of a config that a fork at fork_at (ns) shares: the config without the keys that a continuation can change
+# after it, but with a link down before it
+def fork_prefix(config, fork_at):
+	items = []
+	for k, v in parse_config(config):
+		if k == "LINK_DOWN" and 0 < link_down_ns(v) <= fork_at or k not in FORK_KEYS and k not in RUNTIME:
+			items.append((k, v))
+	return json.dumps(items)
+
+# the continuations of a run share its process and its return code, so whether each one is done is only known from its
+# final heartbeat; raises ValueError if a point has no heartbeats
+def check_heartbeats(points):
+	for p, name, config, meta in points:
+		values = dict(parse_config(config))
+		if not values.get("HEARTBEAT_FILE") or float(values.get("HEARTBEAT_INTERVAL", 10)) <= 0:
+			raise ValueError("%s has no heartbeats (HEARTBEAT_FILE, HEARTBEAT_INTERVAL), which a fork needs to tell if each continuation is done"%name)
+
+# the key of a continuation with the key key, forked at fork_at from the run with the key base
+def fork_key(base, key, fork_at):
+	return hashlib.sha1(json.dumps({"base": base, "key": key, "fork_at": fork_at}, sort_keys = True).encode("utf-8")).hexdigest()
+
+def load_state(fileName):
+	if not os.path.exists(fileName):
+		return {}
+	with open(fileName) as f:
+		return json.load(f)
+
+def save_state(fileName, state):
+	tmp = "%s.%d"%(fileName, os.getpid())
+	with open(tmp, "w") as f:
+		json.dump(state, f, indent = 1, sort_keys = True)
+	os.rename(tmp, fileName)
+
+class RunPoint:
+	# a point of a run: its config and metadata, its key, its temporary folder in the cache and the monitor of its heartbeats
+	def __init__(self, name, config, meta, key, tmp, mon):
+		self.name = name
+		self.config = config
+		self.meta = meta
+		self.key = key
+		self.tmp = tmp
+		self.mon = mon
+
+class Run:
+	# a process of third, with its points: the point it runs, and the continuations forked from it, if any
+	def __init__(self):
+		self.points = []
+		self.forks = [] # the configs of the continuations
+		self.proc = None
+		self.begin = None
+		self.stalled = {} # config name -> why, of the points that stalled
+		self.killed = None # (config name, why) of the point that stalled, if the whole run was killed
+
+	# kill the process, with its continuations
+	def kill(self):
+		try:
+			os.killpg(self.proc.pid, signal.SIGKILL)
+		except OSError:
+			pass
+		self.proc.wait()
+
+	# a point stalled: a continuation is killed alone (by the pid of its heartbeats, once it has its own), the others go on;
+	# otherwise the whole run is killed. Returns True if the run was killed
+	def stall(self, pt, why):
+		self.stalled[pt.name] = why
+		pid = pt.mon.last.get("pid") if pt is not self.points[0] else None
+		if pid is not None and pid != self.proc.pid:
+			try:
+				os.kill(pid, signal.SIGKILL)
+			except OSError:
+				pass
+			return False
+		self.killed = (pt.name, why)
+		self.kill()
+		return True
+
+class Sweep:
+	def __init__(self, binary, lib, state_file, n_worker, force = False, cache_dir = None, stall_time = 600, collapse = 0.01, progress = 60, fork_at = 0):
+		self.binary = os.path.abspath(binary)
+		self.lib = os.path.abspath(lib)
+		self.env = dict(os.environ)
+		self.env["LD_LIBRARY_PATH"] = os.pathsep.join([self.lib] + ([self.env["LD_LIBRARY_PATH"]] if self.env.get("LD_LIBRARY_PATH") else []))
+		self.state_file = state_file
+		self.state = load_state(state_file)
+		self.n_worker = n_worker
+		self.force = force
+		self.cache = ResultCache(cache_dir) if cache_dir else None
+		self.build = None
+		self.stall_time = stall_time
+		self.collapse = collapse
+		self.progress = progress
+		self.fork_at = fork_at
+
+	# the key of a config: its run key with a cache (so the state follows the build too), else its hash
+	def key(self, config):
+		if self.cache is None:
+			return config_hash(config)
+		if self.build is None:
+			self.build = build_id(self.binary, self.lib)
+		return run_key(config, SIM_DIR, self.build)
+
+	def is_done(self, config_name, key):
+		s = self.state.get(config_name)
+		return not self.force and s is not None and s["status"] == "done" and s["hash"] == key
+
+	def is_cached(self, key):
+		return not self.force and self.cache is not None and self.cache.lookup(key) is not None
+
+	# write the config of a point and its metadata (next to it, as run.py does)
+	def write_config(self, config_name, config, meta):
+		with open(os.path.join(SIM_DIR, config_name), "w") as f:
+			f.write(config)
+		write_meta(os.path.join(SIM_DIR, meta_name(config_name)), meta)
+
+	# the monitor of the heartbeats in fileName (relative to SIM_DIR), or None without HEARTBEAT_FILE
+	def monitor(self, fileName):
+		if not fileName:
+			return None
+		fileName = os.path.join(SIM_DIR, fileName)
+		# the heartbeats of an earlier run must not be taken for those of this one
+		if os.path.exists(fileName):
+			os.remove(fileName)
+		return Monitor(fileName, self.stall_time, self.collapse)
+
+	# the keys of the points, and the groups of points (their indexes) that run in one process. With a fork (fork_at),
+	# the points whose configs only differ after the fork run as the first one (the base) and its continuations, forked
+	# from it at fork_at; the key of a continuation then also has the base and fork_at, since its results are not those
+	# of a run from the start. Raises ValueError for a fork of points without heartbeats (check_heartbeats)
+	def plan(self, points):
+		if self.fork_at:
+			check_heartbeats(points)
+		keys = [self.key(config) for p, name, config, meta in points]
+		if not self.fork_at:
+			return keys, [[i] for i in range(len(points))]
+		groups = []
+		index = {} # prefix -> the index of its group
+		for i, (p, name, config, meta) in enumerate(points):
+			prefix = fork_prefix(config, self.fork_at)
+			if prefix in index:
+				g = groups[index[prefix]]
+				keys[i] = fork_key(keys[g[0]], keys[i], self.fork_at)
+				g.append(i)
+			else:
+				index[prefix] = len(groups)
+				groups.append([i])
+		return keys, groups
+
+	# start a run of (config_name, config, metadata, key) points: the first one, and the others as its continuations
+	def start(self, points):
+		run = Run()
+		for name, config, meta, key in points:
+			tmp, run_config = None, name
+			if self.cache is not None:
+				tmp, run_config = self.cache.prepare(key, config)
+			with open(os.path.join(SIM_DIR, run_config)) as f:
+				values = dict(parse_config(f.read()))
+			run.points.append(RunPoint(name, config, meta, key, tmp, self.monitor(values.get("HEARTBEAT_FILE"))))
+			if len(run.points) == 1:
+				base_config = run_config
+				continue
+			# a continuation only has the keys that change after the fork
+			fork_config = os.path.join(tmp, "fork_config.txt") if tmp is not None else name.replace("config_", "fork_", 1)
+			with open(os.path.join(SIM_DIR, fork_config), "w") as f:
+				f.write("".join("%s %s\n"%(k, values[k]) for k in FORK_KEYS if k in values))
+			run.forks.append(fork_config)
+		if run.forks:
+			with open(os.path.join(SIM_DIR, base_config)) as f:
+				config = f.read()
+			if self.cache is None:
+				base_config = points[0][0].replace("config_", "fork_", 1)
+			with open(os.path.join(SIM_DIR, base_config), "w") as f:
+				f.write(config + "\nFORK_TIME %d\nFORK_CONFIGS %d %s\n"%(self.fork_at, len(run.forks), " ".join(run.forks)))
+		log_name = points[0][0].replace("config_", "log_", 1)
+		log = open(os.path.join(SIM_DIR, log_name), "w")
+		# in a process group of its own, with the continuations, to kill them together
+		run.proc = subprocess.Popen([self.binary, base_config], cwd = SIM_DIR, env = self.env, stdout = log, stderr = subprocess.STDOUT, preexec_fn = os.setsid)
+		log.close()
+		run.begin = time.time()
+		for i, pt in enumerate(run.points):
+			self.state[pt.name] = {"status": "running", "hash": pt.key, "log": log_name}
+			if i > 0:
+				self.state[pt.name]["fork"] = {"base": run.points[0].name, "time": self.fork_at}
+		return run
+
+	# followers: key -> the (config_name, config) of the other points with the same run as key, which get the same outputs
+	def finish(self, run, followers):
+		elapsed = round(time.time() - run.begin, 1)
+		for pt in run.points:
+			s = self.state[pt.name]
+			if pt.mon is not None:
+				pt.mon.poll()
+			# the continuations of a run have the same process, so a point is done if it got to its final heartbeat
+			if pt.name in run.stalled:
+				done = False
+			elif len(run.points) > 1:
+				done = pt.mon.last is not None and pt.mon.last["final"] == 1
+			else:
+				done = run.killed is None and run.proc.returncode == 0
+			s["status"] = "done" if done else "stalled" if pt.name in run.stalled or run.killed else "failed"
+			s["returncode"] = run.proc.returncode
+			s["elapsed"] = elapsed
+			if pt.name in run.stalled:
+				s["reason"] = run.stalled[pt.name]
+			elif run.killed and not done:
+				s["reason"] = "%s stalled: %s"%run.killed
+			if pt.mon is not None:
+				s.pop("progress", None)
+				if pt.mon.last is not None:
+					s["heartbeat"] = pt.mon.last
+			if pt.tmp is not None:
+				if done:
+					meta = dict(pt.meta, config_name = pt.name, build = self.build, elapsed = elapsed)
+					if "fork" in s:
+						meta["fork"] = dict(s["fork"], base_key = run.points[0].key)
+					self.cache.commit(pt.key, pt.tmp, meta)
+					self.cache.publish(pt.key, pt.config, SIM_DIR)
+				else:
+					self.cache.discard(pt.tmp)
+			for name, c in followers.get(pt.key, []):
+				if done:
+					self.cache.publish(pt.key, c, SIM_DIR)
+				self.state[name] = {"status": s["status"], "hash": pt.key, "cached": True}
+			sys.stderr.write("%s %s (%.0fs)%s\n"%(s["status"], " ".join([pt.name] + [name for name, c in followers.get(pt.key, [])]), elapsed, ": " + s["reason"] if "reason" in s and not done else ""))
+		save_state(self.state_file, self.state)
+
+	# print the progress of the running points and the ETA of the sweep (from the mean time of the runs done so far for
+	# the runs to start), and keep the last heartbeat of each point in its state
+	def show_progress(self, running, n_todo, elapsed):
+		etas = []
+		for run in running:
+			for pt in run.points:
+				if pt.name in run.stalled:
+					sys.stderr.write("  %s: stalled, killed: %s\n"%(pt.name, run.stalled[pt.name]))
+					continue
+				if pt.mon is None:
+					sys.stderr.write("  %s: running for %s\n"%(pt.name, format_time(time.time() - run.begin)))
+					etas.append(None)
+					continue
+				sys.stderr.write("  %s: %s\n"%(pt.name, pt.mon.status()))
+				etas.append(pt.mon.eta())
+				if pt.mon.last is not None:
+					self.state[pt.name]["progress"] = pt.mon.last
+		save_state(self.state_file, self.state)
+		eta = None
+		if elapsed and None not in etas:
+			eta = (sum(etas) + n_todo * sum(elapsed) / len(elapsed)) / self.n_worker
+		sys.stderr.write("%d running, %d to start, ETA %s\n"%(len(etas), n_todo, "?" if eta is None else format_time(eta)))
+
+	# run the points not done yet; returns the number of points that failed or stalled
+	def run(self, points):
+		keys, groups = self.plan(points)
+		todo, n_cached = [], 0 # todo: the points of each run to start
+		followers = {} # key -> the points of the run of key after the first one, with a cache
+		for g in groups:
+			run = []
+			for i in g:
+				p, name, config, meta = points[i]
+				if self.is_done(name, keys[i]):
+					continue
+				self.write_config(name, config, meta)
+				if self.is_cached(keys[i]):
+					self.cache.publish(keys[i], config, SIM_DIR)
+					self.state[name] = {"status": "done", "hash": keys[i], "cached": True}
+					n_cached += 1
+				elif keys[i] in followers:
+					followers[keys[i]].append((name, config))
+					n_cached += 1
+				else:
+					if self.cache is not None:
+						followers[keys[i]] = []
+					run.append(i)
+			# the continuations need their base, which runs again if it was done
+			if run and run[0] != g[0]:
+				self.write_config(*points[g[0]][1:])
+				run.insert(0, g[0])
+			if run:
+				todo.append([points[i][1:] + (keys[i],) for i in run])
+		save_state(self.state_file, self.state)
+		n_run = sum(len(r) for r in todo)
+		sys.stderr.write("%d points, %d done, %d from the cache, %d to run in %d processes with %d workers\n"%(len(points), len(points) - n_run - n_cached, n_cached, n_run, len(todo), self.n_worker))
+		running = [] # the runs in progress
+		elapsed = [] # the wall clock time of the runs done
+		last_progress = time.time()
+		try:
+			while todo or running:
+				# a run with continuations takes a worker for each of its points
+				while todo and (not running or sum(len(r.points) for r in running) + len(todo[0]) <= self.n_worker):
+					running.append(self.start(todo.pop(0)))
+				time.sleep(0.2)
+				for run in list(running):
+					if run.proc.poll() is None:
+						for pt in run.points:
+							if pt.mon is not None and pt.name not in run.stalled:
+								pt.mon.poll()
+								why = pt.mon.stalled(time.time())
+								if why is not None and run.stall(pt, why):
+									break
+						if run.killed is None:
+							continue
+					running.remove(run)
+					self.finish(run, followers)
+					if run.proc.returncode == 0:
+						elapsed.append(self.state[run.points[0].name]["elapsed"])
+				if self.progress > 0 and running and time.time() - last_progress >= self.progress:
+					self.show_progress(running, len(todo), elapsed)
+					last_progress = time.time()
+		finally:
+			# on an interrupt, the runs in progress are killed and will run again
+			for run in running:
+				run.kill()
+				for pt in run.points:
+					if pt.tmp is not None:
+						self.cache.discard(pt.tmp)
+					del self.state[pt.name]
+			save_state(self.state_file, self.state)
+		return sum(1 for p, name, config, meta in points if self.state.get(name, {}).get("status") in ("failed", "stalled"))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description = "run a sweep of simulations over a grid of run.py parameters")
+	parser.add_argument("grid", nargs = "?", help = "a json file of {parameter: [values]}, with the parameters of run.py (cc, trace, bw, down, topo, utgt, mi, hpai, pint_log_base, pint_prob, enable_tr)")
+	parser.add_argument("-s", dest = "set", action = "append", default = [], help = "parameter=value1,value2,... added to the grid (or replacing it in the grid file); can be repeated")
+	parser.add_argument("-j", dest = "workers", type = int, default = 0, help = "the number of runs at the same time, by default one per core, as long as they fit in the memory (-m)")
+	parser.add_argument("-m", dest = "mem", type = float, default = 2, help = "the memory of one run (GB), to bound the number of runs at the same time; by default 2, 0 for no bound")
+	parser.add_argument("--binary", default = os.path.join(SIM_DIR, "build", "scratch", "third"), help = "the third binary built by waf, by default build/scratch/third")
+	parser.add_argument("--lib", default = os.path.join(SIM_DIR, "build"), help = "the folder of the ns-3 libraries, by default build")
+	parser.add_argument("--build", action = "store_true", help = "run ./waf build once before the sweep")
+	parser.add_argument("--state", default = os.path.join(SIM_DIR, "mix", "sweep_state.json"), help = "the state file of the sweep, by default mix/sweep_state.json")
+	parser.add_argument("--force", action = "store_true", help = "run the points again even if they are done")
+	parser.add_argument("--cache", default = os.path.join(SIM_DIR, "mix", "cache"), help = "the folder of the result cache, by default mix/cache")
+	parser.add_argument("--no-cache", dest = "no_cache", action = "store_true", help = "do not use the result cache")
+	parser.add_argument("--stall-time", dest = "stall_time", type = float, default = 600, help = "kill a run with no heartbeat for this time (s), or whose simulated time rate over this time collapses (--collapse); by default 600")
+	parser.add_argument("--collapse", type = float, default = 0.01, help = "kill a run whose simulated time per second over the last --stall-time falls below this fraction of its median; by default 0.01")
+	parser.add_argument("--progress", type = float, default = 60, help = "print the progress of the runs every this time (s), by default 60, 0 for never")
+	parser.add_argument("--fork-at", dest = "fork_at", type = int, default = 0, help = "the simulated time (ns) to fork at: the points that only differ after it (LINK_DOWN after it, utgt, mi, hpai, pint_prob) share one run until it, and are forked from it; by default no fork")
+	parser.add_argument("-n", dest = "dry_run", action = "store_true", help = "only list the points and whether they are done")
+	args = parser.parse_args()
+
+	grid = {}
+	if args.grid:
+		with open(args.grid) as f:
+			grid = json.load(f)
+	try:
+		for s in args.set:
+			key, _, values = s.partition("=")
+			grid[key] = parse_values(key, values)
+		points = expand(grid)
+		if args.fork_at:
+			check_heartbeats(points)
+	except ValueError as e:
+		print(e)
+		sys.exit(1)
+
+	sweep = Sweep(args.binary, args.lib, args.state, args.workers or worker_count(args.mem * (1 << 30)), args.force, None if args.no_cache else args.cache,
+		args.stall_time, args.collapse, args.progress, args.fork_at)
+	if args.build and not args.dry_run and subprocess.call(["./waf", "build"], cwd = SIM_DIR) != 0:
+		sys.exit(1)
+	if not os.path.exists(sweep.binary):
+		print("%s not found, please build it first (./waf build, or --build)"%sweep.binary)
+		sys.exit(1)
+	if args.dry_run:
+		keys, groups = sweep.plan(points)
+		for g in groups:
+			for i in g:
+				name, key = points[i][1], keys[i]
+				print("%s %s%s"%("done" if sweep.is_done(name, key) else "cached" if sweep.is_cached(key) else "todo", name, " (forked from %s)"%points[g[0]][1] if i != g[0] else ""))
+		sys.exit(0)
+	try:
+		failed = sweep.run(points)
+	except KeyboardInterrupt:
+		sys.exit(130)
+	sys.exit(1 if failed > 0 else 0)
@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+# the scripts of each folder import each other by their bare names, as when they are run from their own folder
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for d in ["traffic_gen", "analysis", "simulation"]:
+	sys.path.insert(0, os.path.join(ROOT, d))
+
+# a synthetic .tr file of n records sorted by time (with ties), over a few nodes and flows of every l3Prot
+def write_trace(path, n = 5000, seed = 0):
+	from trace_reader import TRACE_DTYPE
+	rng = np.random.RandomState(seed)
+	r = np.zeros(n, TRACE_DTYPE)
+	r["time"] = 2000000000 + np.sort(rng.randint(0, n * 10, n))
+	r["node"] = rng.randint(0, 80, n)
+	r["intf"] = rng.randint(0, 4, n)
+	r["qidx"] = rng.randint(0, 8, n)
+	r["qlen"] = rng.randint(0, 100000, n)
+	flow = rng.randint(0, 40, n)
+	r["sip"] = 0x0b000001 + (flow % 8) * 256
+	r["dip"] = 0x0b000001 + (flow // 8) * 256
+	r["size"] = rng.randint(60, 1100, n)
+	r["l3Prot"] = np.array([0x11, 0x11, 0x11, 0xFC, 0xFD, 0xFE, 0xFF, 0x0])[rng.randint(0, 8, n)]
+	r["event"] = rng.randint(0, 4, n)
+	r["nodeType"] = r["node"] >= 64
+	r["data"]["sport"] = 10000 + flow
+	r["data"]["dport"] = 100
+	r["data"]["seq"] = rng.randint(0, 1 << 20, n)
+	write_records(path, r)
+	return r
+
+# a .tr file of the records, with the ports 0:1 and 1:1 at 100Gbps and 64:1 at 400Gbps, and a window bound of 100000
+def write_records(path, r):
+	from trace_reader import PORT_SPEED_DTYPE
+	ports = np.zeros(3, PORT_SPEED_DTYPE)
+	ports["node"], ports["intf"], ports["bps"] = [0, 1, 64], [1, 1, 1], [100000000000, 100000000000, 400000000000]
+	with open(path, "wb") as f:
+		f.write(np.array([len(ports)], "<u4").tobytes())
+		f.write(ports.tobytes())
+		f.write(np.array([100000], "<u4").tobytes())
+		f.write(r.tobytes())
+
+# whether two record arrays have the same fields; not their bytes, since a copy of records (e.g. records[mask]) leaves
+# the padding that no field covers uninitialized
+def same_records(a, b):
+	if len(a) != len(b):
+		return False
+	for name in a.dtype.names:
+		sub = a.dtype[name].names
+		for f in sub or [None]:
+			x, y = (a[name], b[name]) if f is None else (a[name][f], b[name][f])
+			if not np.array_equal(x, y):
+				return False
+	return True
+
+# the C++ trace_reader, built for the tests
+@pytest.fixture(scope = "session")
+def cpp_reader(tmp_path_factory):
+	if shutil.which("g++") is None:
+		pytest.skip("no g++ to build trace_reader.cpp")
+	binary = str(tmp_path_factory.mktemp("bin") / "trace_reader")
+	subprocess.check_call(["g++", os.path.join(ROOT, "analysis", "trace_reader.cpp"), "-o", binary, "-O2", "-std=gnu++11", "-lz"])
+	return binary
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pytest
+from conftest import ROOT
+from custom_rand import CustomRand
+
+CDFS = ["WebSearch_distribution", "FbHdp_distribution", "AliStorage2019", "GoogleRPC2008"]
+
+def read_cdf(name):
+	cdf = []
+	for line in open(os.path.join(ROOT, "traffic_gen", name + ".txt"), "r"):
+		x, y = map(float, line.strip().split(' '))
+		cdf.append([x, y])
+	return cdf
+
+def percentiles(cdf, n = 20000, seed = 0):
+	# random percentiles, the cdf points themselves and the ends
+	y = np.random.RandomState(seed).random_sample(n) * 100
+	return np.concatenate(([0., 100.], [c[1] for c in cdf], y))
+
+@pytest.mark.parametrize("name", CDFS)
+@pytest.mark.parametrize("lut_size", [0, 16, 4096])
+def test_same_as_bisect(name, lut_size):
+	cdf = read_cdf(name)
+	r = CustomRand()
+	assert r.setCdf(cdf, lut_size)
+	y = percentiles(cdf)
+	exact = np.array([r.getValueFromPercentile(v) for v in y.tolist()])
+	assert np.allclose(r.getValuesFromPercentiles(y), exact, rtol = 1e-12)
+	# rand(n, rng) draws its percentiles from rng
+	got = r.rand(1000, np.random.RandomState(1))
+	y = np.random.RandomState(1).random_sample(1000) * 100
+	assert np.allclose(got, [r.getValueFromPercentile(v) for v in y.tolist()], rtol = 1e-12)
+
+# a value drawn through the lookup table is at most one cell of the table (100 / lut_size percent) from the exact
+# inverse of the cdf
+@pytest.mark.parametrize("name", CDFS)
+@pytest.mark.parametrize("lut_size", [16, 256, 4096])
+def test_lut_step(name, lut_size):
+	cdf = read_cdf(name)
+	r = CustomRand()
+	assert r.setCdf(cdf, lut_size)
+	y = percentiles(cdf)
+	x = r.getValuesFromPercentiles(y)
+	xs, ys = [c[0] for c in cdf], [c[1] for c in cdf]
+	assert (np.abs(np.interp(x, xs, ys) - y) <= 100. / lut_size).all()
+	assert np.allclose(x, np.interp(y, ys, xs), rtol = 1e-9)
+
+def test_invalid_cdf():
+	assert not CustomRand().setCdf([[0, 0], [10, 50], [5, 100]])
+	assert not CustomRand().setCdf([[0, 1], [10, 100]])
@@ -0,0 +1,207 @@
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+from conftest import ROOT
+from fct_file import load_fct, read_fct, parse_fct_name, FCT_COLUMNS
+from fct_analysis import analyze, analyze_stream, get_slowdown, sweep
+from quantile_sketch import LogSketch
+
+# a fct file of n flows; a third of them are 1000B (e.g. a fixed incast size), so that the ties of one size span
+# several buckets. With grid=True the other sizes are on a grid 5% apart, so that no two sizes share a bin of the
+# sketch and the stream mode puts every flow in the same bucket as the exact mode
+def write_fct(path, n = 20000, seed = 0, grid = False):
+	rng = np.random.RandomState(seed)
+	x = np.exp(rng.normal(9, 2, n))
+	if grid:
+		x = 1.05 ** np.round(np.log(x) / np.log(1.05))
+	size = np.where(rng.rand(n) < 0.3, 1000, x.astype(np.int64) + 1)
+	dport = np.where(rng.rand(n) < 0.1, 200, 100)
+	start = 2000000000 + rng.randint(0, 900000000, n)
+	standalone = 2000 + size * 8 // 100
+	fct = (standalone * (1 + rng.exponential(2, n))).astype(np.int64)
+	with open(path, "w") as f:
+		for i in range(n):
+			f.write("%08x %08x %d %d %d %d %d %d\n"%(0x0b000001 + (i % 16) * 256, 0x0b000101, 10000 + i % 50000, dport[i], size[i], start[i], fct[i], standalone[i]))
+
+# the C++ tool reads ../simulation/mix/<prefix>_<cc>.txt, so the fct files go there and the tools run from a sibling folder
+@pytest.fixture(scope = "module")
+def fct_dir(tmp_path_factory):
+	root = tmp_path_factory.mktemp("fct")
+	os.makedirs(str(root / "simulation" / "mix"))
+	os.makedirs(str(root / "analysis"))
+	for seed, cc in enumerate(["a", "b"]):
+		write_fct(str(root / "simulation" / "mix" / ("fct_fat_%s.txt"%cc)), seed = seed)
+	with open(str(root / "steps.txt"), "w") as f:
+		f.write("1000 30.0\n10000 60.0\n100000 90.0\n1000000000 100.0\n")
+	return str(root)
+
+@pytest.fixture(scope = "module")
+def cpp_tool(fct_dir):
+	if shutil.which("g++") is None:
+		pytest.skip("no g++ to build fct_analysis.cpp")
+	binary = os.path.join(fct_dir, "fct_analysis")
+	subprocess.check_call(["g++", os.path.join(ROOT, "analysis", "fct_analysis.cpp"), "-o", binary, "-O2", "-std=gnu++11"])
+	return binary
+
+def run(cmd, fct_dir):
+	return subprocess.check_output(cmd, cwd = os.path.join(fct_dir, "analysis")).decode()
+
+@pytest.mark.parametrize("args", [[], ["-t", "1"], ["-t", "2"], ["-s", "10"], ["-T", "2500000000"], ["-S", "../steps.txt"]])
+def test_same_as_cpp(fct_dir, cpp_tool, args):
+	py = run([sys.executable, os.path.join(ROOT, "analysis", "fct_analysis.py"), "-c", "a,b", "-d", "../simulation/mix"] + args, fct_dir)
+	cpp = run([cpp_tool, "-c", "a,b"] + args, fct_dir)
+	assert py == cpp
+
+# -b was never used; old command lines with it still work
+def test_bandwidth_ignored(fct_dir):
+	cmd = [sys.executable, os.path.join(ROOT, "analysis", "fct_analysis.py"), "-c", "a", "-d", "../simulation/mix"]
+	assert run(cmd + ["-b", "25"], fct_dir) == run(cmd, fct_dir)
+
+def same_fct(a, b):
+	return all(np.array_equal(a[c], b[c]) for c in FCT_COLUMNS)
+
+def test_cache(tmp_path):
+	path, cache_dir = str(tmp_path / "fct.txt"), str(tmp_path / "cache")
+	write_fct(path, n = 1000)
+	ref = read_fct(path)
+	assert same_fct(load_fct(path, cache_dir), ref)
+	assert len(os.listdir(cache_dir)) == 1
+	# the second time, it is mapped from the cache
+	got = load_fct(path, cache_dir)
+	assert isinstance(got["size"], np.memmap) and same_fct(got, ref)
+
+# a fct file rewritten with the same size gets a new cache file from its new mtime, and the old one is removed
+def test_cache_rewritten(tmp_path):
+	path, cache_dir = str(tmp_path / "fct.txt"), str(tmp_path / "cache")
+	write_fct(path, n = 1000, seed = 0)
+	old = load_fct(path, cache_dir)
+	st = os.stat(path)
+	with open(path, "r") as f:
+		text = f.read()
+	# the same lines with two flows swapped: the same size, other columns
+	lines = text.splitlines(True)
+	lines[0], lines[1] = lines[1], lines[0]
+	with open(path, "w") as f:
+		f.write("".join(lines))
+	os.utime(path, ns = (st.st_atime_ns, st.st_mtime_ns + 1000000000))
+	assert os.path.getsize(path) == st.st_size
+	got = load_fct(path, cache_dir)
+	assert same_fct(got, read_fct(path)) and not same_fct(got, old)
+	assert len(os.listdir(cache_dir)) == 1
+
+def test_cache_broken(tmp_path):
+	path, cache_dir = str(tmp_path / "fct.txt"), str(tmp_path / "cache")
+	write_fct(path, n = 1000)
+	load_fct(path, cache_dir)
+	cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+	with open(cache_file, "wb") as f:
+		f.write(b"not a npy file")
+	assert same_fct(load_fct(path, cache_dir), read_fct(path))
+
+@pytest.mark.parametrize("name, fields", [
+	("fct_fat_flow_hp95ai50.txt", dict(prefix = "fct_fat_flow", cc = "hp95ai50", algo = "hp", utgt = "95", mi = "", ai = "50", pint_log_base = "", pint_prob = "", down = "0")),
+	("fct_fat_flow_hp95mi10.txt", dict(prefix = "fct_fat_flow", cc = "hp95mi10", algo = "hp", utgt = "95", mi = "10", ai = "", pint_log_base = "", pint_prob = "", down = "0")),
+	("fct_fat_web_search_hpccPint95ai50log1.050p1.000_down.txt", dict(prefix = "fct_fat_web_search", cc = "hpccPint95ai50log1.050p1.000", algo = "hpccPint", utgt = "95", mi = "", ai = "50", pint_log_base = "1.050", pint_prob = "1.000", down = "1")),
+	("fct_topology_flow_dcqcn_paper_vwin.txt", dict(prefix = "fct_topology_flow", cc = "dcqcn_paper_vwin", algo = "dcqcn_paper_vwin", utgt = "", mi = "", ai = "", pint_log_base = "", pint_prob = "", down = "0")),
+	("fct_fat_flow_timely.txt", dict(prefix = "fct_fat_flow", cc = "timely", algo = "timely", utgt = "", mi = "", ai = "", pint_log_base = "", pint_prob = "", down = "0")),
+])
+def test_parse_fct_name(name, fields):
+	assert parse_fct_name("/some/dir/" + name) == fields
+
+@pytest.mark.parametrize("name", ["fct_dcqcn.txt", "fct_fat_flow_hp.txt", "fct_fat_flow_hpccPint95.txt", "fct_fat_flow_hp95log1.050p1.000.txt", "pfc_fat_flow_dcqcn.txt", "fct_fat_flow_cubic.txt"])
+def test_parse_fct_name_other(name):
+	assert parse_fct_name(name) is None
+
+@pytest.fixture(scope = "module")
+def sweep_dir(tmp_path_factory):
+	dir = tmp_path_factory.mktemp("sweep")
+	for seed, name in enumerate(["fct_fat_flow_hp95ai50.txt", "fct_fat_flow_dcqcn.txt"]):
+		write_fct(str(dir / name), n = 3000, seed = seed)
+	return str(dir)
+
+# the sweep runs each file in its own process, and gives the same results as analyzing each file
+@pytest.mark.parametrize("n_worker", [1, 2])
+def test_sweep(sweep_dir, n_worker):
+	runs = sweep(sweep_dir, 0, 3000000000, 5, None, n_worker = n_worker, cache = False)
+	assert [name["cc"] for name, res in runs] == ["dcqcn", "hp95ai50"]
+	for name, res in runs:
+		file = os.path.join(sweep_dir, "%s_%s.txt"%(name["prefix"], name["cc"]))
+		assert res == analyze(*get_slowdown(read_fct(file)))
+
+def test_sweep_cli(sweep_dir):
+	cmd = [sys.executable, os.path.join(ROOT, "analysis", "fct_analysis.py"), "-d", sweep_dir, "--no-cache"]
+	out = subprocess.check_output(cmd + ["--sweep", "-j", "2"]).decode()
+	ref = subprocess.check_output(cmd + ["-p", "fct_fat_flow", "-c", "dcqcn,hp95ai50"]).decode()
+	assert out == "# fct_fat_flow: dcqcn hp95ai50\n" + ref
+
+@pytest.fixture(scope = "module")
+def fct_file(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("fct") / "fct.txt")
+	write_fct(path, grid = True)
+	return path
+
+def exact(path, type = 0, steps = None):
+	size, slowdown = get_slowdown(load_fct(path, cache = False), type)
+	return analyze(size, slowdown, 5, steps)
+
+def assert_close(stream, ref, rtol):
+	assert len(stream) == len(ref)
+	for s, r in zip(stream, ref):
+		assert s[0] == r[0]
+		# the stream rows also have p99.9
+		assert np.allclose(s[1:len(r)], r[1:], rtol = rtol, equal_nan = False), (s, r)
+
+# the buckets have the same flows, so the sizes are the same and the slowdowns are within the error of the sketch
+@pytest.mark.parametrize("type", [0, 2])
+def test_stream_matches_exact(fct_file, type):
+	assert_close(analyze_stream(fct_file, type), exact(fct_file, type), 2e-3)
+
+# with sizes in the same bin, a few flows at the edges of the buckets can change buckets, but the sizes are still within
+# the error of the sketch (and a size is never missing)
+def test_stream_sizes(tmp_path):
+	path = str(tmp_path / "fct.txt")
+	write_fct(path)
+	stream, ref = analyze_stream(path), exact(path)
+	assert np.allclose([r[1] for r in stream], [r[1] for r in ref], rtol = 2e-3, equal_nan = False)
+
+def test_stream_steps(fct_file):
+	steps = [(1000, 30.), (10000, 60.), (100000, 90.), (1000000000, 100.)]
+	assert_close(analyze_stream(fct_file, 0, steps = steps), exact(fct_file, 0, steps), 2e-3)
+
+# the shards are merged exactly, so the result does not depend on the number of processes
+def test_stream_workers(fct_file):
+	ref = analyze_stream(fct_file, 0)
+	for n_worker in [2, 3]:
+		assert analyze_stream(fct_file, 0, n_worker = n_worker) == ref
+
+def test_sketch_merge():
+	rng = np.random.RandomState(0)
+	x = np.concatenate([np.zeros(100), np.exp(rng.normal(5, 3, 10000))])
+	rng.shuffle(x)
+	whole = LogSketch(0.01)
+	whole.add(x)
+	merged = LogSketch(0.01)
+	for part in np.array_split(x, 7):
+		s = LogSketch(0.01)
+		s.add(part)
+		merged.merge(s)
+	assert merged.count() == whole.count() == len(x)
+	assert np.array_equal(merged.counts, whole.counts)
+	x.sort()
+	assert merged.value_at(0) == 0.
+	for q in [0.001, 0.1, 0.5, 0.9, 0.99, 0.999]:
+		v = x[int(len(x) * q)]
+		assert abs(merged.quantile(q) - v) <= 0.01 * v
+
+def test_sketch_negative():
+	with pytest.raises(ValueError):
+		LogSketch().add([1., -1.])
+
+# the sketch is in both folders, as the scripts of each folder import it by its bare name
+def test_sketch_copies():
+	files = [os.path.join(ROOT, d, "quantile_sketch.py") for d in ["traffic_gen", "analysis"]]
+	with open(files[0], "r") as a, open(files[1], "r") as b:
+		assert a.read() == b.read()
@@ -0,0 +1,26 @@
+import os
+import numpy as np
+import pytest
+from conftest import ROOT
+from flow_bins import load_bins, format_bins, format_pct, parse_bins
+
+# data/flow_bins holds the output of the original flow_bins.py (before the bin API) for each cdf
+CDFS = ["AliStorage2019", "FbHdp_distribution", "GoogleRPC2008", "WebSearch_distribution"]
+
+@pytest.mark.parametrize("cdf", CDFS)
+def test_same_as_original(cdf):
+	sizes, pcts = load_bins(os.path.join(ROOT, "traffic_gen", cdf + ".txt"), cache = False)
+	with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "flow_bins", cdf + ".txt"), "r") as f:
+		assert format_bins(sizes, pcts) == f.read()
+
+def test_format_pct():
+	assert format_pct(3.) == "3.0"
+	assert format_pct(1.9995) == "1.9995"
+	assert format_pct(100.) == "100.0"
+	assert format_pct(1. / 3) == "0.333333333333"
+
+def test_parse_bins():
+	sizes, pcts = np.array([666, 2000, 30000]), np.array([0.999, 3., 100.])
+	got = parse_bins(format_bins(sizes, pcts))
+	assert np.array_equal(got[0], sizes)
+	assert np.array_equal(got[1], pcts)
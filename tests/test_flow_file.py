@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from flow_file import open_flow_writer, read_flows, read_flow_count, is_binary, FlowWriter, BinaryFlowWriter
+
+def flows(n, seed = 0):
+	rng = np.random.RandomState(seed)
+	src = rng.randint(0, 320, n)
+	dst = rng.randint(0, 320, n)
+	size = rng.randint(1, 30000000, n)
+	t = np.sort(2000000000 + rng.randint(0, 1000000000, n))
+	dport = np.where(rng.rand(n) < 0.2, 200, 100)
+	return src, dst, size, t, dport
+
+def read_all(path, chunk = 1 << 20):
+	parts = list(read_flows(path, chunk))
+	return dict((k, np.concatenate([p[k] for p in parts])) for k in parts[0])
+
+@pytest.mark.parametrize("fmt", ["text", "bin"])
+def test_round_trip(tmp_path, fmt):
+	path = str(tmp_path / "flow.txt")
+	src, dst, size, t, dport = flows(5000)
+	writer = open_flow_writer(path, fmt)
+	# in several writes, as traffic_gen.py writes chunk by chunk
+	for i in range(0, 5000, 1200):
+		writer.write(src[i:i+1200], dst[i:i+1200], size[i:i+1200], t[i:i+1200], dport = dport[i:i+1200])
+	writer.close()
+	assert is_binary(path) == (fmt == "bin")
+	assert read_flow_count(path) == 5000
+	got = read_all(path, chunk = 700)
+	for k, v in [("src", src), ("dst", dst), ("size", size), ("start_ns", t), ("dport", dport), ("pg", np.full(5000, 3))]:
+		assert np.array_equal(got[k], v), k
+
+# blocks of the binary format split the flows, whatever the sizes of the writes
+def test_binary_blocks(tmp_path):
+	path = str(tmp_path / "flow.bin")
+	src, dst, size, t, dport = flows(1000)
+	writer = BinaryFlowWriter(path, block_size = 300)
+	for i in range(0, 1000, 70):
+		writer.write(src[i:i+70], dst[i:i+70], size[i:i+70], t[i:i+70], pg = 1, dport = dport[i:i+70])
+	writer.close()
+	parts = list(read_flows(path))
+	assert len(parts) > 1
+	got = read_all(path)
+	assert np.array_equal(got["start_ns"], t)
+	assert (got["pg"] == 1).all()
+
+# the count is only known on close, where it is patched into the padded first line
+def test_flow_count(tmp_path):
+	path = str(tmp_path / "flow.txt")
+	writer = FlowWriter(path)
+	n = 0
+	for k in [5, 0, 1000, 1, 3000]:
+		t = np.arange(n, n + k) * 1000 + 2000000000
+		writer.write(np.zeros(k, dtype = np.int64), np.ones(k, dtype = np.int64), np.full(k, 1000), t, batch = 700)
+		n += k
+	writer.close()
+	with open(path, "r") as f:
+		header, flows = f.readline().rstrip("\n"), f.read().splitlines()
+	assert len(header) == FlowWriter.HEADER_WIDTH and int(header) == n == len(flows)
+	assert flows[0] == "0 1 3 100 1000 2.000000000"
+	assert flows[-1] == "0 1 3 100 1000 %.9f"%((n - 1) * 1e-6 + 2)
+
+def test_empty(tmp_path):
+	for fmt in ["text", "bin"]:
+		path = str(tmp_path / ("flow." + fmt))
+		open_flow_writer(path, fmt).close()
+		assert read_flow_count(path) == 0
+		assert list(read_flows(path)) == []
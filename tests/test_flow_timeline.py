@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from conftest import write_trace, write_records
+from trace_reader import Trace, TRACE_DTYPE, RECV, ENQU, DEQU, L3_UDP, L3_ACK, L3_CNP
+from flow_timeline import FlowTimeline, U64, node_of, timeline, save_timeline, load_timeline
+
+SWITCH = 8
+T = 2000000000
+
+def ip(node):
+	return 0x0b000001 + (node << 8)
+
+# records of n_flow flows between the hosts 0-7 through the switch 8, and what the timeline of each flow should be,
+# worked out packet by packet. Each data packet is dequeued at its source (sometimes twice, a retransmission), goes
+# through the queue of the switch towards its destination, where its Dequ follows its Enqu in FIFO order, and is
+# received at the destination. Its ACK (sometimes repeated) and some CNPs are received at the source.
+# Flows 2k and 2k+1 are between the same hosts with other sports, so that CNPs are told apart by their sport.
+def sim_trace(n_flow = 12, seed = 0):
+	rng = np.random.RandomState(seed)
+	rows, expect = [], {}
+	def record(time, node, event, l3, sip, dip, size = 0, intf = 1, qidx = 3, qlen = 0, ecn = 0, **union):
+		rows.append((time, node, event, l3, sip, dip, size, intf, qidx, qlen, ecn, union))
+	for f in range(n_flow):
+		src = (f // 2) % 8
+		dst = (src + 1 + f // 16) % 8
+		sport, dport, pg = 10000 + f, 100, 3
+		e = dict(sent = 0, sent_bytes = 0, received = 0, received_bytes = 0, ecn_received = 0, cnp = 0, ack = 0, nack = 0, rtt = [], qdelay = [], times = [])
+		t0 = T + rng.randint(0, 20000)
+		last_deq, acked = 0, 0
+		for k in range(rng.randint(1, 15)):
+			seq, payload, size = k * 1000, 1000, 1048
+			data = dict(sport = sport, dport = dport, seq = seq, pg = pg, payload = payload)
+			send = t0 + k * 2000
+			sends = [send] + ([send + 300] if rng.rand() < 0.3 else [])
+			for s in sends:
+				record(s, src, DEQU, L3_UDP, ip(src), ip(dst), size, **data)
+				e["sent"] += 1
+				e["sent_bytes"] += size
+			enq = sends[-1] + 500
+			deq = max(last_deq + 1, enq + rng.randint(0, 3000))
+			last_deq = deq
+			record(enq, SWITCH, ENQU, L3_UDP, ip(src), ip(dst), size, intf = 2 + dst, qlen = rng.randint(0, 50000), **data)
+			record(deq, SWITCH, DEQU, L3_UDP, ip(src), ip(dst), size, intf = 2 + dst, **data)
+			e["qdelay"].append(deq - enq)
+			ecn = 3 if rng.rand() < 0.2 else 0
+			record(deq + 500, dst, RECV, L3_UDP, ip(src), ip(dst), size, ecn = ecn, **data)
+			e["received"] += 1
+			e["received_bytes"] += size
+			e["ecn_received"] += ecn == 3
+			ack_t = deq + 1500
+			for i in range(1 + (rng.rand() < 0.3)):
+				record(ack_t + i * 10, src, RECV, L3_ACK, ip(dst), ip(src), 60, sport = dport, dport = sport, pg = pg, seq = seq + payload)
+				e["ack"] += 1
+				# only an ACK that acknowledges more than before is an rtt sample, from the last send of the packet
+				if seq + payload > acked:
+					e["rtt"].append(ack_t + i * 10 - sends[-1])
+					acked = seq + payload
+			if rng.rand() < 0.4:
+				record(deq + 800, src, RECV, L3_CNP, ip(dst), ip(src), 60, fid = sport, qIndex = pg)
+				e["cnp"] += 1
+		expect[(ip(src), ip(dst), sport, dport, pg)] = e
+	r = np.zeros(len(rows), TRACE_DTYPE)
+	for i, (time, node, event, l3, sip, dip, size, intf, qidx, qlen, ecn, union) in enumerate(rows):
+		r[i]["time"], r[i]["node"], r[i]["event"], r[i]["l3Prot"], r[i]["sip"], r[i]["dip"] = time, node, event, l3, sip, dip
+		r[i]["size"], r[i]["intf"], r[i]["qidx"], r[i]["qlen"], r[i]["ecn"], r[i]["nodeType"] = size, intf, qidx, qlen, ecn, node == SWITCH
+		variant = "data" if l3 == L3_UDP else "ack" if l3 == L3_ACK else "cnp"
+		for k, v in union.items():
+			r[i][variant][k] = v
+	r = r[np.argsort(r["time"], kind = "mergesort")]
+	for key, e in expect.items():
+		m = (((r["sip"] == key[0]) & (r["dip"] == key[1])) | ((r["sip"] == key[1]) & (r["dip"] == key[0])))
+		e["times"] = r["time"][m & ((r["data"]["sport"] == key[2]) | (r["data"]["dport"] == key[2]))]
+	return r, expect
+
+def run(records, block, idle = None, end = None):
+	tl = FlowTimeline(idle, end)
+	for i in range(0, len(records), block):
+		tl.add(records[i:i + block])
+	return tl.finish()
+
+def rows(table):
+	return dict(((int(table["sip"][i]), int(table["dip"][i]), int(table["sport"][i]), int(table["dport"][i]), int(table["pg"][i])), dict((c, table[c][i]) for c in table)) for i in range(len(table["sip"])))
+
+@pytest.fixture(scope = "module")
+def sim():
+	return sim_trace()
+
+def test_flows(sim):
+	records, expect = sim
+	flows, hops = run(records, 1 << 20)
+	got = rows(flows)
+	assert set(got) == set(expect)
+	for key, e in expect.items():
+		g = got[key]
+		for c in ["sent", "sent_bytes", "received", "received_bytes", "ecn_received", "cnp", "ack", "nack"]:
+			assert g[c] == e[c], (key, c)
+		for c in ["rtt", "qdelay"]:
+			assert g[c + "_count"] == len(e[c])
+			assert np.isclose(g[c + "_mean"], np.mean(e[c]))
+			assert g[c + "_max"] == max(e[c])
+		assert g["drop"] == 0 and g["hops"] == 2
+
+# the Enqu and Dequ of each queue of the switch are paired in order
+def test_hops(sim):
+	records, expect = sim
+	flows, hops = run(records, 1 << 20)
+	for i in range(len(hops["sip"])):
+		key = tuple(int(hops[c][i]) for c in ["sip", "dip", "sport", "dport", "pg"])
+		e = expect[key]
+		if hops["node"][i] == SWITCH:
+			assert hops["intf"][i] == 2 + node_of(U64(key[1]))
+			assert hops["enqueued"][i] == hops["packets"][i] == hops["qdelay_count"][i] == len(e["qdelay"])
+			assert np.isclose(hops["qdelay_mean"][i], np.mean(e["qdelay"])) and hops["qdelay_max"][i] == max(e["qdelay"])
+		else:
+			# the source only dequeues: there is no Enqu to pair with
+			assert hops["node"][i] == node_of(U64(key[0]))
+			assert hops["enqueued"][i] == hops["qdelay_count"][i] == 0 and hops["packets"][i] == e["sent"]
+
+# a CNP goes to the flow of its sport (fid), even when another flow has the same hosts and pg
+def test_cnp(sim):
+	records, expect = sim
+	got = rows(run(records, 1 << 20)[0])
+	assert sum(e["cnp"] for e in expect.values()) > 0
+	for f in range(0, 12, 2):
+		a, b = [k for k in expect if k[2] in (10000 + f, 10001 + f)]
+		assert a[:2] == b[:2]
+		assert got[a]["cnp"] == expect[a]["cnp"] and got[b]["cnp"] == expect[b]["cnp"]
+
+# from a .tr file, saved and loaded back
+def test_file(sim, tmp_path):
+	records, expect = sim
+	path, output = str(tmp_path / "mix.tr"), str(tmp_path / "mix.flows.npz")
+	write_records(path, records)
+	flows, hops = timeline(Trace(path))
+	save_timeline(output, flows, hops)
+	ref_flows, ref_hops = run(records, 1 << 20)
+	got_flows, got_hops = load_timeline(output)
+	assert same_tables(got_flows, ref_flows) and same_tables(got_hops, ref_hops)
+
+def same_tables(a, b):
+	return all(np.array_equal(a[c], b[c], equal_nan = True) for c in a)
+
+# the blocks the records come in, and writing out flows as they complete or go idle, do not change the tables
+def test_blocks_and_eviction(sim):
+	records, expect = sim
+	ref_flows, ref_hops = run(records, 1 << 20)
+	# each flow completes just after its last record, as it would from the fct file
+	fi = np.array([(int(node_of(U64(k[0]))) << 48) | (int(node_of(U64(k[1]))) << 32) | (k[2] << 16) | k[3] for k in expect], dtype = np.uint64)
+	end = (fi, np.array([e["times"].max() + 1 for e in expect.values()]))
+	idle = max(np.diff(e["times"]).max() for e in expect.values() if len(e["times"]) > 1) + 1
+	for block in [1, 7, 100, 1000]:
+		for kw in [{}, {"end": end}, {"idle": idle}, {"end": end, "idle": idle}]:
+			flows, hops = run(records, block, **kw)
+			assert same_tables(flows, ref_flows), (block, kw)
+			assert same_tables(hops, ref_hops), (block, kw)
+
+# a flow idle for longer than `idle` is written out, and its later records start a new row
+def test_idle_splits(sim):
+	records, expect = sim
+	flows, hops = run(records, 50, idle = 1)
+	assert len(flows["sip"]) > len(expect)
+	assert flows["sent"].sum() == sum(e["sent"] for e in expect.values())
+
+# the records of a random trace, in blocks or not, with or without eviction, give the same tables
+def test_random_trace(tmp_path):
+	path = str(tmp_path / "mix.tr")
+	write_trace(path)
+	records = Trace(path).records
+	ref = run(records, 1 << 20)
+	for block in [13, 500]:
+		got = run(records, block)
+		assert same_tables(got[0], ref[0]) and same_tables(got[1], ref[1])
@@ -0,0 +1,77 @@
+import json
+import pytest
+from heartbeat import Monitor, read_heartbeats
+
+def beat(wall, sim, active = 1, done = 0, flows = 10, final = 0):
+	return {"sim_ns": sim, "stop_ns": 1000000000, "wall_s": wall, "events": 100 * wall, "events_per_s": 100, "active_qps": active,
+		"completed_flows": done, "flows": flows, "rss_kb": 1024, "final": final}
+
+def write_beats(path, beats, mode = "a"):
+	with open(path, mode) as f:
+		for b in beats:
+			f.write(json.dumps(b) + "\n")
+
+@pytest.fixture
+def path(tmp_path):
+	return str(tmp_path / "heartbeat.txt")
+
+def test_before_first_flow(path):
+	# the setup runs the simulated time much faster, so it is not in the rates
+	write_beats(path, [beat(0, 0, active = 0), beat(10, 500000000, active = 0), beat(20, 500001000), beat(30, 500002000)])
+	mon = Monitor(path, stall_time = 100)
+	assert mon.poll() == 4
+	assert mon.last == beat(30, 500002000)
+	assert [b["wall_s"] for b in mon.beats] == [20, 30]
+	assert mon.rates == [(30, 100.0)]
+	assert mon.sim_rate(60) == 100.0
+	assert mon.eta() == (1000000000 - 500002000) / 100.0
+
+def test_partial_line(path):
+	write_beats(path, [beat(0, 0)])
+	line = json.dumps(beat(10, 1000)) + "\n"
+	with open(path, "a") as f:
+		f.write(line[:20])
+	mon = Monitor(path)
+	assert mon.poll() == 1 and mon.last == beat(0, 0)
+	assert mon.poll() == 0
+	with open(path, "a") as f:
+		f.write(line[20:])
+	assert mon.poll() == 1 and mon.last == beat(10, 1000)
+	assert read_heartbeats(path) == ([beat(0, 0), beat(10, 1000)], len(json.dumps(beat(0, 0))) + len(line) + 1)
+	assert read_heartbeats(path + ".none", 5) == ([], 5)
+
+def test_no_heartbeat(path):
+	mon = Monitor(path, stall_time = 100)
+	mon.poll()
+	assert mon.stalled(1e12) is None and mon.status() == "starting"
+	write_beats(path, [beat(0, 0), beat(10, 1000)])
+	mon.poll()
+	assert mon.stalled(mon.last_seen + 100) is None
+	assert mon.stalled(mon.last_seen + 130) == "no heartbeat for 2m10s"
+	# once all flows are done, the heartbeats stop until the final one
+	write_beats(path, [beat(20, 2000, active = 0, done = 10)])
+	mon.poll()
+	assert mon.stalled(mon.last_seen + 1000) is None
+
+def test_collapse(path):
+	slow = lambda w: 190000 + (w - 190) * 5
+	write_beats(path, [beat(w, w * 1000) for w in range(0, 200, 10)] + [beat(w, slow(w)) for w in range(200, 260, 10)])
+	mon = Monitor(path, stall_time = 100, collapse = 0.01)
+	mon.poll()
+	# the last 100s still have some of the rate before
+	assert mon.stalled(mon.last_seen) is None
+	write_beats(path, [beat(w, slow(w)) for w in range(260, 310, 10)])
+	mon.poll()
+	assert mon.stalled(mon.last_seen) == "the simulated time rate collapsed to 5 ns/s (median 1000 ns/s) in the last 1m40s"
+	# a slowdown above collapse * median is not a stall
+	mon = Monitor(path, stall_time = 100, collapse = 0.001)
+	mon.poll()
+	assert mon.stalled(mon.last_seen) is None
+
+def test_final(path):
+	write_beats(path, [beat(0, 0), beat(10, 1000), beat(11, 1000000000, active = 0, done = 10, final = 1)])
+	mon = Monitor(path, stall_time = 1)
+	mon.poll()
+	assert mon.eta() == 0
+	assert mon.stalled(mon.last_seen + 1000) is None
+	assert mon.status() == "1.000000s/1.000000s simulated (100.0%), 10/10 flows done, 0 active qps, 0.00M events/s, 1MB, ETA 0s"
@@ -0,0 +1,81 @@
+import math
+import numpy as np
+import pytest
+from conftest import write_trace
+from trace_reader import Trace, ENQU, DEQU
+from queue_series import QueueSeries, queue_series, save_series, load_series
+
+# the series worked out with a plain loop over the records, one (bin, queue) and one (bin, port) at a time
+def plain_series(records, bin, port_speed, percentiles):
+	qlens, ports = {}, {}
+	for r in records:
+		if r["event"] not in (ENQU, DEQU):
+			continue
+		b = int(r["time"]) // bin
+		qlens.setdefault((int(r["node"]), int(r["intf"]), int(r["qidx"]), b * bin), []).append(int(r["qlen"]))
+		if r["event"] == DEQU:
+			key = (int(r["node"]), int(r["intf"]), b * bin)
+			ports[key] = ports.get(key, 0) + int(r["size"])
+	queues = {}
+	for key, v in qlens.items():
+		s = sorted(v)
+		row = {"events": len(v), "mean": sum(v) / float(len(v)), "max": s[-1], "last": v[-1]}
+		for p in percentiles:
+			# nearest rank: the smallest value with at least p% of the values at or below it
+			row["p%g"%p] = s[max(int(math.ceil(p / 100.0 * len(s))) - 1, 0)]
+		queues[key] = row
+	util = {}
+	for (node, intf, t), tx in ports.items():
+		bps = port_speed.get(node, {}).get(intf, 0)
+		util[(node, intf, t)] = (tx, tx * 8e9 / (bin * bps) if bps > 0 else float("nan"))
+	return queues, util
+
+def series(records, bin, port_speed, block, percentiles = [50, 99]):
+	qs = QueueSeries(bin, port_speed, percentiles)
+	for i in range(0, len(records), block):
+		qs.add(records[i:i + block])
+	return qs.finish()
+
+@pytest.fixture(scope = "module")
+def trace(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("trace") / "mix.tr")
+	write_trace(path)
+	return path, Trace(path)
+
+# with bins of 20000ns, each bin spans many blocks of 50 records, and goes on from one block to the next
+@pytest.mark.parametrize("bin, block", [(1000, 1 << 20), (1000, 37), (1000, 500), (20000, 50), (20000, 1)])
+def test_same_as_plain(trace, bin, block):
+	path, t = trace
+	percentiles = [50, 99, 0, 100, 12.5]
+	queues, ports = series(t.records, bin, t.port_speed, block, percentiles)
+	ref_queues, ref_ports = plain_series(t.records, bin, t.port_speed, percentiles)
+	got = {}
+	for i in range(len(queues["node"])):
+		key = (int(queues["node"][i]), int(queues["intf"][i]), int(queues["qidx"][i]), int(queues["time"][i]))
+		got[key] = dict((c, queues[c][i]) for c in ["events", "mean", "max", "last"] + ["p%g"%p for p in percentiles])
+	assert set(got) == set(ref_queues)
+	for key, row in ref_queues.items():
+		for c, v in row.items():
+			assert np.isclose(got[key][c], v), (key, c)
+	got = {}
+	for i in range(len(ports["node"])):
+		got[(int(ports["node"][i]), int(ports["intf"][i]), int(ports["time"][i]))] = (ports["tx_bytes"][i], ports["utilization"][i])
+	assert set(got) == set(ref_ports)
+	for key, (tx, util) in ref_ports.items():
+		assert got[key][0] == tx
+		assert np.isclose(got[key][1], util, equal_nan = True)
+	# the ports in the header have a utilization
+	speed = (ports["node"] == 64) & (ports["intf"] == 1)
+	assert speed.any() and not np.isnan(ports["utilization"][speed]).any()
+
+def test_file(trace, tmp_path):
+	path, t = trace
+	output = str(tmp_path / "mix.queues.npz")
+	queues, ports = queue_series(t, 1000, "node<10")
+	save_series(output, queues, ports)
+	got_queues, got_ports = load_series(output)
+	assert (queues["node"] < 10).all() and len(queues["node"]) > 0
+	for a, b in [(queues, got_queues), (ports, got_ports)]:
+		assert set(a) == set(b)
+		for c in a:
+			assert np.array_equal(a[c], b[c], equal_nan = True)
@@ -0,0 +1,51 @@
+import os
+import pytest
+from run import gen_config
+from result_cache import run_key, replace_config, parse_config, OUTPUTS
+
+# a simulation folder with the input files of the configs of run.py
+def sim_dir(path, flows = "2\n0 1 3 100 1000 2.0\n1 0 3 100 1000 2.0\n"):
+	os.makedirs(os.path.join(path, "mix"))
+	for name, text in [("fat.txt", "3 1 2\n2\n0 2 100Gbps 0.001ms 0\n1 2 100Gbps 0.001ms 0\n"), ("flow.txt", flows), ("trace.txt", "2\n0 1\n")]:
+		with open(os.path.join(path, "mix", name), "w") as f:
+			f.write(text)
+	return path
+
+@pytest.fixture
+def dir(tmp_path):
+	return sim_dir(str(tmp_path / "a"))
+
+def config(**kw):
+	return gen_config(**kw)[1]
+
+def test_same_run(dir, tmp_path):
+	key = run_key(config(), dir, "build")
+	assert run_key(config(), dir, "build") == key
+	# the inputs count by their contents, not where they are
+	assert run_key(config(), sim_dir(str(tmp_path / "b")), "build") == key
+	# nor does the order of the lines of the config
+	assert run_key("\n".join(reversed(config().splitlines())), dir, "build") == key
+
+# the names of the outputs and the runtime keys do not change the results
+def test_outputs_and_runtime(dir):
+	key = run_key(config(), dir, "build")
+	values = dict((k, "out/other_%s"%name) for k, name in OUTPUTS.items())
+	values["HEARTBEAT_INTERVAL"] = "1.0"
+	assert set(values) <= set(dict(parse_config(config())))
+	assert run_key(replace_config(config(), values), dir, "build") == key
+
+def test_different_run(dir):
+	key = run_key(config(), dir, "build")
+	assert run_key(config(utgt = 90), dir, "build") != key
+	assert run_key(config(cc = "dcqcn"), dir, "build") != key
+	# a parameter that is not in the names of the outputs
+	assert run_key(replace_config(config(), {"BUFFER_SIZE": "32"}), dir, "build") != key
+	assert run_key(config(), dir, "other build") != key
+
+def test_input_contents(dir, tmp_path):
+	key = run_key(config(), dir, "build")
+	other = sim_dir(str(tmp_path / "b"), flows = "1\n0 1 3 100 5000 2.0\n")
+	assert run_key(config(), other, "build") != key
+	with open(os.path.join(dir, "mix", "flow.txt"), "w") as f:
+		f.write("1\n0 1 3 100 5000 2.0\n")
+	assert run_key(config(), dir, "build") == run_key(config(), other, "build")
@@ -0,0 +1,34 @@
+import os
+import pytest
+from run import gen_config
+from sim_config import CC_PRESETS, SimConfig
+
+# data/configs holds the configs written by the original run.py (before sim_config) for each cc with these parameters,
+# with the heartbeat of the run added
+PARAMS = [
+	{},
+	dict(bw = 100, utgt = 90, mi = 5, hpai = 50, down = "1.5 2 3", enable_tr = 1),
+	dict(bw = 25, topo = "topo2", trace = "web", utgt = 98, pint_log_base = 1.05, pint_prob = 0.5),
+]
+CCS = ["dcqcn", "dcqcn_paper", "dcqcn_vwin", "dcqcn_paper_vwin", "hp", "dctcp", "timely", "timely_vwin", "hpccPint"]
+
+def test_presets():
+	assert sorted(CC_PRESETS) == sorted(CCS)
+
+@pytest.mark.parametrize("cc", CCS)
+@pytest.mark.parametrize("params", PARAMS)
+def test_same_as_run(cc, params):
+	config_name, config, meta = gen_config(cc = cc, **params)
+	with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "configs", os.path.basename(config_name)), "r") as f:
+		assert config == f.read()
+	assert meta["params"]["cc"] == cc and meta["outputs"]["FCT_OUTPUT_FILE"] in config
+
+def test_values():
+	c = SimConfig(CC_MODE = 3.0, U_TARGET = 1, LINK_DOWN = "0 0 0")
+	assert c["CC_MODE"] == 3 and c["U_TARGET"] == 1.0
+	for k, v in [("CC_MODE", 1.5), ("CC_MODE", "3"), ("CC_MODE", True), ("U_TARGET", None), ("NO_SUCH_KEY", 1)]:
+		with pytest.raises(ValueError):
+			c.set(**{k: v})
+	# the outputs have no default
+	with pytest.raises(ValueError, match = "no value for"):
+		SimConfig().render()
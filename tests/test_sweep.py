@@ -0,0 +1,202 @@
+import os
+import sys
+import pytest
+import sweep
+from run import gen_config
+from sweep import Sweep, check_heartbeats, expand, fork_key, fork_prefix, used_params, load_state
+
+# a stand-in for the third binary: it writes "ran <config>" to its fct output and a final heartbeat, and fails (after
+# writing its output, but before its final heartbeat) when its config contains $FAKE_FAIL (with a cache, the config it
+# runs writes to the cache, and is not named after the point). The continuations of FORK_CONFIGS do the same with their
+# fork configs, and the process returns the status of the base run
+FAKE_BINARY = """#!%s
+import json, os, sys
+def run(fileName):
+	text = open(fileName).read()
+	config = dict(l.split(" ", 1) for l in text.splitlines() if " " in l)
+	with open(config["FCT_OUTPUT_FILE"].strip(), "a") as f:
+		f.write("ran %%s\\n"%%fileName)
+	if os.environ.get("FAKE_FAIL") and os.environ["FAKE_FAIL"] in text:
+		return 1
+	if "HEARTBEAT_FILE" in config:
+		with open(config["HEARTBEAT_FILE"].strip(), "a") as f:
+			f.write(json.dumps({"sim_ns": 4000000000, "stop_ns": 4000000000, "wall_s": 1.0, "events": 1, "events_per_s": 1, "active_qps": 0,
+				"completed_flows": 1, "flows": 1, "rss_kb": 1024, "pid": os.getpid(), "final": 1}) + "\\n")
+	return 0
+base = open(sys.argv[1]).read()
+forks = [l.split()[2:] for l in base.splitlines() if l.startswith("FORK_CONFIGS ")]
+for fork in forks[0] if forks else []:
+	run(fork)
+sys.exit(run(sys.argv[1]))
+"""
+
+@pytest.fixture
+def sim_dir(tmpdir, monkeypatch):
+	os.mkdir(str(tmpdir.join("mix")))
+	os.mkdir(str(tmpdir.join("build")))
+	binary = str(tmpdir.join("third"))
+	with open(binary, "w") as f:
+		f.write(FAKE_BINARY%sys.executable)
+	os.chmod(binary, 0o755)
+	# the inputs of the configs, for the keys of the cache; flow2 is the same trace as flow under another name
+	for name in ["fat.txt", "flow.txt", "flow2.txt", "trace.txt"]:
+		with open(str(tmpdir.join("mix", name)), "w") as f:
+			f.write("1\n0 1 3 100 1000 2.0\n")
+	monkeypatch.setattr(sweep, "SIM_DIR", str(tmpdir))
+	monkeypatch.delenv("FAKE_FAIL", raising = False)
+	return str(tmpdir)
+
+def make_sweep(sim_dir, force = False, cache_dir = None, state = "state.json", fork_at = 0):
+	return Sweep(os.path.join(sim_dir, "third"), os.path.join(sim_dir, "build"), os.path.join(sim_dir, "mix", state), 2, force, cache_dir,
+		fork_at = fork_at)
+
+# the lines of the fct output of a config, written by FAKE_BINARY
+def fct_lines(sim_dir, config_name):
+	with open(os.path.join(sim_dir, config_name.replace("config_", "fct_", 1))) as f:
+		return f.read().splitlines()
+
+def test_used_params():
+	p = dict(cc = "dcqcn", utgt = 90, mi = 5, pint_prob = 0.5, bw = 100)
+	assert used_params(p) == dict(cc = "dcqcn", bw = 100)
+	assert used_params(dict(p, cc = "hp")) == dict(cc = "hp", utgt = 90, mi = 5, bw = 100)
+	assert used_params(dict(p, cc = "hpccPint")) == dict(p, cc = "hpccPint")
+	# the default cc is hp
+	assert used_params(dict(utgt = 90, pint_prob = 0.5)) == dict(utgt = 90)
+
+def test_expand():
+	points = expand({"cc": ["dcqcn", "hp"], "utgt": [90, 95], "trace": "flow"})
+	assert [p for p, name, config, meta in points] == [dict(cc = "dcqcn", trace = "flow"), dict(cc = "hp", trace = "flow", utgt = 90), dict(cc = "hp", trace = "flow", utgt = 95)]
+	for p, name, config, meta in points:
+		assert (name, config, meta) == gen_config(**p)
+	assert len(set(name for p, name, config, meta in points)) == 3
+	assert expand({}) == [({}, ) + gen_config()]
+
+def test_expand_collision():
+	# bw is not in the output names, so two bw would overwrite each other's outputs
+	with pytest.raises(ValueError, match = "same outputs"):
+		expand({"cc": "hp", "bw": [50, 100]})
+	with pytest.raises(ValueError, match = "unknown"):
+		expand({"nope": [1]})
+
+def test_run(sim_dir, monkeypatch):
+	points = expand({"cc": ["dcqcn", "hp", "timely"]})
+	monkeypatch.setenv("FAKE_FAIL", "CC_MODE 7\n")
+	s = make_sweep(sim_dir)
+	assert s.run(points) == 1
+	state = load_state(os.path.join(sim_dir, "mix", "state.json"))
+	assert sorted(state) == sorted(name for p, name, config, meta in points)
+	for p, name, config, meta in points:
+		assert state[name]["status"] == ("failed" if p["cc"] == "timely" else "done")
+		assert state[name]["returncode"] == (1 if p["cc"] == "timely" else 0)
+		assert fct_lines(sim_dir, name) == ["ran " + name]
+		with open(os.path.join(sim_dir, name)) as f:
+			assert f.read() == config
+		assert os.path.exists(os.path.join(sim_dir, state[name]["log"]))
+
+	# a new sweep over the same state only runs the failed point again
+	monkeypatch.delenv("FAKE_FAIL")
+	s = make_sweep(sim_dir)
+	assert [s.is_done(name, s.key(config)) for p, name, config, meta in points] == [True, True, False]
+	assert s.run(points) == 0
+	for p, name, config, meta in points:
+		assert fct_lines(sim_dir, name) == ["ran " + name] * (2 if p["cc"] == "timely" else 1)
+	assert all(v["status"] == "done" for v in load_state(s.state_file).values())
+
+	# a changed config or --force runs a done point again
+	assert not s.is_done(points[0][1], s.key(points[0][2] + "\n"))
+	assert not make_sweep(sim_dir, force = True).is_done(points[0][1], s.key(points[0][2]))
+
+def test_run_cache(sim_dir, monkeypatch):
+	cache_dir = os.path.join(sim_dir, "cache")
+	points = expand({"cc": ["dcqcn", "timely"], "trace": ["flow", "flow2"]})
+	monkeypatch.setenv("FAKE_FAIL", "CC_MODE 7\n")
+	s = make_sweep(sim_dir, cache_dir = cache_dir)
+	# flow and flow2 are the same run, which runs once for both
+	assert len(set(s.key(config) for p, name, config, meta in points)) == 2
+	assert s.run(points) == 2
+	state = load_state(s.state_file)
+	for p, name, config, meta in points:
+		assert state[name]["status"] == ("failed" if p["cc"] == "timely" else "done")
+	dcqcn = [name for p, name, config, meta in points if p["cc"] == "dcqcn"]
+	ran = fct_lines(sim_dir, dcqcn[0])
+	assert len(ran) == 1 and fct_lines(sim_dir, dcqcn[1]) == ran
+
+	# a sweep with another state gets the done run from the cache, and runs the failed one again
+	monkeypatch.delenv("FAKE_FAIL")
+	for name in dcqcn:
+		os.remove(os.path.join(sim_dir, name.replace("config_", "fct_", 1)))
+	s = make_sweep(sim_dir, cache_dir = cache_dir, state = "other.json")
+	assert s.run(points) == 0
+	state = load_state(s.state_file)
+	assert all(state[name].get("cached") for name in dcqcn)
+	for name in dcqcn:
+		assert fct_lines(sim_dir, name) == ran
+
+# a link down at 2.001s (1000us after 2s, as in third.cc)
+DOWN = "1000 1 2"
+
+def test_fork_prefix():
+	up, down, other = [gen_config(cc = "hp", **p)[1] for p in [dict(utgt = 90), dict(utgt = 95, down = DOWN), dict(bw = 100)]]
+	# the outputs, the link down after the fork and the parameters of the cc are for the continuations to change
+	assert fork_prefix(up, 2000500000) == fork_prefix(down, 2000500000)
+	assert fork_prefix(up, 2001000000) != fork_prefix(down, 2001000000)
+	assert fork_prefix(up, 2002000000) != fork_prefix(down, 2002000000)
+	assert fork_prefix(down, 2002000000) == fork_prefix(down.replace("U_TARGET 0.95", "U_TARGET 0.9"), 2002000000)
+	assert fork_prefix(up, 2000500000) != fork_prefix(other, 2000500000)
+	# nor do the runtime keys change the run
+	assert fork_prefix(up, 2000500000) == fork_prefix(up.replace("HEARTBEAT_INTERVAL 10.0", "HEARTBEAT_INTERVAL 1.0"), 2000500000)
+
+def test_fork_key():
+	key = fork_key("a", "b", 2000500000)
+	assert fork_key("a", "b", 2000500000) == key
+	assert len(set([key, fork_key("b", "b", 2000500000), fork_key("a", "c", 2000500000), fork_key("a", "b", 2000600000)])) == 4
+
+def test_plan(sim_dir):
+	points = expand({"cc": ["dcqcn", "hp"], "utgt": [90, 95], "down": ["0 0 0", DOWN]})
+	assert [(p["cc"], p["down"], p.get("utgt")) for p, name, config, meta in points] == [("dcqcn", "0 0 0", None), ("dcqcn", DOWN, None),
+		("hp", "0 0 0", 90), ("hp", "0 0 0", 95), ("hp", DOWN, 90), ("hp", DOWN, 95)]
+	own = make_sweep(sim_dir).plan(points)[0]
+	assert make_sweep(sim_dir).plan(points) == (own, [[0], [1], [2], [3], [4], [5]])
+	keys, groups = make_sweep(sim_dir, fork_at = 2000500000).plan(points)
+	assert groups == [[0, 1], [2, 3, 4, 5]]
+	assert keys == [own[0], fork_key(own[0], own[1], 2000500000), own[2]] + [fork_key(own[2], k, 2000500000) for k in own[3:]]
+	# a link down before the fork is in the shared part of the run
+	keys, groups = make_sweep(sim_dir, fork_at = 2002000000).plan(points)
+	assert groups == [[0], [1], [2, 3], [4, 5]]
+	assert keys == own[:3] + [fork_key(own[2], own[3], 2002000000), own[4], fork_key(own[4], own[5], 2002000000)]
+
+def test_plan_heartbeats(sim_dir):
+	points = [(p, name, config.replace("HEARTBEAT_FILE", "#HEARTBEAT_FILE"), meta) for p, name, config, meta in expand({"utgt": [90, 95]})]
+	assert make_sweep(sim_dir).plan(points)[1] == [[0], [1]]
+	with pytest.raises(ValueError, match = "no heartbeats"):
+		make_sweep(sim_dir, fork_at = 2000500000).plan(points)
+	points = [(p, name, config.replace("HEARTBEAT_INTERVAL 10.0", "HEARTBEAT_INTERVAL 0"), meta) for p, name, config, meta in expand({"utgt": [90, 95]})]
+	with pytest.raises(ValueError, match = "no heartbeats"):
+		check_heartbeats(points)
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_run_fork(sim_dir, monkeypatch, cache):
+	points = expand({"utgt": [90, 95], "down": ["0 0 0", DOWN]})
+	names = [name for p, name, config, meta in points]
+	cache_dir = os.path.join(sim_dir, "cache") if cache else None
+	# the continuations of hp95 fail, and the base (hp90) exits 0
+	monkeypatch.setenv("FAKE_FAIL", "U_TARGET 0.95\n")
+	s = make_sweep(sim_dir, cache_dir = cache_dir, fork_at = 2000500000)
+	assert s.run(points) == 2
+	state = load_state(s.state_file)
+	assert [state[name]["status"] for name in names] == ["done", "failed", "done", "failed"]
+	assert [state[name].get("fork", {}).get("base") for name in names] == [None, names[0], names[0], names[0]]
+	# the base runs its config with the forks, and the continuations their fork configs (in the cache, with one)
+	ran = [fct_lines(sim_dir, names[i]) for i in (0, 2)]
+	if cache:
+		assert ran[0][0].endswith("/run_config.txt") and ran[1][0].endswith("/fork_config.txt")
+	else:
+		assert ran == [["ran mix/fork_fat_flow_hp90.txt"], ["ran mix/fork_fat_flow_hp90_down.txt"]]
+
+	# the base fails, and the continuations that get to their final heartbeat are done although the process failed
+	monkeypatch.setenv("FAKE_FAIL", "U_TARGET 0.9\n")
+	s = make_sweep(sim_dir, cache_dir = cache_dir, fork_at = 2000500000, force = True)
+	assert s.run(points) == 2
+	state = load_state(s.state_file)
+	assert [state[name]["status"] for name in names] == ["failed", "done", "failed", "done"]
+	assert all(state[name]["returncode"] == 1 for name in names)
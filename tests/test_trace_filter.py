@@ -0,0 +1,57 @@
+import subprocess
+import numpy as np
+import pytest
+from conftest import write_trace, same_records
+from trace_reader import Trace, TRACE_DTYPE, format_record
+from trace_filter import TraceFilter
+
+T = 2000000000
+
+# expressions and the records that pass them, written directly over the columns
+CASES = [
+	("time>=%d&time<%d"%(T + 10000, T + 20000), lambda r: (r["time"] >= T + 10000) & (r["time"] < T + 20000)),
+	("time=%d"%(T + 24708), lambda r: r["time"] == T + 24708),
+	("node=3", lambda r: r["node"] == 3),
+	("node=0x40&event!=3", lambda r: (r["node"] == 64) & (r["event"] != 3)),
+	("sip=0x0b000101&l3Prot=0x11", lambda r: (r["sip"] == 0x0b000101) & (r["l3Prot"] == 0x11)),
+	("data.sport=10013", lambda r: r["data"]["sport"] == 10013),
+	# the right side of & is the whole rest of the expression
+	("event=3&node<10|node>70", lambda r: (r["event"] == 3) & ((r["node"] < 10) | (r["node"] > 70))),
+	("(event=3&node<10)|node>70", lambda r: ((r["event"] == 3) & (r["node"] < 10)) | (r["node"] > 70)),
+	("(time<%d|time>%d)&nodeType=1"%(T + 5000, T + 45000), lambda r: ((r["time"] < T + 5000) | (r["time"] > T + 45000)) & (r["nodeType"] == 1)),
+	("queue=5,1,3", lambda r: (r["node"] == 5) & (r["intf"] == 1) & (r["qidx"] == 3)),
+	("qlen<0400", lambda r: r["qlen"] < 256), # octal,
+]
+
+@pytest.fixture(scope = "module")
+def trace(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("trace") / "mix.tr")
+	return path, write_trace(path)
+
+def filtered(parts):
+	parts = list(parts)
+	return np.concatenate(parts) if parts else np.zeros(0, TRACE_DTYPE)
+
+@pytest.mark.parametrize("expr, expect", CASES)
+def test_filter(trace, expr, expect):
+	path, records = trace
+	assert np.array_equal(TraceFilter(expr).test(records), expect(records))
+	# in blocks and seeking to the time range of the filter, it gets the same records as a full scan
+	got = filtered(Trace(path).filter(expr, block = 300))
+	assert same_records(got, records[expect(records)])
+
+# the C++ reader, with the filter of trace_filter.hpp, prints the same records
+@pytest.mark.parametrize("expr, expect", CASES)
+def test_same_as_cpp(trace, cpp_reader, expr, expect):
+	path, records = trace
+	cpp = subprocess.check_output([cpp_reader, path, expr]).decode().splitlines()
+	assert cpp == [format_record(r) for r in records[expect(records)]]
+
+def test_no_filter(trace):
+	path, records = trace
+	assert same_records(filtered(Trace(path).filter(None, block = 700)), records)
+
+@pytest.mark.parametrize("expr", ["node", "node=3&", "(node=3", "foo=1", "flow=1,2,3"])
+def test_invalid(expr):
+	with pytest.raises(ValueError):
+		TraceFilter(expr)
@@ -0,0 +1,68 @@
+import subprocess
+import numpy as np
+import pytest
+from conftest import write_trace, same_records
+from trace_reader import Trace, TRACE_DTYPE, format_record
+from trace_filter import TraceFilter
+from trace_index import build_index, load_index, index_path
+from test_trace_filter import CASES
+
+# more expressions the index can decide on: flows (sip, dip, ports, l3Prot) and nodes
+EXPRS = [e for e, f in CASES] + ["flow=0x0b000101,0x0b000201,10017,100", "biflow=0x0b000101,0x0b000201,10017,100", "rflow=0x0b000201,0x0b000101,100,10017",
+	"sip=0x0b000301&dip!=0x0b000101", "l3Prot=0xFE|l3Prot=0xFF", "node=79", "node=100", "data.dport=101", "dip>0x0b000301&time<%d"%(2000000000 + 30000)]
+
+BLOCK = 64
+
+@pytest.fixture(scope = "module")
+def trace(tmp_path_factory):
+	path = str(tmp_path_factory.mktemp("trace") / "mix.tr")
+	records = write_trace(path)
+	build_index(path, BLOCK)
+	return path, records
+
+def filtered(parts):
+	parts = list(parts)
+	return np.concatenate(parts) if parts else np.zeros(0, TRACE_DTYPE)
+
+@pytest.mark.parametrize("expr", EXPRS)
+def test_index_filter(trace, expr):
+	path, records = trace
+	expect = TraceFilter(expr).test(records)
+	assert same_records(filtered(Trace(path).filter(expr)), records[expect])
+	# the candidate blocks have all the blocks with records passing the filter
+	blocks = load_index(path).candidate_blocks(TraceFilter(expr))
+	assert blocks[np.unique(np.nonzero(expect)[0] // BLOCK)].all()
+
+# the C++ reader reads the blocks of the index too, and prints the same records
+@pytest.mark.parametrize("expr", EXPRS)
+def test_index_same_as_cpp(trace, cpp_reader, expr):
+	path, records = trace
+	cpp = subprocess.check_output([cpp_reader, path, expr]).decode().splitlines()
+	assert cpp == [format_record(r) for r in records[TraceFilter(expr).test(records)]]
+
+# the index skips blocks: a node or a flow is only in some of them
+def test_index_skips(trace):
+	path, records = trace
+	index = load_index(path)
+	assert index.n_block == (len(records) + BLOCK - 1) // BLOCK
+	for expr in ["node=3", "flow=0x0b000101,0x0b000201,10017,100", "time<%d"%(2000000000 + 5000), "node=100"]:
+		assert not index.candidate_blocks(TraceFilter(expr)).all()
+	assert not index.candidate_blocks(TraceFilter("node=100")).any()
+
+# an index of another version of the .tr file is not used
+def test_stale_index(tmp_path):
+	path = str(tmp_path / "mix.tr")
+	write_trace(path, 1000)
+	build_index(path, BLOCK)
+	records = write_trace(path, 2000, seed = 1)
+	assert load_index(path) is None
+	assert same_records(filtered(Trace(path).filter("node=3")), records[records["node"] == 3])
+
+def test_index_path(tmp_path):
+	path = str(tmp_path / "mix.tr")
+	write_trace(path, 100)
+	output = str(tmp_path / "other.idx")
+	build_index(path, BLOCK, output)
+	assert load_index(path) is None
+	build_index(path, BLOCK)
+	assert load_index(path) is not None and index_path(path) == path + ".idx"
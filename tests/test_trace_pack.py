@@ -0,0 +1,111 @@
+import os
+import shutil
+import subprocess
+import numpy as np
+import pytest
+from conftest import ROOT, write_trace, same_records
+from trace_reader import Trace, TRACE_DTYPE, open_trace, format_record
+from trace_pack import PackedTrace, pack, unpack, is_packed
+from test_trace_filter import CASES, T
+
+def filtered(parts):
+	parts = list(parts)
+	return np.concatenate(parts) if parts else np.zeros(0, TRACE_DTYPE)
+
+@pytest.fixture(scope = "module", params = [0, 6])
+def packed(tmp_path_factory, request):
+	d = tmp_path_factory.mktemp("trace")
+	path, output = str(d / "mix.tr"), str(d / "mix.trz")
+	records = write_trace(path)
+	pack(path, output, block = 300, level = request.param)
+	return path, output, records
+
+# a .tr file packed and unpacked is the same file
+def test_round_trip(packed, tmp_path):
+	path, output, records = packed
+	assert is_packed(output) and not is_packed(path)
+	back = str(tmp_path / "back.tr")
+	unpack(output, back)
+	with open(path, "rb") as a, open(back, "rb") as b:
+		assert a.read() == b.read()
+
+def test_read(packed):
+	path, output, records = packed
+	trace = open_trace(output)
+	assert isinstance(trace, PackedTrace)
+	assert len(trace) == len(records)
+	assert same_records(trace.records, records)
+	assert trace.win == 100000 and trace.port_speed == Trace(path).port_speed
+
+@pytest.mark.parametrize("lo, hi", [(None, None), (T + 10000, T + 20000), (T + 24708, T + 24709), (None, T + 3000), (T + 45000, None), (T + 20000, T + 20000)])
+def test_time_range(packed, lo, hi):
+	path, output, records = packed
+	assert same_records(PackedTrace(output).time_range(lo, hi), Trace(path).time_range(lo, hi))
+
+@pytest.mark.parametrize("expr, expect", CASES)
+def test_filter(packed, expr, expect):
+	path, output, records = packed
+	assert same_records(filtered(PackedTrace(output).filter(expr)), records[expect(records)])
+
+# a packed trace still being written has its complete blocks
+def test_cut(packed, tmp_path):
+	path, output, records = packed
+	with open(output, "rb") as f:
+		data = f.read()
+	cut = str(tmp_path / "cut.trz")
+	with open(cut, "wb") as f:
+		f.write(data[:-10])
+	trace = PackedTrace(cut)
+	n = len(trace)
+	assert n == len(records) // 300 * 300
+	assert same_records(trace.records, records[:n])
+
+# the C++ reader reads packed traces too, with the same output as from the .tr file
+@pytest.mark.parametrize("expr, expect", CASES[:4])
+def test_same_as_cpp(packed, cpp_reader, expr, expect):
+	path, output, records = packed
+	cpp = subprocess.check_output([cpp_reader, output, expr]).decode().splitlines()
+	assert cpp == subprocess.check_output([cpp_reader, path, expr]).decode().splitlines()
+	assert cpp == [format_record(r) for r in records[expect(records)]]
+
+# packs a .tr file with the TracePackWriter of the simulation: the file header, the SimSetting copied as is, then the records
+PACK_DRIVER = """
+#include <cstdlib>
+#include "trace-pack.h"
+int main(int argc, char** argv){
+	FILE *in = fopen(argv[1], "rb"), *out = fopen(argv[2], "wb");
+	ns3::TracePackWriter writer(out, atoi(argv[3]));
+	uint32_t n;
+	if (fread(&n, 4, 1, in) != 1)
+		return 1;
+	std::vector<char> setting(n * 11 + 4);
+	if (fread(&setting[0], 1, setting.size(), in) != setting.size())
+		return 1;
+	fwrite(&n, 4, 1, out);
+	fwrite(&setting[0], 1, setting.size(), out);
+	ns3::TraceFormat tr;
+	while (tr.Deserialize(in) > 0)
+		writer.Write(tr);
+	writer.Flush();
+	fclose(out);
+	return 0;
+}
+"""
+
+# the traces packed by the simulation, with or without zlib, are read back as the same records
+@pytest.mark.parametrize("zlib", [True, False])
+def test_simulation_writer(packed, tmp_path, zlib):
+	if shutil.which("g++") is None:
+		pytest.skip("no g++ to build trace-pack.cc")
+	path, output, records = packed
+	src, binary, out = str(tmp_path / "pack.cc"), str(tmp_path / "pack"), str(tmp_path / "sim.trz")
+	with open(src, "w") as f:
+		f.write(PACK_DRIVER)
+	model = os.path.join(ROOT, "simulation", "src", "point-to-point", "model")
+	subprocess.check_call(["g++", src, os.path.join(model, "trace-pack.cc"), "-I", model, "-o", binary, "-O2"] + (["-DHAVE_ZLIB", "-lz"] if zlib else []))
+	subprocess.check_call([binary, path, out, "300"])
+	assert same_records(PackedTrace(out).records, records)
+	back = str(tmp_path / "back.tr")
+	unpack(out, back)
+	with open(path, "rb") as a, open(back, "rb") as b:
+		assert a.read() == b.read()
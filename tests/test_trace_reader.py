@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from conftest import ROOT, write_trace, write_records, same_records
+from trace_reader import Trace, TRACE_DTYPE, format_record, L3_TCP
+
+# records of every l3Prot (and an unknown one), with random bytes in every field of the union and in ecn
+def every_kind(path, n = 2000):
+	r = write_trace(path, n)
+	rng = np.random.RandomState(1)
+	raw = r.view(np.uint8).reshape(n, TRACE_DTYPE.itemsize)
+	raw[:, 32:56] = rng.randint(0, 256, (n, 24))
+	r["ecn"] = rng.randint(0, 4, n)
+	r["l3Prot"] = np.array([0x11, L3_TCP, 0xFC, 0xFD, 0xFE, 0xFF, 0x0, 0x42])[np.arange(n) % 8]
+	write_records(path, r)
+	return r
+
+# format_record prints each kind of record as print_trace of utils.hpp does
+def test_format_same_as_cpp(tmp_path, cpp_reader):
+	path = str(tmp_path / "mix.tr")
+	r = every_kind(path)
+	cpp = subprocess.check_output([cpp_reader, path]).decode().splitlines()
+	assert len(cpp) == len(r)
+	for i in range(8):
+		assert [format_record(x) for x in r[i::8]] == cpp[i::8]
+	py = subprocess.check_output([sys.executable, os.path.join(ROOT, "analysis", "trace_reader.py"), path]).decode().splitlines()
+	assert py == cpp
+
+def test_trace(tmp_path):
+	path = str(tmp_path / "mix.tr")
+	r = write_trace(path)
+	trace = Trace(path)
+	assert trace.win == 100000
+	assert trace.port_speed == {0: {1: 100000000000}, 1: {1: 100000000000}, 64: {1: 400000000000}}
+	assert len(trace) == len(r) and same_records(trace.records, r)
+	lo, hi = r["time"][100], r["time"][200]
+	assert same_records(trace.time_range(lo, hi), r[(r["time"] >= lo) & (r["time"] < hi)])
+	assert same_records(trace.time_range(hi), r[r["time"] >= hi])
+
+# a record cut by the end of the file, as while the simulation is still writing it, is left out
+def test_cut_record(tmp_path):
+	path = str(tmp_path / "mix.tr")
+	r = write_trace(path, 10)
+	with open(path, "ab") as f:
+		f.write(b"\0" * 20)
+	assert same_records(Trace(path).records, r)
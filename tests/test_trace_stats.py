@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from conftest import ROOT
+from flow_file import open_flow_writer
+from topology import Topology
+from trace_stats import add_pair_bytes, ecmp_link_bytes
+
+def trace_stats(path, *args):
+	cmd = [sys.executable, os.path.join(ROOT, "traffic_gen", "trace_stats.py"), path] + list(args)
+	return subprocess.check_output(cmd, cwd = os.path.join(ROOT, "traffic_gen")).decode()
+
+def write_flows(path, t):
+	n = len(t)
+	writer = open_flow_writer(path, "bin")
+	writer.write(np.arange(n) % 4, (np.arange(n) + 1) % 4, np.full(n, 1000), np.array(t))
+	writer.close()
+
+# flows that all start at the same time have no duration, so the loads are not known
+def test_no_duration(tmp_path):
+	path = str(tmp_path / "flow.bin")
+	write_flows(path, [2000000000] * 3)
+	out = trace_stats(path, "-n", "4", "--topo", os.path.join(ROOT, "simulation", "mix", "topology.txt"))
+	# the per-host and the per-link loads
+	assert out.count("n/a, the duration is 0") == 2
+	assert "inf" not in out
+	# with the duration given, they are
+	out = trace_stats(path, "-n", "4", "-t", "0.001")
+	assert "n/a" not in out and "tx: mean" in out
+
+def test_load(tmp_path):
+	path = str(tmp_path / "flow.bin")
+	# 1250B per host over 1ms at 10Gbps: a load of 0.001
+	write_flows(path, 2000000000 + np.arange(8) * 1000000 // 8)
+	out = trace_stats(path, "-n", "4", "-t", "0.001")
+	assert "tx: mean 0.002 min 0.002 max 0.002" in out
+
+# the pair bytes summed over chunks are the dense traffic matrix
+def test_pair_bytes():
+	rng = np.random.RandomState(0)
+	nhost = 7
+	pair_key, pair_bytes = np.zeros(0, dtype = np.int64), np.zeros(0)
+	dense = np.zeros((nhost, nhost))
+	for n in [0, 5, 100, 1]:
+		s, d, size = rng.randint(0, nhost, n), rng.randint(0, nhost, n), rng.randint(1, 10000, n).astype(np.float64)
+		pair_key, pair_bytes = add_pair_bytes(pair_key, pair_bytes, d * nhost + s, size)
+		np.add.at(dense, (s, d), size)
+	assert (np.diff(pair_key) > 0).all()
+	assert np.array_equal(np.sort(pair_key), np.sort(np.nonzero(dense.T.ravel())[0]))
+	assert np.allclose(pair_bytes, dense.T.ravel()[pair_key])
+
+# every byte leaves its source on the host link, and gets to its destination on the host link
+def test_ecmp_link_bytes():
+	topo = Topology(os.path.join(ROOT, "simulation", "mix", "fat.txt"))
+	host_ids = topo.hosts
+	nhost = len(host_ids)
+	rng = np.random.RandomState(1)
+	s, d = rng.randint(0, nhost, 200), rng.randint(0, nhost, 200)
+	s, d = s[s != d], d[s != d]
+	size = rng.randint(1, 100000, len(s)).astype(np.float64)
+	key, b = add_pair_bytes(np.zeros(0, dtype = np.int64), np.zeros(0), d * nhost + s, size)
+	link = ecmp_link_bytes(topo, host_ids, key, b)
+	for i, h in enumerate(host_ids):
+		sw = topo.rack[h]
+		assert np.isclose(link.get((h, sw), 0.), size[s == i].sum())
+		assert np.isclose(link.get((sw, h), 0.), size[d == i].sum())
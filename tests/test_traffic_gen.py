@@ -0,0 +1,131 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from conftest import ROOT
+from custom_rand import CustomRand
+from flow_file import read_flows
+from patterns import HostSet, parse_pattern
+from schedule import LoadSchedule
+from traffic_gen import make_sources, gen_chunks, gen_chunks_parallel
+
+def read_text_flows(path):
+	with open(path, "r") as f:
+		lines = f.read().splitlines()
+	return lines[0], lines[1:]
+
+def traffic_gen(*args):
+	cmd = [sys.executable, os.path.join(ROOT, "traffic_gen", "traffic_gen.py"), "-c", "WebSearch_distribution.txt"] + list(args)
+	return subprocess.check_output(cmd, cwd = os.path.join(ROOT, "traffic_gen")).decode()
+
+# the flows are written chunk by chunk, in time order, and the header still counts all of them
+def test_chunks(tmp_path):
+	path = str(tmp_path / "flow.txt")
+	traffic_gen("-n", "16", "-t", "0.01", "-s", "1", "-C", "0.0003", "-o", path)
+	header, flows = read_text_flows(path)
+	assert int(header) == len(flows) > 0
+	t = [float(f.split()[5]) for f in flows]
+	assert t == sorted(t)
+
+def test_chunk_size(tmp_path):
+	for chunk in ["0", "-0.001", "1e-12"]:
+		out = traffic_gen("-n", "16", "-t", "0.01", "-C", chunk, "-o", str(tmp_path / "flow.txt"))
+		assert "the chunk must be at least 1ns" in out
+
+def web_search():
+	cdf = []
+	for line in open(os.path.join(ROOT, "traffic_gen", "WebSearch_distribution.txt"), "r"):
+		x, y = map(float, line.strip().split(' '))
+		cdf.append([x, y])
+	customRand = CustomRand()
+	assert customRand.setCdf(cdf, 4096)
+	return customRand
+
+# two burst patterns at the same period start flows at the same time from the same hosts, so the order of the ties
+# across sources must not depend on how the sources are spread over workers
+def sources(seed = 1, specs = ["uniform", "alltoall:period=0.001", "incast:period=0.001,fanin=4", "alltoall:period=0.001,size=1000"]):
+	hosts = HostSet(range(40), 10e9)
+	return make_sources([parse_pattern(p) for p in specs], seed, hosts, 8, 0.3, web_search(), 0, 20000000)
+
+def collect(chunks):
+	return [np.concatenate(c) for c in zip(*list(chunks))]
+
+def test_gen_is_sorted():
+	src, dst, size, t, dport = collect(gen_chunks(sources(), 0, 20000000, 2000000))
+	assert len(t) > 0
+	assert (np.diff(t) >= 0).all()
+	assert (src != dst).all()
+
+# the shards have their own random streams, and ties are ordered by the index of their source
+def test_gen_independent_of_workers():
+	ref = collect(gen_chunks(sources(), 0, 20000000, 2000000))
+	for n_worker in [2, 3, 5]:
+		got = collect(gen_chunks_parallel(sources(), 0, 20000000, 2000000, n_worker))
+		for a, b in zip(ref, got):
+			assert np.array_equal(a, b)
+
+def test_gen_depends_on_seed():
+	a = collect(gen_chunks(sources(1), 0, 20000000, 2000000))
+	b = collect(gen_chunks(sources(2), 0, 20000000, 2000000))
+	assert len(a[3]) != len(b[3]) or not np.array_equal(a[3], b[3])
+
+def test_workers(tmp_path):
+	outputs = []
+	for w in ["1", "3"]:
+		outputs.append(str(tmp_path / ("flow_%s.txt"%w)))
+		traffic_gen("-n", "100", "-t", "0.005", "-s", "7", "--shard", "16", "-w", w, "-p", "uniform", "-p", "alltoall:period=0.001", "-p", "incast:period=0.001,fanin=8", "-o", outputs[-1])
+	with open(outputs[0], "r") as a, open(outputs[1], "r") as b:
+		assert a.read() == b.read()
+
+def test_formats(tmp_path):
+	text, bin = str(tmp_path / "flow.txt"), str(tmp_path / "flow.bin")
+	traffic_gen("-n", "16", "-t", "0.01", "-s", "3", "-o", text)
+	traffic_gen("-n", "16", "-t", "0.01", "-s", "3", "-f", "bin", "-o", bin)
+	a, b = list(read_flows(text)), list(read_flows(bin))
+	for k in ["src", "dst", "pg", "dport", "size", "start_ns"]:
+		assert np.array_equal(np.concatenate([x[k] for x in a]), np.concatenate([x[k] for x in b]))
+
+# a period under 1ns would never advance the bursts
+@pytest.mark.parametrize("spec", ["incast:period=0,fanin=4", "alltoall:period=1e-10", "alltoall:period=-1"])
+def test_burst_period(spec):
+	with pytest.raises(ValueError):
+		sources(specs = [spec])
+
+def test_pattern_errors(tmp_path):
+	for spec in ["incast:period=0,fanin=4", "nosuch", "rack:local"]:
+		out = traffic_gen("-n", "16", "-t", "0.01", "-p", spec, "-o", str(tmp_path / "flow.txt"))
+		assert out.startswith("Error: ")
+
+# with a topology, flows are only between its hosts, at the rate of each host's link
+def test_topo(tmp_path):
+	path = str(tmp_path / "flow.bin")
+	traffic_gen("--topo", os.path.join(ROOT, "simulation", "mix", "fat.txt"), "-n", "64", "-t", "0.001", "-s", "1", "-p", "rack:local=0.5", "-f", "bin", "-o", path)
+	flows = list(read_flows(path))
+	src, dst = np.concatenate([f["src"] for f in flows]), np.concatenate([f["dst"] for f in flows])
+	assert len(src) > 0 and src.max() < 64 and dst.max() < 64 and (src != dst).all()
+
+# the number of flows started in each window of 10ms, against what the load of the schedule over the window gives,
+# within 5 standard deviations of a Poisson count. The trace goes on after the last window, since the last flow of
+# each host is dropped when its next arrival would be after the end of the trace.
+def check_schedule(schedule, expected_load):
+	hosts = HostSet(range(200), 10e9)
+	customRand = web_search()
+	srcs = make_sources([parse_pattern("uniform")], 1, hosts, 8, 0.5, customRand, 0, 60000000, schedule)
+	t = collect(gen_chunks(srcs, 0, 60000000, 2000000))[3]
+	counts = np.bincount(t // 10000000, minlength = 4)[:4]
+	for n, l in zip(counts, expected_load):
+		expected = l * 10e9 / 8 / customRand.getAvg() * 200 * 0.01
+		assert abs(n - expected) < 5 * np.sqrt(expected)
+
+def test_schedule_step():
+	check_schedule(LoadSchedule([(0, 0.3), (0.02, 0.9)]), [0.3, 0.3, 0.9, 0.9])
+
+def test_schedule_ramp():
+	# the mean load over each window is the load at its middle
+	check_schedule(LoadSchedule([(0, 0.), (0.04, 0.8)], ramp = True), [0.1, 0.3, 0.5, 0.7])
+
+def test_schedule_errors():
+	for points in [[], [(0, 0.3), (0.01, -0.1)], [(0, 0.)]]:
+		with pytest.raises(ValueError):
+			LoadSchedule(points)
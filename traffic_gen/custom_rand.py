@@ -1,4 +1,7 @@
 import random
+from bisect import bisect_left
+import numpy as np
+
 class CustomRand:
 	def __init__(self):
 		pass
@@ -11,46 +14,74 @@ class CustomRand:
 			if cdf[i][1] <= cdf[i-1][1] or cdf[i][0] <= cdf[i-1][0]:
 				return False
 		return True
-	def setCdf(self, cdf):
+	# lut_size > 0 builds a lookup table of lut_size equal-width percentile cells; a draw whose cell lies within one cdf segment finds it in O(1)
+	def setCdf(self, cdf, lut_size = 0):
 		if not self.testCdf(cdf):
 			return False
 		self.cdf = cdf
+		# sorted arrays for binary search
+		self.xs = [float(c[0]) for c in cdf]
+		self.ys = [float(c[1]) for c in cdf]
+		self.x_arr = np.array(self.xs)
+		self.y_arr = np.array(self.ys)
+		self.slope = np.diff(self.x_arr) / np.diff(self.y_arr)
+		# integral[i] is getIntegralY(ys[i]), the average contributed by the first i segments
+		self.integral = [0.]
+		for i in range(1, len(cdf)):
+			x0, y0 = self.cdf[i-1]
+			x1, y1 = self.cdf[i]
+			self.integral.append(self.integral[-1] + 0.5 * (x1 + x0) * (y1 - y0) / 100.)
+		self.avg = self.integral[-1]
+		self.lut = None
+		if lut_size > 0:
+			lo = np.searchsorted(self.y_arr, np.arange(lut_size) * 100. / lut_size, 'left')
+			hi = np.searchsorted(self.y_arr, np.arange(1, lut_size + 1) * 100. / lut_size, 'left')
+			# -1 marks a cell that contains a cdf point, which falls back to binary search
+			self.lut = np.where(lo == hi, lo.clip(1, len(cdf) - 1), -1)
 		return True
 	def getAvg(self):
-		s = 0
-		last_x, last_y = self.cdf[0]
-		for c in self.cdf[1:]:
-			x, y = c
-			s += (x + last_x)/2.0 * (y - last_y)
-			last_x = x
-			last_y = y
-		return s/100
-	def rand(self):
-		r = random.random() * 100
-		return self.getValueFromPercentile(r)
+		return self.avg
+	# rand() draws one value; rand(n) draws an array of n values, from `rng` (a numpy RandomState) if given
+	def rand(self, n = None, rng = None):
+		if n is None:
+			r = random.random() * 100
+			return self.getValueFromPercentile(r)
+		if rng is None:
+			rng = np.random
+		return self.getValuesFromPercentiles(rng.random_sample(n) * 100)
 	def getPercentileFromValue(self, x):
-		if x < 0 or x > self.cdf[-1][0]:
+		if x < 0 or x > self.xs[-1]:
 			return -1
-		for i in range(1, len(self.cdf)):
-			if x <= self.cdf[i][0]:
-				x0, y0 = self.cdf[i-1]
-				x1, y1 = self.cdf[i]
-				return y0 + (y1-y0)/(x1-x0)*(x-x0)
+		i = bisect_left(self.xs, x, 1)
+		x0, y0 = self.cdf[i-1]
+		x1, y1 = self.cdf[i]
+		return y0 + (y1-y0)/(x1-x0)*(x-x0)
+	# vectorized getPercentileFromValue, x is an array of values in [0, largest value]
+	def getPercentilesFromValues(self, x):
+		x = np.asarray(x, dtype = np.float64)
+		i = np.searchsorted(self.x_arr, x, 'left').clip(1, len(self.xs) - 1)
+		return self.y_arr[i-1] + (self.y_arr[i] - self.y_arr[i-1]) / (self.x_arr[i] - self.x_arr[i-1]) * (x - self.x_arr[i-1])
 	def getValueFromPercentile(self, y):
-		for i in range(1, len(self.cdf)):
-			if y <= self.cdf[i][1]:
-				x0,y0 = self.cdf[i-1]
-				x1,y1 = self.cdf[i]
-				return x0 + (x1-x0)/(y1-y0)*(y-y0)
+		i = bisect_left(self.ys, y, 1)
+		if i >= len(self.ys):
+			return None
+		x0,y0 = self.cdf[i-1]
+		x1,y1 = self.cdf[i]
+		return x0 + (x1-x0)/(y1-y0)*(y-y0)
+	# vectorized getValueFromPercentile, y is an array of percentiles in [0, 100]
+	def getValuesFromPercentiles(self, y):
+		y = np.asarray(y, dtype = np.float64)
+		if self.lut is None:
+			i = np.searchsorted(self.y_arr, y, 'left').clip(1, len(self.ys) - 1)
+		else:
+			i = self.lut[np.minimum((y * (len(self.lut) / 100.)).astype(np.int64), len(self.lut) - 1)]
+			miss = i < 0
+			i[miss] = np.searchsorted(self.y_arr, y[miss], 'left').clip(1, len(self.ys) - 1)
+		return self.x_arr[i-1] + self.slope[i-1] * (y - self.y_arr[i-1])
 	def getIntegralY(self, y):
-		s = 0
-		for i in range(1, len(self.cdf)):
-			x0, y0 = self.cdf[i-1]
-			x1, y1 = self.cdf[i]
-			if y <= self.cdf[i][1]:
-				s += 0.5 * (x0 + x0+(x1-x0)/(y1-y0)*(y-y0))*(y-y0) / 100.
-				break
-			else:
-				s += 0.5 * (x1 + x0) * (y1 - y0) / 100.
-
-		return s
+		i = bisect_left(self.ys, y, 1)
+		if i >= len(self.ys):
+			return self.integral[-1]
+		x0, y0 = self.cdf[i-1]
+		x1, y1 = self.cdf[i]
+		return self.integral[i-1] + 0.5 * (x0 + x0+(x1-x0)/(y1-y0)*(y-y0))*(y-y0) / 100.
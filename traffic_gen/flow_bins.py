@@ -1,52 +1,135 @@
+import os
 import sys
-import random
-import math
-import heapq
+import hashlib
+import numpy as np
 from optparse import OptionParser
 from custom_rand import CustomRand
 
-if __name__ == "__main__":
-	parser = OptionParser()
-	parser.add_option("-c", "--cdf", dest = "cdf_file", help = "the file of the traffic size cdf", default = "uniform_distribution.txt")
-	options,args = parser.parse_args()
+# Flow size bins of a cdf, for the -S option of analysis/fct_analysis: each bin is (size, percentile), the largest
+# flow size of the bin and the percentile of that size in the cdf. Bins are sorted by size and the last one is the
+# largest size of the cdf, so every flow falls in one bin.
+#   halving: walk down from the largest size 1 percentile at a time, but never more than halving the size (above 1000B)
+#   equal:   n bins of equal probability
+#   log:     n bins of log-spaced sizes
+METHODS = ("halving", "equal", "log")
 
-	fileName = options.cdf_file
-	file = open(fileName,"r")
-	lines = file.readlines()
-	# read the cdf, save in cdf as [[x_i, cdf_i] ...]
+def read_cdf(fileName):
 	cdf = []
-	for line in lines:
-		x,y = map(float, line.strip().split(' '))
-		cdf.append([x,y])
-
-	# create a custom random generator, which takes a cdf, and generate number according to the cdf
-	customRand = CustomRand()
-	if not customRand.setCdf(cdf):
-		print "Error: Not valid cdf"
-		sys.exit(0)
+	for line in open(fileName, "r"):
+		x, y = map(float, line.strip().split(' '))
+		cdf.append([x, y])
+	return cdf
 
+def halving_bins(customRand):
+	# the same walk as the original flow_bins.py; it is at most ~100 steps plus one per halving
 	x = int(customRand.getValueFromPercentile(100))
 	p = 100.
 	bins = []
 	while x > 0:
-		if (len(bins) == 0 or x != bins[-1]):
+		if len(bins) == 0 or x != bins[-1]:
 			bins.append(x)
-		if (p > 2):
-			p1 = p-1
+		if p > 2:
+			p1 = p - 1
 		elif p > 1:
 			p1 = 1
 		else:
 			break
 		x1 = int(customRand.getValueFromPercentile(p1))
-		if x1 < x/2 and x > 1000:
-			x1 = x / 2
+		if x1 < x // 2 and x > 1000:
+			x1 = x // 2
 			p1 = customRand.getPercentileFromValue(x1)
 		if p1 < 0:
-			print "error"
-			print p1, bins
-			sys.exit(0)
+			raise ValueError("percentile out of range at size %d"%x1)
 		x = x1
 		p = p1
-	bins.sort()
-	for x in bins:
-		print x, customRand.getPercentileFromValue(x)
+	return np.unique(np.array(bins, dtype = np.int64))
+
+def equal_bins(customRand, n):
+	p = np.arange(1, n + 1) * 100. / n
+	return np.unique(customRand.getValuesFromPercentiles(p).astype(np.int64))
+
+def log_bins(customRand, n):
+	lo = max(customRand.x_arr[customRand.x_arr > 0].min(), 1)
+	hi = customRand.x_arr[-1]
+	return np.unique(np.geomspace(lo, hi, n).astype(np.int64))
+
+# return (sizes, percentiles) of the bins of the cdf in customRand
+def get_bins(customRand, method = "halving", n = 20):
+	if method == "halving":
+		x = halving_bins(customRand)
+	elif method == "equal":
+		x = equal_bins(customRand, n)
+	elif method == "log":
+		x = log_bins(customRand, n)
+	else:
+		raise ValueError("unknown method: %s"%method)
+	x = x[x > 0]
+	# the largest bin always covers the largest flow
+	top = int(customRand.x_arr[-1])
+	if len(x) == 0 or x[-1] < top:
+		x = np.append(x, top)
+	return x, customRand.getPercentilesFromValues(x)
+
+# a percentile as the original flow_bins.py printed it (python 2's str of a float: 12 significant digits, and ".0" if integral)
+def format_pct(p):
+	s = "%.12g"%p
+	if s.lstrip("-").isdigit():
+		s += ".0"
+	return s
+
+def format_bins(sizes, pcts):
+	return "".join("%d %s\n"%(x, format_pct(p)) for x, p in zip(sizes.tolist(), pcts.tolist()))
+
+def parse_bins(text):
+	a = np.array(text.split(), dtype = np.float64).reshape(-1, 2)
+	return a[:, 0].astype(np.int64), a[:, 1]
+
+# the cache file of the bins, next to the cdf file; it is keyed by the hash of the cdf file, so editing the cdf
+# file never reuses stale bins
+def cache_path(cdf_file, method, n):
+	with open(cdf_file, "rb") as f:
+		digest = hashlib.sha1(f.read()).hexdigest()[:16]
+	d, name = os.path.split(os.path.abspath(cdf_file))
+	key = method if method == "halving" else "%s%d"%(method, n)
+	return os.path.join(d, ".%s.%s.%s.bins"%(name, key, digest))
+
+# bins of a cdf file, read from the cache if it was computed before
+def load_bins(cdf_file, method = "halving", n = 20, cache = True):
+	path = cache_path(cdf_file, method, n) if cache else None
+	if path is not None and os.path.exists(path):
+		with open(path, "r") as f:
+			return parse_bins(f.read())
+	customRand = CustomRand()
+	if not customRand.setCdf(read_cdf(cdf_file)):
+		raise ValueError("not a valid cdf: %s"%cdf_file)
+	sizes, pcts = get_bins(customRand, method, n)
+	if path is not None:
+		# write to a temporary file and rename, so that a concurrent reader never sees half a file
+		tmp = "%s.%d"%(path, os.getpid())
+		try:
+			with open(tmp, "w") as f:
+				f.write(format_bins(sizes, pcts))
+			os.rename(tmp, path)
+		except (IOError, OSError):
+			pass # e.g., the folder is read-only; the bins are still returned
+	return sizes, pcts
+
+if __name__ == "__main__":
+	parser = OptionParser()
+	parser.add_option("-c", "--cdf", dest = "cdf_file", help = "the file of the traffic size cdf", default = "uniform_distribution.txt")
+	parser.add_option("-m", "--method", dest = "method", help = "how to choose the bins: %s; by default halving"%"|".join(METHODS), default = "halving")
+	parser.add_option("-n", "--nbins", dest = "nbins", type = "int", help = "the number of bins of the equal and log methods, by default 20", default = 20)
+	parser.add_option("-o", "--output", dest = "output", help = "the output file, by default stdout")
+	parser.add_option("--no-cache", dest = "cache", action = "store_false", help = "do not read or write the cache file next to the cdf file", default = True)
+	options,args = parser.parse_args()
+
+	if options.method not in METHODS:
+		print("Error: unknown method %s"%options.method)
+		sys.exit(0)
+	try:
+		sizes, pcts = load_bins(options.cdf_file, options.method, options.nbins, options.cache)
+	except ValueError as e:
+		print("Error: %s"%e)
+		sys.exit(0)
+	out = open(options.output, "w") if options.output else sys.stdout
+	out.write(format_bins(sizes, pcts))
@@ -0,0 +1,119 @@
+import mmap
+import numpy as np
+
+# Binary flow file, read by the simulator (scratch/third.cc) through mmap.
+# All integers are little-endian.
+#   header: magic "HPCCFLOW" (8B), number of flows (uint64)
+#   blocks: number of flows n in the block (uint64), then the columns of the n flows:
+#           start_ns (uint64), size (uint64), src (uint32), dst (uint32), pg (uint16), dport (uint16),
+#           then zero padding to a multiple of 8B, so that every block (and every column) is aligned.
+MAGIC = b"HPCCFLOW"
+HEADER_SIZE = 16
+COLUMNS = [("start_ns", "<u8"), ("size", "<u8"), ("src", "<u4"), ("dst", "<u4"), ("pg", "<u2"), ("dport", "<u2")]
+FLOW_BYTES = sum(np.dtype(d).itemsize for _, d in COLUMNS)
+
+def block_bytes(n):
+	return (8 + n * FLOW_BYTES + 7) // 8 * 8
+
+class FlowWriter:
+	# The first line of the flow file is the number of flows, which is only known at the end.
+	# We reserve a fixed-width first line and patch it in place on close, so the count can never overwrite the first flow.
+	HEADER_WIDTH = 20
+
+	def __init__(self, output):
+		self.file = open(output, "w")
+		self.file.write(" " * self.HEADER_WIDTH + "\n")
+		self.n_flow = 0
+
+	# pg and dport are either a scalar or an array
+	def write(self, src, dst, size, t, pg = 3, dport = 100, batch = 1 << 16):
+		n = len(t)
+		pg = np.broadcast_to(pg, (n,))
+		dport = np.broadcast_to(dport, (n,))
+		for i in range(0, n, batch):
+			j = i + batch
+			self.file.write("".join("%d %d %d %d %d %.9f\n"%f for f in zip(src[i:j].tolist(), dst[i:j].tolist(), pg[i:j].tolist(), dport[i:j].tolist(), size[i:j].tolist(), (t[i:j] * 1e-9).tolist())))
+		self.n_flow += n
+
+	def close(self):
+		self.file.seek(0)
+		self.file.write(("%d"%self.n_flow).ljust(self.HEADER_WIDTH))
+		self.file.close()
+
+class BinaryFlowWriter:
+	# flows are buffered until there are block_size of them, so that blocks are not too small
+	def __init__(self, output, block_size = 1 << 16):
+		self.file = open(output, "wb")
+		self.file.write(MAGIC + np.zeros(1, "<u8").tobytes())
+		self.block_size = block_size
+		self.buf = []
+		self.n_buf = 0
+		self.n_flow = 0
+
+	def write(self, src, dst, size, t, pg = 3, dport = 100):
+		n = len(t)
+		self.buf.append((t, size, src, dst, np.broadcast_to(pg, (n,)), np.broadcast_to(dport, (n,))))
+		self.n_buf += n
+		self.n_flow += n
+		if self.n_buf >= self.block_size:
+			self.flush()
+
+	def flush(self):
+		if self.n_buf == 0:
+			return
+		n = self.n_buf
+		self.file.write(np.array([n], "<u8").tobytes())
+		for c, (_, dtype) in enumerate(COLUMNS):
+			self.file.write(np.concatenate([b[c] for b in self.buf]).astype(dtype).tobytes())
+		self.file.write(b"\0" * (block_bytes(n) - 8 - n * FLOW_BYTES))
+		self.buf = []
+		self.n_buf = 0
+
+	def close(self):
+		self.flush()
+		self.file.seek(len(MAGIC))
+		self.file.write(np.array([self.n_flow], "<u8").tobytes())
+		self.file.close()
+
+def open_flow_writer(output, fmt = "text"):
+	if fmt == "bin":
+		return BinaryFlowWriter(output)
+	return FlowWriter(output)
+
+def is_binary(path):
+	with open(path, "rb") as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+# read a flow file (text or binary) in chunks of about `chunk` flows
+# yield dicts of arrays keyed by the column names; start_ns is in ns
+def read_flows(path, chunk = 1 << 20):
+	if is_binary(path):
+		with open(path, "rb") as f:
+			mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		off = HEADER_SIZE
+		while off < len(mm):
+			n = int(np.frombuffer(mm, "<u8", 1, off)[0])
+			col_off = off + 8
+			cols = {}
+			for name, dtype in COLUMNS:
+				cols[name] = np.frombuffer(mm, dtype, n, col_off)
+				col_off += n * np.dtype(dtype).itemsize
+			yield cols
+			off += block_bytes(n)
+		return
+	with open(path, "r") as f:
+		f.readline()
+		while True:
+			lines = f.readlines(chunk * 40)
+			if not lines:
+				break
+			a = np.array("".join(lines).split(), dtype = np.float64).reshape(-1, 6)
+			yield {"src": a[:, 0].astype(np.int64), "dst": a[:, 1].astype(np.int64), "pg": a[:, 2].astype(np.int64), "dport": a[:, 3].astype(np.int64), "size": a[:, 4].astype(np.int64), "start_ns": np.round(a[:, 5] * 1e9).astype(np.int64)}
+
+def read_flow_count(path):
+	if is_binary(path):
+		with open(path, "rb") as f:
+			f.seek(len(MAGIC))
+			return int(np.frombuffer(f.read(8), "<u8")[0])
+	with open(path, "r") as f:
+		return int(f.readline())
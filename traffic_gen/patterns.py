@@ -0,0 +1,166 @@
+import numpy as np
+
+# Workload patterns of traffic_gen.py. A pattern is given as name[:key=value,...], e.g. "rack:local=0.8".
+# Destination patterns choose the destinations of the Poisson traffic of each host.
+# Burst patterns generate their own flows at fixed periods.
+# All of them work on host positions 0..n-1 in HostSet; HostSet.ids maps positions to node ids.
+
+NORMAL_PORT = 100
+INCAST_PORT = 200
+
+class HostSet:
+	# bandwidth[i] is the NIC rate (bps) of the i-th host, a scalar if all are the same
+	# rack[i] is the rack (any integer label) of the i-th host, or None if unknown
+	def __init__(self, ids, bandwidth, rack = None):
+		self.ids = np.asarray(ids, dtype = np.int64)
+		self.n = len(self.ids)
+		self.bandwidth = np.broadcast_to(np.asarray(bandwidth, dtype = np.float64), self.ids.shape)
+		self.rack = None if rack is None else np.asarray(rack, dtype = np.int64)
+
+# uniform over all hosts but src
+def uniform_others(rng, n, src):
+	dst = rng.randint(0, n - 1, len(src))
+	return dst + (dst >= src)
+
+class UniformDst:
+	def __init__(self, hosts, rng):
+		self.n = hosts.n
+
+	def choose(self, rng, src):
+		return uniform_others(rng, self.n, src)
+
+class PermutationDst:
+	# every host sends to one fixed partner; partners form a random cyclic permutation, so no host sends to itself
+	def __init__(self, hosts, rng):
+		perm = rng.permutation(hosts.n)
+		self.partner = np.empty(hosts.n, dtype = np.int64)
+		self.partner[perm] = np.roll(perm, -1)
+
+	def choose(self, rng, src):
+		return self.partner[src]
+
+class RackDst:
+	# a fraction `local` of the flows go to another host in the same rack, the rest to a host in another rack
+	def __init__(self, hosts, rng, local = 0.5):
+		if hosts.rack is None:
+			raise ValueError("the rack pattern needs the topology file (--topo)")
+		self.local = local
+		self.n = hosts.n
+		self.rack = hosts.rack
+		# hosts sorted by rack; each rack is a contiguous range [start, start + size) of `members`
+		self.members = np.argsort(self.rack, kind = "mergesort")
+		self.idx = np.empty(self.n, dtype = np.int64)
+		self.idx[self.members] = np.arange(self.n)
+		_, first, count = np.unique(self.rack[self.members], return_index = True, return_counts = True)
+		label = np.repeat(np.arange(len(first)), count)[self.idx]
+		self.start = first[label]
+		self.size = count[label]
+
+	def choose(self, rng, src):
+		n = len(src)
+		start, size = self.start[src], self.size[src]
+		local = ((rng.random_sample(n) < self.local) & (size > 1)) | (size == self.n)
+		# in the rack: uniform over the other members
+		k = (rng.random_sample(n) * (size - 1)).astype(np.int64)
+		k += k >= self.idx[src] - start
+		in_rack = self.members[np.minimum(start + k, self.n - 1)]
+		# out of the rack: uniform over the members outside [start, start + size)
+		k = (rng.random_sample(n) * (self.n - size)).astype(np.int64)
+		k += (k >= start) * size
+		out_rack = self.members[np.minimum(k, self.n - 1)]
+		return np.where(local, in_rack, out_rack)
+
+class HotspotDst:
+	# a fraction `frac` of the flows go to one of `hot` random hot hosts, the rest are uniform
+	def __init__(self, hosts, rng, hot = 1, frac = 0.5):
+		self.n = hosts.n
+		self.hot = rng.choice(hosts.n, int(hot), replace = False)
+		self.frac = frac
+
+	def choose(self, rng, src):
+		dst = uniform_others(rng, self.n, src)
+		h = np.nonzero(rng.random_sample(len(src)) < self.frac)[0]
+		pick = self.hot[rng.randint(0, len(self.hot), len(h))]
+		# a hot host does not send to itself, it keeps the uniform dst
+		ok = pick != src[h]
+		dst[h[ok]] = pick[ok]
+		return dst
+
+class BurstSource:
+	# a burst of flows every `period` seconds, starting at `start`; size=0 draws the flow sizes from the cdf
+	def __init__(self, hosts, rng, customRand, start, end, period, size = 0):
+		self.hosts = hosts
+		self.rng = rng
+		self.customRand = customRand
+		self.period = int(period * 1e9)
+		if self.period <= 0:
+			raise ValueError("the period of a burst pattern must be at least 1ns, got %s"%period)
+		self.size = int(size)
+		self.end = end
+		self.next = start
+
+	# return (src, dst, size, t, dport) of the bursts that start before hi
+	def flows(self, hi):
+		t = np.arange(self.next, min(hi, self.end + 1), self.period, dtype = np.int64)
+		if len(t) > 0:
+			self.next = t[-1] + self.period
+		src, dst, t = self.burst(t)
+		n = len(t)
+		if self.size > 0:
+			size = np.full(n, self.size, dtype = np.int64)
+		else:
+			size = self.customRand.rand(n, self.rng).astype(np.int64)
+			size[size <= 0] = 1
+		return self.hosts.ids[src], self.hosts.ids[dst], size, t, np.full(n, self.dport, dtype = np.int64)
+
+class IncastSource(BurstSource):
+	# each burst is `fanin` random hosts sending to one random receiver at the same time
+	dport = INCAST_PORT
+
+	def __init__(self, hosts, rng, customRand, start, end, period, fanin, size = 0):
+		BurstSource.__init__(self, hosts, rng, customRand, start, end, period, size)
+		self.fanin = min(int(fanin), hosts.n - 1)
+
+	def burst(self, t):
+		m, n = len(t), self.hosts.n
+		recv = self.rng.randint(0, n, m)
+		# fanin distinct senders among the n-1 other hosts
+		senders = np.argsort(self.rng.random_sample((m, n - 1)), axis = 1)[:, :self.fanin]
+		senders += senders >= recv[:, None]
+		return senders.ravel(), np.repeat(recv, self.fanin), np.repeat(t, self.fanin)
+
+class AllToAllSource(BurstSource):
+	# each burst is every host sending one flow to every other host at the same time
+	dport = NORMAL_PORT
+
+	def burst(self, t):
+		n = self.hosts.n
+		src = np.repeat(np.arange(n), n - 1)
+		dst = np.tile(np.arange(n - 1), n)
+		dst += dst >= src
+		m = len(t)
+		return np.tile(src, m), np.tile(dst, m), np.repeat(t, n * (n - 1))
+
+DST_PATTERNS = {
+	"uniform": UniformDst,
+	"permutation": PermutationDst,
+	"rack": RackDst,
+	"hotspot": HotspotDst,
+}
+
+BURST_PATTERNS = {
+	"incast": IncastSource,
+	"alltoall": AllToAllSource,
+}
+
+# "name:k1=v1,k2=v2" -> (name, {k1: v1, k2: v2}), values are floats
+def parse_pattern(spec):
+	name, _, args = spec.partition(":")
+	params = {}
+	for kv in args.split(","):
+		if kv.strip():
+			k, v = kv.split("=")
+			params[k.strip()] = float(v)
+	if name not in DST_PATTERNS and name not in BURST_PATTERNS:
+		raise ValueError("unknown pattern: %s"%name)
+	return name, params
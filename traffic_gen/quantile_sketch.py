@@ -0,0 +1,80 @@
+import math
+import numpy as np
+
+# traffic_gen/quantile_sketch.py (for trace_stats.py) and analysis/quantile_sketch.py (for fct_analysis.py) are the same
+# file, as the scripts of each folder are run from that folder; keep the two copies the same.
+
+class LogSketch:
+	# A mergeable quantile sketch of non-negative values (like DDSketch): positive values are counted in log-spaced bins,
+	# bin i covering (gamma^(i-1), gamma^i] with gamma = (1+alpha)/(1-alpha), and zeros apart. Any quantile is then known
+	# within a relative error of alpha, and the memory only depends on the range of the values (log(max/min)/log(gamma)
+	# bins), not on how many values there are. Two sketches with the same alpha merge exactly, so shards can be sketched apart.
+	def __init__(self, alpha = 0.001):
+		self.alpha = alpha
+		self.gamma = (1 + alpha) / (1 - alpha)
+		self.log_gamma = math.log(self.gamma)
+		self.counts = np.zeros(0, dtype = np.int64)
+		self.offset = 0 # counts[j] is bin j + offset
+		self.zero = 0 # the number of zeros
+		self.min = float("inf")
+		self.max = float("-inf")
+
+	def add(self, x):
+		x = np.asarray(x, dtype = np.float64)
+		if len(x) == 0:
+			return
+		if (x < 0).any():
+			raise ValueError("LogSketch only takes non-negative values")
+		self.min = min(self.min, float(x.min()))
+		self.max = max(self.max, float(x.max()))
+		pos = x[x > 0]
+		self.zero += len(x) - len(pos)
+		if len(pos) == 0:
+			return
+		idx = self.index(pos)
+		lo = idx.min()
+		self.add_bins(lo, np.bincount(idx - lo))
+
+	# the bin of each positive value
+	def index(self, x):
+		return np.ceil(np.log(x) / self.log_gamma).astype(np.int64)
+
+	def add_bins(self, offset, counts):
+		if len(self.counts) == 0:
+			self.offset, self.counts = offset, counts.astype(np.int64)
+			return
+		lo = min(self.offset, offset)
+		hi = max(self.offset + len(self.counts), offset + len(counts))
+		c = np.zeros(hi - lo, dtype = np.int64)
+		c[self.offset - lo : self.offset - lo + len(self.counts)] += self.counts
+		c[offset - lo : offset - lo + len(counts)] += counts
+		self.offset, self.counts = lo, c
+
+	def merge(self, other):
+		if other.gamma != self.gamma:
+			raise ValueError("cannot merge sketches of different alpha")
+		if len(other.counts) > 0:
+			self.add_bins(other.offset, other.counts)
+		self.zero += other.zero
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		return self
+
+	def count(self):
+		return self.zero + int(self.counts.sum())
+
+	# the value of rank k (0-based) in ascending order
+	def value_at(self, k):
+		if 0 <= k < self.zero:
+			return 0.
+		cum = np.cumsum(self.counts)
+		k -= self.zero
+		if len(cum) == 0 or k < 0 or k >= cum[-1]:
+			return float("nan")
+		i = int(np.searchsorted(cum, k, "right"))
+		v = 2 * self.gamma ** (i + self.offset) / (self.gamma + 1)
+		return min(max(v, self.min), self.max)
+
+	# the q-quantile, with the same rank as fct_analysis: the int(n*q)-th smallest value
+	def quantile(self, q):
+		return self.value_at(int(self.count() * q))
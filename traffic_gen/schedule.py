@@ -0,0 +1,40 @@
+import numpy as np
+
+class LoadSchedule:
+	# A load that changes over time, read from a file of "<time (s)> <load>" lines; time is from the start of the trace.
+	# Without ramp, the load is piecewise-constant: each point holds until the next one (a step).
+	# With ramp, the load changes linearly between points (e.g., a diurnal cycle).
+	# Before the first point the load is that of the first point, after the last point that of the last one.
+	def __init__(self, points, ramp = False):
+		points = sorted(points)
+		if len(points) == 0:
+			raise ValueError("the load schedule is empty")
+		self.times = np.array([p[0] for p in points], dtype = np.float64) * 1e9 # in ns
+		self.loads = np.array([p[1] for p in points], dtype = np.float64)
+		if (self.loads < 0).any():
+			raise ValueError("the load schedule has a negative load")
+		self.peak = self.loads.max()
+		if self.peak <= 0:
+			raise ValueError("the load schedule is always 0")
+		self.ramp = ramp
+
+	@staticmethod
+	def read(fileName, ramp = False):
+		points = []
+		for line in open(fileName, "r"):
+			line = line.split("#")[0].strip()
+			if line:
+				t, l = map(float, line.split())
+				points.append((t, l))
+		return LoadSchedule(points, ramp)
+
+	# the load at times t (ns from the start of the trace)
+	def load(self, t):
+		t = np.asarray(t, dtype = np.float64)
+		if self.ramp:
+			return np.interp(t, self.times, self.loads)
+		return self.loads[np.maximum(np.searchsorted(self.times, t, "right") - 1, 0)]
+
+	# the fraction of the peak load at times t; arrivals generated at the peak load are kept with this probability
+	def ratio(self, t):
+		return self.load(t) / self.peak
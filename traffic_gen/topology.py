@@ -0,0 +1,36 @@
+# "100Gbps", "25G", "10Mbps" -> bits per second
+def translate_rate(r):
+	if r.endswith("bps"):
+		r = r[:-3]
+	for suffix, unit in (("G", 1e9), ("M", 1e6), ("K", 1e3)):
+		if r.endswith(suffix):
+			return float(r[:-1]) * unit
+	return float(r)
+
+class Topology:
+	# The topology file of the simulation (e.g. simulation/mix/fat.txt):
+	#   first line: <number of nodes> <number of switches> <number of links>
+	#   second line: the ids of the switches
+	#   each line after that is a link: <node a> <node b> <rate> <delay> <error rate>
+	# All nodes that are not switches are hosts.
+	def __init__(self, fileName):
+		with open(fileName, "r") as f:
+			tokens = f.read().split()
+		node_num, switch_num, link_num = map(int, tokens[:3])
+		self.node_num = node_num
+		self.switches = set(map(int, tokens[3:3+switch_num]))
+		self.hosts = [i for i in range(node_num) if i not in self.switches]
+		self.links = []
+		i = 3 + switch_num
+		for _ in range(link_num):
+			a, b, rate, delay, err = tokens[i:i+5]
+			self.links.append((int(a), int(b), rate, delay, float(err)))
+			i += 5
+		# the rack of a host is the switch it is attached to, and its rate is the rate of that link (its NIC, in bps)
+		self.rack = {}
+		self.host_rate = {}
+		for a, b, rate, delay, err in self.links:
+			for h, sw in ((b, a), (a, b)):
+				if sw in self.switches and h not in self.switches and h not in self.rack:
+					self.rack[h] = sw
+					self.host_rate[h] = translate_rate(rate)
@@ -0,0 +1,209 @@
+import sys
+import numpy as np
+from optparse import OptionParser
+from custom_rand import CustomRand
+from flow_file import read_flows
+from topology import Topology, translate_rate
+from quantile_sketch import LogSketch
+
+# the bytes of each host pair, summed over chunks; only the pairs that exchange traffic are kept, so the memory
+# grows with the number of such pairs rather than with nhost * nhost. A pair is keyed d * nhost + s (indices into host_ids), so
+# the keys come sorted by destination.
+def add_pair_bytes(pair_key, pair_bytes, key, size):
+	key, inv = np.unique(np.concatenate((pair_key, key)), return_inverse = True)
+	return key, np.bincount(inv, weights = np.concatenate((pair_bytes, size)))
+
+# expected load of every directed link, if each flow is hashed to one of the equal-cost shortest paths (as the
+# simulator's routing does, see CalculateRoute in scratch/third.cc); pair_bytes[k] is the bytes of the host pair
+# pair_key[k], as summed by add_pair_bytes
+def ecmp_link_bytes(topo, host_ids, pair_key, pair_bytes):
+	nhost = len(host_ids)
+	nbr = {}
+	for a, b, rate, delay, err in topo.links:
+		nbr.setdefault(a, []).append(b)
+		nbr.setdefault(b, []).append(a)
+	link = {}
+	dst = pair_key // nhost
+	bounds = np.nonzero(np.diff(dst))[0] + 1
+	for keys, col in zip(np.split(pair_key, bounds), np.split(pair_bytes, bounds)):
+		if len(keys) == 0:
+			continue
+		d = host_ids[keys[0] // nhost]
+		# BFS from the destination; only switches forward traffic
+		dis = {d: 0}
+		q = [d]
+		for u in q:
+			for v in nbr.get(u, []):
+				if v not in dis:
+					dis[v] = dis[u] + 1
+					if v in topo.switches:
+						q.append(v)
+		vol = {}
+		for k, v in zip(keys, col):
+			vol[host_ids[k % nhost]] = v
+		# push the volume towards d, farthest nodes first, splitting evenly over the next hops
+		for u in sorted(dis, key = lambda u: -dis[u]):
+			if u not in vol or u == d:
+				continue
+			nexts = [v for v in nbr[u] if dis.get(v) == dis[u] - 1 and (v == d or v in topo.switches)]
+			share = vol[u] / len(nexts)
+			for v in nexts:
+				link[(u, v)] = link.get((u, v), 0.) + share
+				vol[v] = vol.get(v, 0.) + share
+	return link
+
+if __name__ == "__main__":
+	parser = OptionParser(usage = "usage: %prog [options] <flow file>")
+	parser.add_option("-c", "--cdf", dest = "cdf_file", help = "the flow size cdf the trace was generated from")
+	parser.add_option("-l", "--load", dest = "load", help = "the target load the trace was generated with, by default 0.3", default = "0.3")
+	parser.add_option("-n", "--nhost", dest = "nhost", help = "number of hosts, without --topo")
+	parser.add_option("-b", "--bandwidth", dest = "bandwidth", help = "the bandwidth of host link (G/M/K) without --topo, by default 10G", default = "10G")
+	parser.add_option("--topo", dest = "topo", help = "the topology file; gives the hosts, their link rates, and the per-link load over ECMP paths")
+	parser.add_option("-t", "--time", dest = "time", help = "the duration (s) of the trace, by default the span of the flow start times")
+	parser.add_option("-p", "--dport", dest = "dport", type = "int", help = "only count flows to this dest port (e.g. 100 for the Poisson traffic)")
+	parser.add_option("-k", "--top", dest = "top", type = "int", help = "the number of most loaded hosts/links to list, by default 10", default = 10)
+	options, args = parser.parse_args()
+
+	if len(args) != 1:
+		parser.print_help()
+		sys.exit(0)
+	load = float(options.load)
+	topo = None
+	if options.topo:
+		topo = Topology(options.topo)
+		host_ids = topo.hosts
+		rate = np.array([topo.host_rate.get(h, np.nan) for h in host_ids])
+	elif options.nhost:
+		host_ids = list(range(int(options.nhost)))
+		rate = np.full(len(host_ids), translate_rate(options.bandwidth))
+	else:
+		print("please use -n to enter number of hosts, or --topo to enter the topology file")
+		sys.exit(0)
+	nhost = len(host_ids)
+	pos = np.full(max(host_ids) + 1, -1, dtype = np.int64)
+	pos[host_ids] = np.arange(nhost)
+
+	# the state below only depends on the number of hosts (and of host pairs with traffic) and the range of values, not on
+	# the number of flows
+	n_flow = 0
+	t_min, t_max = None, None
+	tx = np.zeros(nhost)
+	rx = np.zeros(nhost)
+	pair_key = np.zeros(0, dtype = np.int64)
+	pair_bytes = np.zeros(0)
+	last_t = np.full(nhost, -1, dtype = np.int64)
+	gap_n = np.zeros(nhost)
+	gap_sum = np.zeros(nhost)
+	gap_sq = np.zeros(nhost)
+	size_sketch = LogSketch(0.01)
+	gap_sketch = LogSketch(0.01)
+	bad = 0
+	customRand = None
+	if options.cdf_file:
+		cdf = []
+		for line in open(options.cdf_file, "r"):
+			x, y = map(float, line.strip().split(' '))
+			cdf.append([x, y])
+		customRand = CustomRand()
+		if not customRand.setCdf(cdf):
+			print("Error: Not valid cdf")
+			sys.exit(0)
+		size_hist = np.zeros(len(cdf) + 1)
+
+	for flows in read_flows(args[0]):
+		src, dst, size, t = flows["src"], flows["dst"], flows["size"], flows["start_ns"]
+		if options.dport is not None:
+			keep = flows["dport"] == options.dport
+			src, dst, size, t = src[keep], dst[keep], size[keep], t[keep]
+		if len(t) == 0:
+			continue
+		# flows from or to a node that is not a host would be rejected by the simulator
+		ok = (src < len(pos)) & (dst < len(pos))
+		ok[ok] = (pos[src[ok]] >= 0) & (pos[dst[ok]] >= 0)
+		bad += len(ok) - ok.sum()
+		s, d, size, t = pos[src[ok]], pos[dst[ok]], size[ok], t[ok].astype(np.int64)
+		n_flow += len(t)
+		t_min = t.min() if t_min is None else min(t_min, t.min())
+		t_max = t.max() if t_max is None else max(t_max, t.max())
+		tx += np.bincount(s, weights = size, minlength = nhost)
+		rx += np.bincount(d, weights = size, minlength = nhost)
+		if topo is not None:
+			pair_key, pair_bytes = add_pair_bytes(pair_key, pair_bytes, d * nhost + s, size)
+		size_sketch.add(size)
+		if customRand is not None:
+			size_hist += np.bincount(np.searchsorted(customRand.x_arr, size, "left"), minlength = len(size_hist))[:len(size_hist)]
+		# inter-arrival gaps of each host, including the gap from the host's last flow in the previous chunk
+		order = np.lexsort((t, s))
+		s, t = s[order], t[order]
+		first = np.ones(len(s), dtype = bool)
+		first[1:] = s[1:] != s[:-1]
+		prev = np.empty(len(t), dtype = np.int64)
+		prev[1:] = t[:-1]
+		prev[first] = last_t[s[first]]
+		has_prev = prev >= 0
+		gap = (t - prev)[has_prev].astype(np.float64)
+		gs = s[has_prev]
+		gap_n += np.bincount(gs, minlength = nhost)
+		gap_sum += np.bincount(gs, weights = gap, minlength = nhost)
+		gap_sq += np.bincount(gs, weights = gap * gap, minlength = nhost)
+		gap_sketch.add(gap)
+		last = np.ones(len(s), dtype = bool)
+		last[:-1] = s[1:] != s[:-1]
+		last_t[s[last]] = t[last]
+
+	if n_flow == 0:
+		print("no flows")
+		sys.exit(0)
+	duration = float(options.time) * 1e9 if options.time else float(t_max - t_min)
+	print("flows: %d, start time %.9f - %.9f s, duration %.6f s"%(n_flow, t_min * 1e-9, t_max * 1e-9, duration * 1e-9))
+	if bad > 0:
+		print("WARNING: %d flows are from or to a node that is not a host"%bad)
+
+	# offered load of each host, relative to its link rate; a trace whose flows all start at the same time has no duration
+	print("")
+	if duration > 0:
+		tx_load = tx * 8e9 / duration / rate
+		rx_load = rx * 8e9 / duration / rate
+		print("per-host offered load (target %.3f):"%load)
+		print("  tx: mean %.3f min %.3f max %.3f (host %d)"%(tx_load.mean(), tx_load.min(), tx_load.max(), host_ids[tx_load.argmax()]))
+		print("  rx: mean %.3f min %.3f max %.3f (host %d)"%(rx_load.mean(), rx_load.min(), rx_load.max(), host_ids[rx_load.argmax()]))
+		over = np.nonzero((tx_load > 1) | (rx_load > 1))[0]
+		if len(over) > 0:
+			print("  WARNING: %d hosts are offered more than their link rate: %s"%(len(over), " ".join("%d(tx %.2f rx %.2f)"%(host_ids[i], tx_load[i], rx_load[i]) for i in over[np.argsort(-np.maximum(tx_load, rx_load)[over])][:options.top])))
+	else:
+		print("per-host offered load (target %.3f): n/a, the duration is 0 (give it with -t)"%load)
+
+	# flow size distribution
+	print("")
+	print("flow size: mean %.1f, p50 %.0f p90 %.0f p99 %.0f p99.9 %.0f (within 1%%)"%(tx.sum() / n_flow, size_sketch.quantile(0.5), size_sketch.quantile(0.9), size_sketch.quantile(0.99), size_sketch.quantile(0.999)))
+	if customRand is not None:
+		emp = np.cumsum(size_hist)[:len(cdf)] / n_flow * 100
+		diff = np.abs(emp - customRand.y_arr)
+		i = diff.argmax()
+		print("  cdf mean %.1f; max cdf distance (KS) %.3f%% at size %.0f (trace %.3f%% vs cdf %.3f%%)"%(customRand.getAvg(), diff[i], customRand.x_arr[i], emp[i], customRand.y_arr[i]))
+
+	# inter-arrival dispersion; for Poisson arrivals the coefficient of variation of the gaps is 1
+	has = gap_n > 1
+	mean = gap_sum[has] / gap_n[has]
+	var = np.maximum(gap_sq[has] / gap_n[has] - mean * mean, 0)
+	cv = np.sqrt(var) / np.maximum(mean, 1)
+	print("")
+	print("inter-arrival (ns): p50 %.0f p99 %.0f; per-host coefficient of variation: mean %.3f min %.3f max %.3f (Poisson: 1)"%(gap_sketch.quantile(0.5), gap_sketch.quantile(0.99), cv.mean() if has.any() else float("nan"), cv.min() if has.any() else float("nan"), cv.max() if has.any() else float("nan")))
+
+	# expected load of each link
+	if topo is not None:
+		link_rate = {}
+		for a, b, r, delay, err in topo.links:
+			link_rate[(a, b)] = link_rate[(b, a)] = translate_rate(r)
+		link = ecmp_link_bytes(topo, host_ids, pair_key, pair_bytes)
+		print("")
+		if duration > 0:
+			util = sorted(((v * 8e9 / duration / link_rate[k], k) for k, v in link.items()), reverse = True)
+			print("expected link load over ECMP paths (%d links used), most loaded:"%len(util))
+			for u, (a, b) in util[:options.top]:
+				print("  %d -> %d: %.3f"%(a, b, u))
+			n_over = sum(1 for u, k in util if u > 1)
+			if n_over > 0:
+				print("  WARNING: %d links are offered more than their rate"%n_over)
+		else:
+			print("expected link load over ECMP paths (%d links used): n/a, the duration is 0 (give it with -t)"%len(link))
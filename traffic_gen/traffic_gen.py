@@ -1,15 +1,14 @@
 import sys
-import random
 import math
-import heapq
+import traceback
+import multiprocessing
+import numpy as np
 from optparse import OptionParser
 from custom_rand import CustomRand
-
-class Flow:
-	def __init__(self, src, dst, size, t):
-		self.src, self.dst, self.size, self.t = src, dst, size, t
-	def __str__(self):
-		return "%d %d 3 100 %d %.9f"%(self.src, self.dst, self.size, self.t)
+from flow_file import open_flow_writer
+from topology import Topology
+from schedule import LoadSchedule
+from patterns import HostSet, DST_PATTERNS, BURST_PATTERNS, NORMAL_PORT, parse_pattern
 
 def translate_bandwidth(b):
 	if b == None:
@@ -24,32 +23,179 @@ def translate_bandwidth(b):
 		return float(b[:-1])*1e3
 	return float(b)
 
-def poisson(lam):
-	return -math.log(1-random.random())*lam
+class PoissonSource:
+	# Poisson flow arrivals of a group of source hosts, generated window by window so that only one window of flows is in memory
+	# `src` are positions in the HostSet `hosts`, and `dst` chooses their destinations (see patterns.py)
+	# with a LoadSchedule, avg_inter_arrival is at the peak load of the schedule, and arrivals are thinned to the load at their time
+	def __init__(self, rng, hosts, src, dst, avg_inter_arrival, customRand, start, end, schedule = None):
+		self.rng = rng
+		self.ids = hosts.ids
+		self.hosts = np.asarray(src, dtype = np.int64)
+		self.dst = dst
+		self.avg = np.broadcast_to(np.asarray(avg_inter_arrival, dtype = np.float64), self.hosts.shape)
+		self.customRand = customRand
+		self.start = start
+		self.end = end
+		self.schedule = schedule
+		# the pending (not yet emitted) arrival of each host
+		self.next = start + np.floor(rng.standard_exponential(len(self.hosts)) * self.avg)
+		self.lo = start
+
+	# return (src, dst, size, t, dport) of the flows that start before hi
+	def flows(self, hi):
+		rows, ts = [], []
+		# k gaps per round is enough for most hosts to pass hi in one round
+		n = (hi - self.lo) / self.avg.min()
+		k = int(n + 3 * math.sqrt(n)) + 1
+		active = np.nonzero(self.next < hi)[0]
+		while len(active) > 0:
+			gaps = np.floor(self.rng.standard_exponential((len(active), k)) * self.avg[active, None])
+			t = self.next[active, None] + np.hstack((np.zeros((len(active), 1)), np.cumsum(gaps, axis=1)))
+			# a flow is kept if the next arrival of the same host is still within `end`, same as the per-flow loop before
+			emit = (t[:, :-1] < hi) & (t[:, 1:] <= self.end)
+			r, c = np.nonzero(emit)
+			rows.append(active[r])
+			ts.append(t[r, c])
+			# the new pending arrival is the first one not before hi; hosts past `end` are done
+			# hosts whose k arrivals are all before hi need another round
+			idx = (t < hi).sum(axis=1)
+			nxt = t[np.arange(len(active)), np.minimum(idx, k)]
+			nxt[nxt > self.end] = np.inf
+			self.next[active] = nxt
+			active = active[(idx > k) & (nxt < hi)]
+		self.lo = hi
+		row = np.concatenate(rows) if rows else np.zeros(0, dtype = np.int64)
+		t = np.concatenate(ts).astype(np.int64) if ts else np.zeros(0, dtype = np.int64)
+		if self.schedule is not None:
+			# thinning: a Poisson process at the peak rate, keeping each arrival with probability load(t) / peak,
+			# is a Poisson process whose rate follows the schedule
+			keep = self.rng.random_sample(len(t)) < self.schedule.ratio(t - self.start)
+			row, t = row[keep], t[keep]
+		src = self.hosts[row]
+		n = len(t)
+		dst = self.dst.choose(self.rng, src)
+		size = self.customRand.rand(n, self.rng).astype(np.int64)
+		size[size <= 0] = 1
+		return self.ids[src], self.ids[dst], size, t, np.full(n, NORMAL_PORT, dtype = np.int64)
+
+# yield the flows of the sources in time-ordered chunks of `chunk` ns, each with the index of the source of each flow
+# (`index` gives the index of each source among all sources). The flows are ordered by t, src, then the source, and keep
+# their order within a source, so that the order does not depend on how the sources are spread over workers
+def gen_indexed_chunks(sources, index, start, end, chunk):
+	lo = start
+	while lo <= end:
+		hi = min(lo + chunk, end + 1)
+		parts = [s.flows(hi) for s in sources]
+		flows = [np.concatenate(c) for c in zip(*parts)]
+		idx = np.concatenate([np.full(len(p[3]), i, dtype = np.int64) for i, p in zip(index, parts)])
+		order = np.lexsort((idx, flows[0], flows[3])) # by t, then src, then the source
+		yield [c[order] for c in flows], idx[order]
+		lo = hi
+
+# yield the flows of all sources in time-ordered chunks of `chunk` ns
+def gen_chunks(sources, start, end, chunk):
+	for flows, idx in gen_indexed_chunks(sources, range(len(sources)), start, end, chunk):
+		yield flows
+
+# split the hosts into fixed shards of `shard` hosts, each with its own random stream derived from the master seed,
+# so that the trace only depends on the seed and the shard size, not on how the shards are spread over workers
+def make_shards(seed, hosts, shard, make_source):
+	return [make_source(np.random.RandomState(seed + [i]), hosts[s:s+shard]) for i, s in enumerate(range(0, len(hosts), shard))]
+
+# build the sources of all patterns; the p-th pattern draws from random streams derived from [seed, p]
+# with a LoadSchedule, the Poisson patterns without their own load= follow the schedule instead of `load`
+def make_sources(patterns, seed, hosts, shard, load, customRand, start, end, schedule = None):
+	sources = []
+	avg = customRand.getAvg()
+	for p, (name, params) in enumerate(patterns):
+		rng = np.random.RandomState([seed, p])
+		if name in BURST_PATTERNS:
+			sources.append(BURST_PATTERNS[name](hosts, rng, customRand, start, end, **params))
+			continue
+		sched = None
+		if "load" in params:
+			l = params.pop("load")
+		elif schedule is not None:
+			l, sched = schedule.peak, schedule
+		else:
+			l = load
+		dst = DST_PATTERNS[name](hosts, rng, **params)
+		# each host's arrival rate follows its own NIC rate
+		avg_inter_arrival = 1/(hosts.bandwidth*l/8./avg)*1000000000
+		sources += make_shards([seed, p], list(range(hosts.n)), shard, lambda rng, src: PoissonSource(rng, hosts, src, dst, avg_inter_arrival[src], customRand, start, end, sched))
+	return sources
+
+def gen_worker(sources, index, start, end, chunk, queue):
+	try:
+		for flows in gen_indexed_chunks(sources, index, start, end, chunk):
+			queue.put(flows)
+		queue.put(None)
+	except Exception:
+		queue.put(traceback.format_exc())
+
+# same as gen_chunks, but the sources are spread over n_worker processes; each yields the same windows, which are merged here
+def gen_chunks_parallel(sources, start, end, chunk, n_worker):
+	n_worker = min(n_worker, len(sources))
+	if n_worker <= 1:
+		for flows in gen_chunks(sources, start, end, chunk):
+			yield flows
+		return
+	queues = []
+	for i in range(n_worker):
+		queue = multiprocessing.Queue(4) # bounds the windows buffered by each worker
+		p = multiprocessing.Process(target = gen_worker, args = (sources[i::n_worker], list(range(len(sources)))[i::n_worker], start, end, chunk, queue))
+		p.daemon = True
+		p.start()
+		queues.append(queue)
+	while True:
+		parts = [q.get() for q in queues]
+		for part in parts:
+			if isinstance(part, str):
+				raise RuntimeError("worker failed:\n" + part)
+		if parts[0] is None:
+			break
+		flows = [np.concatenate(c) for c in zip(*[f for f, idx in parts])]
+		idx = np.concatenate([idx for f, idx in parts])
+		order = np.lexsort((idx, flows[0], flows[3])) # by t, then src, then the source
+		yield [c[order] for c in flows]
 
 if __name__ == "__main__":
-	port = 80
 	parser = OptionParser()
 	parser.add_option("-c", "--cdf", dest = "cdf_file", help = "the file of the traffic size cdf", default = "uniform_distribution.txt")
-	parser.add_option("-n", "--nhost", dest = "nhost", help = "number of hosts")
+	parser.add_option("-n", "--nhost", dest = "nhost", help = "number of hosts; with --topo, use only the first n hosts of the topology")
 	parser.add_option("-l", "--load", dest = "load", help = "the percentage of the traffic load to the network capacity, by default 0.3", default = "0.3")
-	parser.add_option("-b", "--bandwidth", dest = "bandwidth", help = "the bandwidth of host link (G/M/K), by default 10G", default = "10G")
+	parser.add_option("-b", "--bandwidth", dest = "bandwidth", help = "the bandwidth of host link (G/M/K), by default 10G. Not used with --topo, where each host uses the rate of its own link", default = "10G")
 	parser.add_option("-t", "--time", dest = "time", help = "the total run time (s), by default 10", default = "10")
 	parser.add_option("-o", "--output", dest = "output", help = "the output file", default = "tmp_traffic.txt")
+	parser.add_option("-f", "--format", dest = "format", help = "the output format, text or bin (the binary columnar format in flow_file.py), by default text", default = "text")
+	parser.add_option("-s", "--seed", dest = "seed", type = "int", help = "the random seed, by default a random one")
+	parser.add_option("-w", "--workers", dest = "workers", type = "int", help = "the number of processes generating flows, by default 1", default = 1)
+	parser.add_option("--shard", dest = "shard", type = "int", help = "the number of hosts sharing a random stream, by default 64. The trace depends on the seed and the shard size, but not on the number of workers", default = 64)
+	parser.add_option("-p", "--pattern", dest = "patterns", action = "append", help = "a workload pattern name[:key=value,...], can be repeated to mix workloads, by default uniform. "
+		"Poisson patterns (each at -l load, or load=<load>): uniform; permutation; rack:local=<fraction in rack>; hotspot:hot=<number of hot hosts>,frac=<fraction to hot hosts>. "
+		"Burst patterns: incast:period=<s>,fanin=<senders>[,size=<B>]; alltoall:period=<s>[,size=<B>]. Without size=, sizes follow the cdf")
+	parser.add_option("--topo", dest = "topo", help = "the topology file (e.g. ../simulation/mix/fat.txt). Flows are generated between its hosts (never switches), at the rate of each host's link, and it gives the rack of each host for the rack pattern")
+	parser.add_option("--schedule", dest = "schedule", help = "a load schedule file of '<time (s)> <load>' lines, time from the start of the trace. The load of each point holds until the next point (steps), or changes linearly with --ramp. Replaces -l for the Poisson patterns without load=")
+	parser.add_option("--ramp", dest = "ramp", action = "store_true", help = "interpolate the load schedule linearly between points", default = False)
+	parser.add_option("-C", "--chunk", dest = "chunk", help = "the time span (s) of flows generated and written at a time, which bounds the memory, by default 0.001", default = "0.001")
 	options,args = parser.parse_args()
 
 	base_t = 2000000000
 
-	if not options.nhost:
-		print "please use -n to enter number of hosts"
+	if not options.nhost and not options.topo:
+		print("please use -n to enter number of hosts, or --topo to enter the topology file")
 		sys.exit(0)
-	nhost = int(options.nhost)
 	load = float(options.load)
 	bandwidth = translate_bandwidth(options.bandwidth)
 	time = float(options.time)*1e9 # translates to ns
+	chunk = float(options.chunk)*1e9
 	output = options.output
 	if bandwidth == None:
-		print "bandwidth format incorrect"
+		print("bandwidth format incorrect")
+		sys.exit(0)
+	# a chunk under 1ns would never get to the end of the trace
+	if not chunk >= 1:
+		print("the chunk must be at least 1ns, got %s s"%options.chunk)
 		sys.exit(0)
 
 	fileName = options.cdf_file
@@ -63,63 +209,37 @@ if __name__ == "__main__":
 
 	# create a custom random generator, which takes a cdf, and generate number according to the cdf
 	customRand = CustomRand()
-	if not customRand.setCdf(cdf):
-		print "Error: Not valid cdf"
+	if not customRand.setCdf(cdf, 4096):
+		print("Error: Not valid cdf")
 		sys.exit(0)
 
-	ofile = open(output, "w")
+	seed = options.seed
+	if seed == None:
+		seed = np.random.randint(1 << 31)
+
+	if options.topo:
+		topo = Topology(options.topo)
+		host_ids = topo.hosts
+		if options.nhost:
+			host_ids = host_ids[:int(options.nhost)]
+		unlinked = [h for h in host_ids if h not in topo.host_rate]
+		if len(unlinked) > 0:
+			print("Error: hosts %s are not linked to any switch in %s"%(unlinked[:10], options.topo))
+			sys.exit(0)
+		hosts = HostSet(host_ids, [topo.host_rate[h] for h in host_ids], [topo.rack[h] for h in host_ids])
+	else:
+		hosts = HostSet(range(int(options.nhost)), bandwidth)
+
+	try:
+		schedule = LoadSchedule.read(options.schedule, options.ramp) if options.schedule else None
+		patterns = [parse_pattern(p) for p in (options.patterns or ["uniform"])]
+		sources = make_sources(patterns, seed, hosts, options.shard, load, customRand, base_t, time + base_t, schedule)
+	except (ValueError, TypeError) as e:
+		print("Error: %s"%e)
+		sys.exit(0)
 
 	# generate flows
-	avg = customRand.getAvg()
-	avg_inter_arrival = 1/(bandwidth*load/8./avg)*1000000000
-	n_flow_estimate = int(time / avg_inter_arrival * nhost)
-	n_flow = 0
-	ofile.write("%d \n"%n_flow_estimate)
-	host_list = [(base_t + int(poisson(avg_inter_arrival)), i) for i in range(nhost)]
-	heapq.heapify(host_list)
-	while len(host_list) > 0:
-		t,src = host_list[0]
-		inter_t = int(poisson(avg_inter_arrival))
-		new_tuple = (src, t + inter_t)
-		dst = random.randint(0, nhost-1)
-		while (dst == src):
-			dst = random.randint(0, nhost-1)
-		if (t + inter_t > time + base_t):
-			heapq.heappop(host_list)
-		else:
-			size = int(customRand.rand())
-			if size <= 0:
-				size = 1
-			n_flow += 1;
-			ofile.write("%d %d 3 100 %d %.9f\n"%(src, dst, size, t * 1e-9))
-			heapq.heapreplace(host_list, (t + inter_t, src))
-	ofile.seek(0)
-	ofile.write("%d"%n_flow)
-	ofile.close()
-
-'''
-	f_list = []
-	avg = customRand.getAvg()
-	avg_inter_arrival = 1/(bandwidth*load/8./avg)*1000000000
-	# print avg_inter_arrival
-	for i in range(nhost):
-		t = base_t
-		while True:
-			inter_t = int(poisson(avg_inter_arrival))
-			t += inter_t
-			dst = random.randint(0, nhost-1)
-			while (dst == i):
-				dst = random.randint(0, nhost-1)
-			if (t > time + base_t):
-				break
-			size = int(customRand.rand())
-			if size <= 0:
-				size = 1
-			f_list.append(Flow(i, dst, size, t * 1e-9))
-
-	f_list.sort(key = lambda x: x.t)
-
-	print len(f_list)
-	for f in f_list:
-		print f
-'''
+	writer = open_flow_writer(output, options.format)
+	for src, dst, size, t, dport in gen_chunks_parallel(sources, base_t, time + base_t, chunk, options.workers):
+		writer.write(src, dst, size, t, dport = dport)
+	writer.close()